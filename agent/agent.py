@@ -1,193 +1,899 @@
+import atexit
+import hashlib
 import json
+import os
 import re
 import requests
 import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime, UTC
-from ollama import chat as ollama_chat
-from pydantic import BaseModel
-
+from urllib.parse import urlencode
+from pydantic import BaseModel, ValidationError
+from schemas import TOOL_ARGS, tool_schemas
+from renderers import render_tool_result
+from compaction import SUMMARY_TOKEN_BUDGET, compact_for_llm, estimate_tokens, pack_chunks, split_for_llm, truncate_to_budget
+from content import CHUNK_SIZE, MAX_FETCH_BYTES, extract_content, read_capped
+from http_cache import HttpCache
+from router import IntentRouter
+from decision_cache import DecisionCache
+from llm_gateway import LLMGateway
+from memory import ConversationMemory, MemoryStore
+from profiles import load_profiles, warmup_profiles
+from tracing import looks_like_error, tracer
+
+# agent.log and the on-disk caches go here, not into the working directory
+DATA_DIR = Path(os.environ.get("AGENT_DATA_DIR", Path(__file__).resolve().parent))
+DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+# Records are formatted on the calling thread and written to agent.log by a listener thread
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, logging.FileHandler(DATA_DIR / "agent.log"), logging.StreamHandler())
+log_listener.start()
+# Drain the queue before exit; the listener thread is a daemon and would drop what is left
+atexit.register(log_listener.stop)
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.FileHandler("agent.log"), logging.StreamHandler()]
+    handlers=[QueueHandler(log_queue)]
 )
 
+MODEL = "llama3.2"
+# Per-stage model and options (decide, fallback, summarize, compact), see profiles.py
+PROFILES = load_profiles(MODEL)
+BACKEND_URL = "http://127.0.0.1:8000"
+
+# One keep-alive pool for every tool call instead of a fresh TCP connection per request
+http_session = requests.Session()
+http_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=10))
+http_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=10))
+
+# Backend calls go through backend_session; use_embedded_backend() swaps it for an in-process client
+BACKEND_MODE = "http"
+backend_session = http_session
+direct_backend = None
+
+def use_embedded_backend(mode: str = "asgi"):
+    """
+    Run tool calls against the backend inside this process instead of over loopback HTTP.
+    "asgi" drives the FastAPI app through an in-process transport; "direct" additionally
+    calls the user and weather services straight from Python.
+    """
+    global BACKEND_MODE, backend_session, direct_backend
+    if mode not in ("http", "asgi", "direct"):
+        raise ValueError(f"Unknown backend mode: {mode}")
+    if mode != "http":
+        import embedded
+        backend_session = embedded.asgi_client()
+        direct_backend = embedded.DirectBackend() if mode == "direct" else None
+    BACKEND_MODE = mode
+    logging.info(f"Backend mode: {mode}")
+
+def session_for(url: str):
+    return backend_session if url.startswith(BACKEND_URL) else http_session
+
 class WeatherResponse(BaseModel):
     city: str
-    temperature: str
+    temperature: float
     description: str
 
 SYSTEM_PROMPT = """
-You are an intelligent assistant with access to three tools.
-only use these tools and dont use any other external resources.
-
-======================
-TOOL 1: get_weather
-===================
-
-Purpose:
-Retrieve weather information for a city.
-
-Usage:
-{
-"action": "get_weather",
-"city": "<city name>"
-}
-
-======================
-TOOL 2: fetch_url
-=================
-
-Purpose:
-Fetch any HTTP/HTTPS URL (GET, POST, PUT, DELETE).
-
-Usage:
-{
-"action": "fetch_url",
-"url": "<full URL>",
-"method": "<GET|POST|PUT|DELETE>",
-"data": { ... }  # optional for POST/PUT
-}
-
-======================
-TOOL 3: manage_users
-====================
-
-Purpose:
-Perform CRUD operations on /users endpoints.
-
-Usage:
-{
-"action": "manage_users",
-"method": "<GET|POST|PUT|DELETE>",
-"user_id": <optional>,
-"data": { "user_name": "<name>" }  # for POST/PUT
-}
-
-RULES:
-
-* Always output JSON for tool calls
-* Use get_weather anytime user asks about weather
-* Only use other tools when needed
-* Otherwise respond normally
+You are an intelligent assistant with access to three tools: get_weather, fetch_url and manage_users.
+Only use these tools and dont use any other external resources.
+Use get_weather anytime the user asks about weather.
+Only use the other tools when needed, otherwise respond normally.
+Call several tools at once when the user asks for several independent things.
 """
 
+# Passed to Ollama on every decision call so tool choices come back as structured tool_calls
+TOOLS = tool_schemas()
+INVALID_TOOL_CALL = "Sorry, I could not run that tool request."
+
+# Multi-action plans: independent actions run concurrently, each under its own timeout
+MAX_PARALLEL_ACTIONS = 4
+ACTION_TIMEOUT = 20.0
+# Several single-user lookups share one /users?ids=... call, up to the backend's page size
+USER_BATCH_LIMIT = 1000
+
+# Rule-based pre-router; obvious weather/user requests skip the LLM. Set to None to disable.
+pre_router = IntentRouter()
+
+# Every LLM call goes through the gateway: concurrency cap, coalescing, keep-alive, metrics
+llm_gateway = LLMGateway()
+
+# Per-session conversation history; the REPL uses a single session
+DEFAULT_SESSION = "default"
+memories = MemoryStore()
+
+HISTORY_PROMPT = """Update the running summary of a conversation between a user and an assistant.
+Keep names, user ids, cities and outcomes; drop pleasantries. Reply with the summary only.
+Current summary: {previous}
+New turns:
+{transcript}"""
+
+# Cached decisions are invalidated whenever the prompt or the tool definitions change
+PROMPT_VERSION = hashlib.sha256((SYSTEM_PROMPT + json.dumps(TOOLS, sort_keys=True)).encode()).hexdigest()[:12]
+
+SUMMARY_PROMPT = "Summarize the following API response clearly:\n{text}"
+# Map-reduce summarization of inputs over SUMMARY_TOKEN_BUDGET
+CHUNK_PROMPT = "This is one part of a larger API response. Summarize it, keeping names, numbers and totals:\n{text}"
+REDUCE_PROMPT = "Merge these partial summaries of one API response into one, keeping names, numbers and totals:\n{text}"
+MAP_CONCURRENCY = 3
+
+# On-disk cache for fetch_url GETs and for summaries. AGENT_HTTP_CACHE="" disables it;
+# relative paths here and in AGENT_DECISION_CACHE are taken from DATA_DIR.
+HTTP_CACHE_PATH = os.environ.get("AGENT_HTTP_CACHE", "http_cache.db")
+http_cache = HttpCache(str(DATA_DIR / HTTP_CACHE_PATH)) if HTTP_CACHE_PATH else None
+
+# Repeated questions reuse the earlier tool decision (the tool still runs live). Set to None to disable.
+DECISION_CACHE_PATH = os.environ.get("AGENT_DECISION_CACHE")
+decision_cache = DecisionCache(db_path=str(DATA_DIR / DECISION_CACHE_PATH) if DECISION_CACHE_PATH else None)
+
 
 def extract_json(text: str):
+    with tracer.span("extract_json", bytes_in=len(text)) as span:
+        try:
+            match = re.search(r"{.*}", text, re.DOTALL)
+            if match:
+                return json.loads(match.group(0))
+        except Exception as e:
+            logging.error(f"JSON extraction failed: {e}")
+            span.set(error=str(e))
+        return None
+
+def validate_decision(action: str, arguments: dict):
+    """Validate tool arguments against the tool's pydantic model and return a decision dict."""
+    model = TOOL_ARGS.get(action)
+    if model is None:
+        logging.warning(f"Unknown tool: {action}")
+        return None
     try:
-        match = re.search(r"{.*}", text, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
-    except Exception as e:
-        logging.error(f"JSON extraction failed: {e}")
-    return None
+        args = model.model_validate(arguments or {})
+    except ValidationError as e:
+        logging.error(f"Invalid arguments for {action}: {e}")
+        return None
+    return {"action": action, **args.model_dump(mode="json", exclude_none=True)}
+
+def plan_from_tool_calls(tool_calls) -> list[dict]:
+    """Validate every native tool call. One invalid call rejects the whole plan."""
+    plan = []
+    for call in tool_calls or []:
+        function = call["function"]
+        decision = validate_decision(function["name"], function["arguments"])
+        if decision is None:
+            return []
+        plan.append(decision)
+    return plan
+
+def plan_from_message(message) -> list[dict]:
+    """
+    Turn an LLM reply into a validated plan (a list of decisions, empty when the reply is
+    plain text). Native tool_calls are preferred; a JSON object in the text, either one
+    action or {"actions": [...]}, is still accepted for models without tool support.
+    """
+    plan = plan_from_tool_calls(message.get("tool_calls"))
+    if plan:
+        return plan
+    parsed = extract_json(message["content"] or "")
+    if not isinstance(parsed, dict):
+        return []
+    actions = parsed.get("actions") if isinstance(parsed.get("actions"), list) else [parsed]
+    for item in actions:
+        if not isinstance(item, dict) or "action" not in item:
+            return []
+        decision = validate_decision(item["action"], {k: v for k, v in item.items() if k != "action"})
+        if decision is None:
+            return []
+        plan.append(decision)
+    return plan
+
+class FetchRequest:
+    """
+    The I/O-free part of fetch_url_content, shared by the sync and async agents: the method
+    check and HTTP cache lookup before the request, content extraction and caching after it.
+    The cache methods touch SQLite, so the async agent runs them in a thread.
+    """
+
+    def __init__(self, cache, url: str, method: str = "GET", headers: dict = None, data: dict = None):
+        self.cache = cache
+        self.url = url
+        self.method = method.upper()
+        self.headers = headers or {}
+        self.json = data if self.method in ("POST", "PUT") else None
+        self.cached = None
+        logging.info(f"Fetching URL: {url} | Method: {self.method} | Data: {data}")
+
+    def early_result(self):
+        """Result that needs no request (unsupported method, fresh cache entry), else None."""
+        if self.method not in ("GET", "POST", "PUT", "DELETE"):
+            return f"Unsupported HTTP method: {self.method}"
+        if self.cache is None:
+            return None
+        if self.method != "GET":
+            self.cache.invalidate(self.url)
+            return None
+        self.cached = self.cache.lookup(self.url)
+        if self.cached is not None and self.cached.fresh:
+            logging.info(f"HTTP cache hit: {self.url}")
+            return self.cached.result
+        if self.cached is not None:
+            self.headers = {**self.headers, **self.cached.validators()}
+        return None
+
+    def revalidates(self, response) -> bool:
+        """The server answered 304 to our validators, so revalidated() has the result."""
+        return self.cached is not None and response.status_code == 304
+
+    def revalidated(self, response) -> str:
+        logging.info(f"HTTP cache revalidated: {self.url}")
+        return self.cache.revalidated(self.cached, response.headers)
+
+    def result(self, response, body: bytes, truncated: bool) -> str:
+        if truncated:
+            logging.warning(f"Response from {self.url} cut at {MAX_FETCH_BYTES} bytes")
+        result = extract_content(body, response.headers.get("Content-Type"), truncated)
+        if self.cache is not None and self.method == "GET" and response.status_code == 200:
+            self.cache.store(self.url, response.headers, result)
+        logging.info(f"Response received from {self.url} | {len(body)} bytes -> {len(result)} chars")
+        return result
 
 def fetch_url_content(url: str, method: str = "GET", headers: dict = None, data: dict = None) -> str:
-    method = method.upper()
-    headers = headers or {}
-    logging.info(f"Fetching URL: {url} | Method: {method} | Data: {data}")
+    """
+    Stream the response and stop reading at MAX_FETCH_BYTES, so memory stays bounded
+    whatever the server sends. The body is reduced to compact text by content.extract_content.
+    """
+    fetch = FetchRequest(http_cache, url, method, headers, data)
+    early = fetch.early_result()
+    if early is not None:
+        return early
     try:
-        if method == "GET":
-            response = requests.get(url, headers=headers, timeout=15)
-        elif method == "POST":
-            response = requests.post(url, headers=headers, json=data, timeout=15)
-        elif method == "PUT":
-            response = requests.put(url, headers=headers, json=data, timeout=15)
-        elif method == "DELETE":
-            response = requests.delete(url, headers=headers, timeout=15)
-        else:
-            return f"Unsupported HTTP method: {method}"
-
+        response = session_for(url).request(fetch.method, url, headers=fetch.headers, json=fetch.json,
+                                            timeout=15, stream=True)
+        if fetch.revalidates(response):
+            response.close()
+            return fetch.revalidated(response)
         try:
-            result = json.dumps(response.json(), indent=2)
-        except:
-            result = response.text[:5000]
-
-        logging.info(f"Response received from {url}")
-        return result
+            body, truncated = read_capped(response.iter_content(CHUNK_SIZE), MAX_FETCH_BYTES)
+        finally:
+            response.close()
+        return fetch.result(response, body, truncated)
     except Exception as e:
         logging.error(f"Fetch error: {e}")
         return f"FETCH_ERROR: {e}"
 
-def call_weather(city: str) -> str:
-    url = f"http://127.0.0.1:8000/weather/city/{city}"
+def weather_url(backend_url: str, city: str) -> str:
     logging.info(f"Fetching weather for city: {city}")
+    return f"{backend_url}/weather/city/{city}"
+
+def weather_result(payload: dict) -> str:
+    if "detail" in payload:
+        return f"Error fetching weather: {payload['detail']}"
+    weather = WeatherResponse(**payload)
+    result = f"{weather.city}: {weather.description}, {weather.temperature:g}°C"
+    logging.info(f"Weather result: {result}")
+    return result
+
+def weather_error(e: Exception) -> str:
+    logging.error(f"Error fetching weather: {e}")
+    return f"Error fetching weather: {e}"
+
+def user_api_url(backend_url: str, method: str, user_id: int = None, data: dict = None, params: dict = None) -> str:
+    base_url = f"{backend_url}/users"
+    url = f"{base_url}/{user_id}" if user_id else base_url
+    if params:
+        url = f"{url}?{urlencode(params)}"
+    logging.info(f"Calling user API | URL: {url} | Method: {method} | Data: {data}")
+    return url
+
+def call_weather(city: str) -> str:
+    url = weather_url(BACKEND_URL, city)
     try:
-        response = requests.get(url, timeout=15)
+        if direct_backend is not None:
+            return weather_result(direct_backend.weather(city))
+        response = backend_session.get(url, timeout=15)
         response.raise_for_status()
-        weather = WeatherResponse(**response.json())
-        temperature = weather.temperature.replace("°C°C", "°C").replace("°C °C", "°C")
-        result = f"{weather.city}: {weather.description}, {temperature}"
-        logging.info(f"Weather result: {result}")
-        return result
+        return weather_result(response.json())
     except Exception as e:
-        logging.error(f"Error fetching weather: {e}")
-        return f"Error fetching weather: {e}"
+        return weather_error(e)
 
-def call_user_api(method: str, user_id: int = None, data: dict = None) -> str:
-    base_url = "http://127.0.0.1:8000/users"
-    url = f"{base_url}/{user_id}" if user_id else base_url
-    logging.info(f"Calling user API | URL: {url} | Method: {method} | Data: {data}")
+def call_user_api(method: str, user_id: int = None, data: dict = None, params: dict = None) -> str:
+    url = user_api_url(BACKEND_URL, method, user_id, data, params)
+    if direct_backend is not None:
+        return direct_backend.users(method, user_id=user_id, data=data, params=params)
     return fetch_url_content(url, method=method, data=data)
 
-def summarize_response(text: str) -> str:
+def summary_request(profile, text: str, template: str) -> dict:
+    """Keyword arguments of a summarization call on `profile`."""
+    return {"messages": [{"role": "user", "content": template.format(text=text)}], **profile.request()}
+
+def cached_summary(cache, profile, text: str, template: str):
+    return cache.get_summary(text, profile.model, template) if cache is not None else None
+
+def store_summary(cache, profile, text: str, template: str, summary: str) -> str:
+    if cache is not None:
+        cache.put_summary(text, profile.model, template, summary)
+    return summary
+
+def reduce_round(parts: list[str], summaries: list[str]):
+    """
+    After one map-reduce round over `parts`: (final text, None) once the summaries fit one
+    prompt (or stop shrinking), else (None, the merged parts for the next round).
+    """
+    joined = "\n\n".join(summaries)
+    if estimate_tokens(joined) <= SUMMARY_TOKEN_BUDGET:
+        return joined, None
+    merged = pack_chunks(summaries, SUMMARY_TOKEN_BUDGET)
+    if len(merged) >= len(parts):
+        return truncate_to_budget(joined, SUMMARY_TOKEN_BUDGET), None
+    return None, merged
+
+def _summarize_part(text: str, template: str) -> str:
+    profile = PROFILES["summarize"]
+    cached = cached_summary(http_cache, profile, text, template)
+    if cached is not None:
+        return cached
+    reply = llm_gateway.chat("summarize", **summary_request(profile, text, template))
+    return store_summary(http_cache, profile, text, template, reply["message"]["content"])
+
+def map_reduce(chunks: list[str]) -> str:
+    """
+    Summarize chunks concurrently (at most MAP_CONCURRENCY at a time), then merge the
+    partial summaries level by level until they fit one prompt. Every chunk summary is
+    cached by content hash, so a re-fetched page only pays for the chunks that changed.
+    """
+    logging.info(f"Map-reduce summarization over {len(chunks)} chunks")
+    parts, template = chunks, CHUNK_PROMPT
+    with ThreadPoolExecutor(max_workers=MAP_CONCURRENCY) as executor:
+        while True:
+            futures = [executor.submit(tracer.bind(_summarize_part), part, template) for part in parts]
+            result, merged = reduce_round(parts, [future.result() for future in futures])
+            if result is not None:
+                return result
+            parts, template = merged, REDUCE_PROMPT
+
+def prepare_summary_input(text: str) -> str:
+    """Compacted text for the final summarization; large inputs are map-reduced first."""
+    chunks = split_for_llm(text)
+    return chunks[0] if len(chunks) == 1 else map_reduce(chunks)
+
+def summarize_response(text: str, stream: bool = False):
+    if stream:
+        return summarize_response_stream(text)
     logging.info("Summarizing API response")
-    prompt = f"Summarize the following API response clearly:\n{text}"
     try:
-        reply = ollama_chat(model="llama3.2", messages=[{"role": "user", "content": prompt}])
-        result = reply["message"]["content"]
+        text = prepare_summary_input(text)
+        result = _summarize_part(text, SUMMARY_PROMPT)
         logging.info("Summarization completed")
         return result
     except Exception as e:
         logging.error(f"Error summarizing response: {e}")
         return f"Error summarizing response: {e}"
 
-
-def chat(user_msg: str) -> str:
-    logging.info(f"User message: {user_msg}")
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": user_msg}
-    ]
-
+def summarize_response_stream(text: str):
+    logging.info("Summarizing API response (streaming)")
     try:
-        llm_response = ollama_chat(model="llama3.2", messages=messages)
+        text = prepare_summary_input(text)
+        profile = PROFILES["summarize"]
+        cached = cached_summary(http_cache, profile, text, SUMMARY_PROMPT)
+        if cached is not None:
+            logging.info("Summary cache hit")
+            yield cached
+            return
+        parts = []
+        for chunk in llm_gateway.chat("summarize", stream=True, **summary_request(profile, text, SUMMARY_PROMPT)):
+            token = chunk["message"]["content"]
+            if token:
+                parts.append(token)
+                yield token
+        store_summary(http_cache, profile, text, SUMMARY_PROMPT, "".join(parts))
+        logging.info("Summarization completed")
     except Exception as e:
-        logging.error(f"LLM connection error: {e}")
-        return f"LLM connection error: {e}"
+        logging.error(f"Error summarizing response: {e}")
+        yield f"Error summarizing response: {e}"
+
+
+def complete_json_object(text: str):
+    """
+    Return the first JSON object in a partial LLM output once its closing brace has
+    arrived, or None while it is still incomplete.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                try:
+                    return json.loads(text[start:i + 1])
+                except ValueError:
+                    return None
+    return None
 
-    content = llm_response["message"]["content"]
-    logging.info(f"LLM response: {content}")
-    decision = extract_json(content)
+def looks_like_tool_call(text: str) -> bool:
+    """A reply that opens with a JSON object (optionally fenced) is treated as a tool call."""
+    head = text.lstrip()
+    return head.startswith("{") or head.startswith("`")
+
+
+def run_tool(decision: dict):
+    """
+    Execute a tool decision. Returns (result, needs_summary) so callers can decide
+    whether to hand the raw result to the summarizer. Known backend response shapes
+    are rendered locally and skip the summarizer entirely.
+    """
+    with tracer.span("tool", action=describe_decision(decision)) as span:
+        result, needs_summary = dispatch_tool(decision)
+        span.set(bytes_out=len(result or ""), needs_summary=needs_summary,
+                 error=result if looks_like_error(result) else None)
+        return result, needs_summary
+
+def invalid_url(decision: dict):
+    """Error to return instead of fetching, or None when the URL can be fetched."""
+    url = decision.get("url")
+    if not url or not url.startswith("http"):
+        logging.warning(f"Invalid URL: {url}")
+        return f"Invalid URL: {url}"
+    return None
 
-    if isinstance(decision, dict) and "action" in decision:
-        action = decision["action"]
+def tool_outcome(decision: dict, raw: str):
+    """(result, needs_summary) for a raw fetch_url or manage_users response."""
+    user_id = decision.get("user_id")
+    rendered = render_tool_result(raw, method=decision.get("method", "GET"), target=f"user {user_id}" if user_id else None)
+    return (rendered, False) if rendered is not None else (raw, True)
+
+def dispatch_tool(decision: dict):
+    action = decision["action"]
+
+    if action == "get_weather":
+        return call_weather(decision.get("city")), False
+
+    elif action == "fetch_url":
+        error = invalid_url(decision)
+        if error:
+            return error, False
+        raw = fetch_url_content(decision["url"], method=decision.get("method", "GET"), data=decision.get("data"))
+        return tool_outcome(decision, raw)
+
+    elif action == "manage_users":
+        raw = call_user_api(method=decision.get("method", "GET"), user_id=decision.get("user_id"), data=decision.get("data"))
+        return tool_outcome(decision, raw)
+
+    return None, False
+
+
+def describe_decision(decision: dict) -> str:
+    if decision["action"] == "get_weather":
+        return f"get_weather {decision.get('city')}"
+    if decision["action"] == "manage_users":
+        target = f" {decision['user_id']}" if decision.get("user_id") else ""
+        return f"manage_users {decision.get('method', 'GET')}{target}"
+    return f"fetch_url {decision.get('method', 'GET')} {decision.get('url')}"
+
+def batch_user_lookups(plan: list[dict]):
+    """
+    Split out single-user GETs when there are several of them: one /users?ids=... call
+    answers them all. Returns (user_ids, remaining plan).
+    """
+    lookups = [d for d in plan if d["action"] == "manage_users" and d.get("method", "GET") == "GET" and d.get("user_id")]
+    user_ids = [d["user_id"] for d in lookups]
+    if len(lookups) < 2 or len(set(user_ids)) > USER_BATCH_LIMIT \
+            or not all(isinstance(user_id, int) and user_id > 0 for user_id in user_ids):
+        return [], plan
+    return user_ids, [d for d in plan if d not in lookups]
+
+def user_list_params(user_ids: list[int]) -> dict:
+    """Query of the /users call that returns exactly these users, in one page"""
+    unique = sorted(set(user_ids))
+    return {"ids": ",".join(map(str, unique)), "limit": len(unique)}
+
+def split_user_list(raw: str, user_ids: list[int]) -> dict:
+    """
+    Per-id JSON results carved out of one /users page, matching the single-user API.
+    Ids past the end of a page that has more after it are left out, for the caller
+    to look up one by one.
+    """
+    try:
+        page = json.loads(raw)
+        users = {u["user_id"]: u for u in page["items"]}
+        complete = not page["next_cursor"]
+    except (ValueError, TypeError, KeyError):
+        return {user_id: raw for user_id in user_ids}
+    results = {}
+    for user_id in user_ids:
+        if user_id in users:
+            results[user_id] = json.dumps(users[user_id])
+        elif complete or (users and user_id < max(users)):
+            results[user_id] = json.dumps({"detail": f"User with ID {user_id} not found"})
+    return results
+
+def batch_outcomes(raw: str, user_ids: list[int]):
+    """
+    Outcomes for the ids one /users page answered, and the single-user lookups still to
+    run for the ids it did not.
+    """
+    found = split_user_list(raw, user_ids)
+    outcomes = []
+    for user_id, user_raw in found.items():
+        decision = {"action": "manage_users", "method": "GET", "user_id": user_id}
+        outcomes.append((decision, *tool_outcome(decision, user_raw)))
+    missing = [{"action": "manage_users", "method": "GET", "user_id": user_id} for user_id in user_ids if user_id not in found]
+    return outcomes, missing
+
+def combine_results(outcomes: list[tuple[dict, str, bool]]):
+    """
+    Merge per-action outcomes into one reply. If any part still needs the LLM, everything
+    goes into a single summarization instead of one per action.
+    """
+    if len(outcomes) == 1:
+        _, result, needs_summary = outcomes[0]
+        return result, needs_summary
+    needs_summary = any(n for _, _, n in outcomes)
+    if not needs_summary:
+        return "\n".join(result for _, result, _ in outcomes), False
+    # Each part gets an equal share of the summarization prompt budget
+    budget = SUMMARY_TOKEN_BUDGET // len(outcomes)
+    return "\n\n".join(f"[{describe_decision(d)}]\n{compact_for_llm(result, budget)}" for d, result, _ in outcomes), True
+
+def _batched_user_list(user_ids: list[int]) -> str:
+    with tracer.span("tool", action="manage_users GET (batched)") as span:
+        raw = call_user_api("GET", params=user_list_params(user_ids))
+        span.set(bytes_out=len(raw), error=raw if looks_like_error(raw) else None)
+        return raw
+
+def _run_with_start(decision: dict, started: threading.Event, start_times: dict):
+    start_times[id(decision)] = time.monotonic()
+    started.set()
+    return run_tool(decision)
+
+def run_plan(plan: list[dict]):
+    """
+    Execute a plan. A single action runs inline; several run on a bounded thread pool,
+    each with its own ACTION_TIMEOUT. Returns (result, needs_summary) like run_tool().
+    """
+    if len(plan) == 1:
+        return run_tool(plan[0])
+
+    user_ids, actions = batch_user_lookups(plan)
+    outcomes = []
+    executor = ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_ACTIONS, len(actions) + len(user_ids)))
+    try:
+        start_times = {}
+        batch = None
+        if user_ids:
+            batch = executor.submit(tracer.bind(_batched_user_list), user_ids)
+        jobs = []
+
+        def submit(decision: dict):
+            started = threading.Event()
+            jobs.append((decision, started, executor.submit(tracer.bind(_run_with_start), decision, started, start_times)))
+
+        for decision in actions:
+            submit(decision)
+
+        if batch is not None:
+            try:
+                raw = batch.result(timeout=ACTION_TIMEOUT)
+            except FutureTimeout:
+                raw = "FETCH_ERROR: timed out"
+            answered, missing = batch_outcomes(raw, user_ids)
+            outcomes.extend(answered)
+            # Ids the page did not answer join the other actions on the pool
+            for decision in missing:
+                submit(decision)
+
+        for decision, started, future in jobs:
+            started.wait()
+            remaining = ACTION_TIMEOUT - (time.monotonic() - start_times[id(decision)])
+            try:
+                result, needs_summary = future.result(timeout=max(remaining, 0))
+            except FutureTimeout:
+                logging.error(f"Action timed out: {describe_decision(decision)}")
+                result, needs_summary = f"{describe_decision(decision)}: timed out after {ACTION_TIMEOUT:.0f}s", False
+            if result is not None:
+                outcomes.append((decision, result, needs_summary))
+    finally:
+        # Timed-out actions keep their worker until the underlying call returns
+        executor.shutdown(wait=False)
+
+    if not outcomes:
+        return None, False
+    return combine_results(outcomes)
+
+
+def fast_plan(user_msg: str, router=None, cache=None, model: str = None, context: str = "") -> list[dict]:
+    """Plan without an LLM call: pre-router first, then the decision cache."""
+    model = model or PROFILES["decide"].model
+    router = pre_router if router is None else router
+    cache = decision_cache if cache is None else cache
+    plan = router.route(user_msg) if router else []
+    if not plan and cache:
+        plan = cache.get(user_msg, model, PROMPT_VERSION, context) or []
+        if plan:
+            logging.info(f"Decision cache hit: {plan}")
+    return plan
+
+def remember_plan(user_msg: str, plan: list[dict], cache=None, model: str = None, context: str = ""):
+    model = model or PROFILES["decide"].model
+    cache = decision_cache if cache is None else cache
+    if cache and plan:
+        cache.put(user_msg, model, PROMPT_VERSION, plan, context)
+
+
+def history_request(profile, previous: str, transcript: str) -> dict:
+    """Keyword arguments of the call that folds older turns into the running summary."""
+    prompt = HISTORY_PROMPT.format(previous=previous or "(none)", transcript=transcript)
+    return {"messages": [{"role": "user", "content": prompt}], **profile.request()}
+
+def tool_note(plan: list[dict]):
+    """What the turn did, kept with it in the history."""
+    return ", ".join(describe_decision(d) for d in plan) if plan else None
+
+def turn_messages(memory: ConversationMemory, user_msg: str) -> list[dict]:
+    """The session history and the new message, as sent to the decision model."""
+    return memory.messages(SYSTEM_PROMPT) + [{"role": "user", "content": user_msg}]
+
+def llm_error(e: Exception) -> str:
+    logging.error(f"LLM connection error: {e}")
+    return f"LLM connection error: {e}"
+
+def summarize_history(previous: str, transcript: str) -> str:
+    """Fold older turns into the running conversation summary (runs in the background)."""
+    reply = llm_gateway.chat("compact", **history_request(PROFILES["compact"], previous, transcript))
+    return reply["message"]["content"]
+
+def remember_turn(memory: ConversationMemory, user_msg: str, reply: str, plan: list[dict]):
+    memory.add_turn(user_msg, reply, tool_note(plan))
+    memory.compact_in_background(summarize_history)
+
+
+def needs_escalation(message, plan: list[dict]) -> bool:
+    """The decision model attempted a tool call but produced no valid plan."""
+    return not plan and bool(message.get("tool_calls") or looks_like_tool_call(message["content"] or ""))
+
+class DecisionStream:
+    """
+    State machine of a streamed decision, fed the parsed chunks by the sync and async
+    agents so only the I/O differs between them. Plain replies are handed back token by
+    token to show the user. A reply that opens with JSON is buffered only until the object
+    closes, and native tool_calls end it as soon as they arrive; `done` then tells the
+    caller to cut generation off and run the plan.
+    """
+
+    def __init__(self):
+        self.content = ""
+        self.plan: list[dict] = []
+        # None until the first visible token shows whether the reply is a tool call
+        self.tool_mode = None
+        self.done = False
+
+    def feed(self, chunk) -> str:
+        """Text to show for this chunk ("" for none)."""
+        tool_calls = chunk["message"].get("tool_calls")
+        if tool_calls:
+            self.tool_mode, self.done = True, True
+            self.plan = plan_from_tool_calls(tool_calls)
+            return ""
+        token = chunk["message"]["content"]
+        if not token:
+            return ""
+        self.content += token
+        if self.tool_mode is None:
+            if not self.content.strip():
+                return ""
+            self.tool_mode = looks_like_tool_call(self.content)
+            if not self.tool_mode:
+                return self.content
+        elif not self.tool_mode:
+            return token
+
+        if complete_json_object(self.content) is not None:
+            self.plan = plan_from_message({"content": self.content})
+            self.done = True
+        return ""
+
+    def recoverable(self, can_escalate: bool) -> bool:
+        """After the stream failed: whether the fallback may answer (nothing shown yet)."""
+        if self.content or not can_escalate:
+            return False
+        self.tool_mode = None
+        return True
+
+    def escalation_reason(self, can_escalate: bool):
+        """"error" when the model gave nothing, "invalid" for an unusable tool call, else None."""
+        if not can_escalate:
+            return None
+        if self.tool_mode is None and not self.content:
+            return "error"
+        if self.tool_mode and not self.plan:
+            return "invalid"
+        return None
+
+    def escalated(self, message, plan: list[dict]) -> str:
+        """Take the fallback's reply; returns it when it is plain text to show."""
+        self.content = message["content"] or ""
+        self.plan = plan
+        self.tool_mode = bool(plan) or needs_escalation(message, plan)
+        return "" if self.tool_mode else self.content
+
+
+def can_escalate(profiles: dict = None) -> bool:
+    profiles = profiles or PROFILES
+    return profiles["fallback"].model != profiles["decide"].model
+
+def invalid_decision(profiles: dict, message, plan: list[dict]) -> bool:
+    """The decision should be repeated on the fallback profile."""
+    return can_escalate(profiles) and needs_escalation(message, plan)
+
+def decision_request(profile, messages: list[dict]) -> dict:
+    """Keyword arguments of a decision call on `profile`."""
+    return {"messages": messages, "tools": TOOLS, **profile.request()}
+
+def escalation_started(profiles: dict, reason: str) -> dict:
+    """Log an escalation and return the attributes of its trace span."""
+    decide, fallback = profiles["decide"], profiles["fallback"]
+    logging.warning(f"Escalating decision from {decide.model} to {fallback.model} ({reason})")
+    return {"reason": reason, "from_model": decide.model, "to_model": fallback.model}
+
+def escalate(messages: list[dict], reason: str):
+    """Repeat the decision on the fallback profile. Returns (message, plan)."""
+    with tracer.span("escalation", **escalation_started(PROFILES, reason)):
+        message = llm_gateway.chat("decide", **decision_request(PROFILES["fallback"], messages))["message"]
+    return message, plan_from_message(message)
+
+def decide(messages: list[dict]):
+    """Decision on the small model, escalated when it errors or returns an invalid tool call."""
+    try:
+        message = llm_gateway.chat("decide", **decision_request(PROFILES["decide"], messages))["message"]
+    except Exception as e:
+        if not can_escalate():
+            raise
+        logging.error(f"Decision model failed: {e}")
+        return escalate(messages, "error")
+    plan = plan_from_message(message)
+    if invalid_decision(PROFILES, message, plan):
+        return escalate(messages, "invalid")
+    return message, plan
+
+
+def chat(user_msg: str, stream: bool = False, session_id: str = DEFAULT_SESSION):
+    if stream:
+        return chat_stream(user_msg, session_id)
+    logging.info(f"User message: {user_msg}")
+    memory = memories.get(session_id)
+    with tracer.span("turn", root=True, session=session_id, bytes_in=len(user_msg)) as span:
+        reply, plan = chat_turn(user_msg, memory)
+        span.set(actions=len(plan), bytes_out=len(reply))
+    remember_turn(memory, user_msg, reply, plan)
+    return reply
+
+def chat_turn(user_msg: str, memory: ConversationMemory):
+    """One turn against the session history. Returns (reply, plan)."""
+    context = memory.context_for(user_msg)
+    plan = fast_plan(user_msg, context=context)
+    if plan:
+        result, needs_summary = run_plan(plan)
+        return (summarize_response(result) if needs_summary else result), plan
 
-        if action == "get_weather":
-            city = decision.get("city")
-            return call_weather(city)
+    try:
+        message, plan = decide(turn_messages(memory, user_msg))
+    except Exception as e:
+        return llm_error(e), []
+
+    content = message["content"]
+    logging.info(f"LLM response: {content} | Tool calls: {message.get('tool_calls')}")
+
+    if plan:
+        remember_plan(user_msg, plan, context=context)
+        result, needs_summary = run_plan(plan)
+        if result is not None:
+            return (summarize_response(result) if needs_summary else result), plan
+
+    return content or INVALID_TOOL_CALL, plan
+
+def chat_stream(user_msg: str, session_id: str = DEFAULT_SESSION):
+    """
+    Streaming variant of chat(). Plain replies are yielded token by token. A reply that
+    opens with JSON is buffered only until the object closes; generation is then cut off
+    and the tool runs without waiting for the model to finish. Native tool_calls cut the
+    stream the same way as soon as they arrive.
+    """
+    logging.info(f"User message: {user_msg}")
+    memory = memories.get(session_id)
+    turn = {"plan": []}
+    parts = []
+    with tracer.span("turn", root=True, session=session_id, bytes_in=len(user_msg), stream=True) as span:
+        try:
+            for token in chat_turn_stream(user_msg, memory, turn):
+                parts.append(token)
+                yield token
+        finally:
+            span.set(actions=len(turn["plan"]), bytes_out=sum(len(p) for p in parts))
+            remember_turn(memory, user_msg, "".join(parts), turn["plan"])
+
+def stream_result(result: str, needs_summary: bool):
+    if needs_summary:
+        yield from summarize_response_stream(result)
+    else:
+        yield result
+
+def chat_turn_stream(user_msg: str, memory: ConversationMemory, turn: dict):
+    context = memory.context_for(user_msg)
+    plan = fast_plan(user_msg, context=context)
+    if plan:
+        turn["plan"] = plan
+        yield from stream_result(*run_plan(plan))
+        return
+
+    messages = turn_messages(memory, user_msg)
+
+    decision = DecisionStream()
+    try:
+        llm_stream = llm_gateway.chat("decide", stream=True, **decision_request(PROFILES["decide"], messages))
+        for chunk in llm_stream:
+            text = decision.feed(chunk)
+            if text:
+                yield text
+            if decision.done:
+                break
+        if hasattr(llm_stream, "close"):
+            llm_stream.close()
+    except Exception as e:
+        if not decision.recoverable(can_escalate()):
+            yield llm_error(e)
+            return
+        logging.error(f"Decision model failed: {e}")
+
+    reason = decision.escalation_reason(can_escalate())
+    if reason:
+        # Nothing has been shown to the user yet, so the fallback model can answer instead
+        try:
+            text = decision.escalated(*escalate(messages, reason))
+        except Exception as e:
+            yield llm_error(e)
+            return
+        if text:
+            yield text
 
-        elif action == "fetch_url":
-            url = decision.get("url")
-            if not url or not url.startswith("http"):
-                logging.warning(f"Invalid URL: {url}")
-                return f"Invalid URL: {url}"
-            method = decision.get("method", "GET")
-            data = decision.get("data")
-            raw = fetch_url_content(url, method=method, data=data)
-            return summarize_response(raw)
+    logging.info(f"LLM response: {decision.content} | Plan: {decision.plan}")
+    if not decision.tool_mode:
+        return
 
-        elif action == "manage_users":
-            method = decision.get("method", "GET")
-            user_id = decision.get("user_id")
-            data = decision.get("data")
-            raw = call_user_api(method=method, user_id=user_id, data=data)
-            return summarize_response(raw)
+    if decision.plan:
+        turn["plan"] = decision.plan
+        remember_plan(user_msg, decision.plan, context=context)
+        result, needs_summary = run_plan(decision.plan)
+        if result is not None:
+            yield from stream_result(result, needs_summary)
+            return
 
-    return content
+    yield decision.content or INVALID_TOOL_CALL
 
 
 def main():
+    use_embedded_backend(os.environ.get("AGENT_BACKEND", "http"))
+    threading.Thread(target=llm_gateway.warmup, args=(warmup_profiles(PROFILES),), daemon=True).start()
+    if os.environ.get("AGENT_METRICS_PORT"):
+        tracer.serve_metrics(int(os.environ["AGENT_METRICS_PORT"]))
     logging.info("Agent started")
     print("Agent active. Type 'exit' to quit.")
     while True:
@@ -195,8 +901,10 @@ def main():
         if msg.lower() in ("exit", "quit"):
             logging.info("Agent shutting down")
             break
-        response = chat(msg)
-        print("Assistant:", response, "\n")
+        print("Assistant: ", end="", flush=True)
+        for token in chat(msg, stream=True):
+            print(token, end="", flush=True)
+        print("\n")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,476 @@
+import asyncio
+import logging
+import os
+from urllib.parse import urlsplit
+
+import httpx
+from ollama import AsyncClient
+
+from agent import (
+    ACTION_TIMEOUT,
+    BACKEND_URL,
+    CHUNK_PROMPT,
+    DEFAULT_SESSION,
+    DecisionStream,
+    FetchRequest,
+    INVALID_TOOL_CALL,
+    MAP_CONCURRENCY,
+    MAX_PARALLEL_ACTIONS,
+    PROFILES,
+    REDUCE_PROMPT,
+    SUMMARY_PROMPT,
+    batch_outcomes,
+    batch_user_lookups,
+    cached_summary,
+    can_escalate,
+    combine_results,
+    decision_request,
+    describe_decision,
+    escalation_started,
+    fast_plan,
+    history_request,
+    http_cache as shared_http_cache,
+    invalid_decision,
+    invalid_url,
+    llm_error,
+    plan_from_message,
+    reduce_round,
+    remember_plan,
+    store_summary,
+    summary_request,
+    tool_note,
+    tool_outcome,
+    turn_messages,
+    user_api_url,
+    user_list_params,
+    weather_error,
+    weather_result,
+    weather_url,
+)
+from compaction import split_for_llm
+from content import CHUNK_SIZE, MAX_FETCH_BYTES, aread_capped
+from llm_gateway import AsyncLLMGateway
+from memory import ConversationMemory, MemoryStore
+from profiles import ModelProfile, profile_models, shared_num_ctx, warmup_profiles
+from tracing import looks_like_error, tracer
+
+# Pool sizing for the shared HTTP client
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 30.0
+PER_HOST_LIMIT = 10
+REQUEST_TIMEOUT = 15.0
+
+
+class AsyncChat:
+    """
+    Asyncio version of the agent. One instance owns a single Ollama async client and a
+    single keep-alive HTTP pool, so many conversations can run concurrently in one process.
+    """
+
+    def __init__(
+        self,
+        model: str = None,
+        ollama_host: str = None,
+        backend_url: str = BACKEND_URL,
+        per_host_limit: int = PER_HOST_LIMIT,
+        http_client: httpx.AsyncClient = None,
+        backend_mode: str = "http",
+        router=None,
+        decision_cache=None,
+        http_cache=None,
+        profiles: dict[str, ModelProfile] = None,
+    ):
+        # Per-stage profiles default to agent.PROFILES; `model` forces one model for every stage
+        profiles = dict(profiles or PROFILES)
+        if model:
+            profiles = {stage: p.model_copy(update={"model": model}) for stage, p in profiles.items()}
+        self.profiles = shared_num_ctx(profiles)
+        # None means the module-wide agent.pre_router / agent.decision_cache / agent.http_cache, False disables
+        self.router = router
+        self.decision_cache = decision_cache
+        self.http_cache = shared_http_cache if http_cache is None else (http_cache or None)
+        self.memories = MemoryStore()
+        self._background: set[asyncio.Task] = set()
+        self.backend_url = backend_url
+        self.per_host_limit = per_host_limit
+        self.llm = AsyncLLMGateway(AsyncClient(host=ollama_host))
+        self.http = http_client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(REQUEST_TIMEOUT),
+        )
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+
+        # "asgi"/"direct" keep backend traffic in-process, see agent.use_embedded_backend()
+        if backend_mode not in ("http", "asgi", "direct"):
+            raise ValueError(f"Unknown backend mode: {backend_mode}")
+        self.backend_mode = backend_mode
+        self.backend_http = self.http
+        self.direct = None
+        if backend_mode != "http":
+            import embedded
+            self.backend_http = embedded.async_asgi_client()
+            if backend_mode == "direct":
+                self.direct = embedded.DirectBackend()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+        if self.backend_http is not self.http:
+            await self.backend_http.aclose()
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def _request(self, method: str, url: str, headers: dict = None, data: dict = None) -> httpx.Response:
+        client = self.backend_http if url.startswith(self.backend_url) else self.http
+        async with self._host_limit(url):
+            return await client.request(method, url, headers=headers, json=data)
+
+    async def fetch_url_content(self, url: str, method: str = "GET", headers: dict = None, data: dict = None) -> str:
+        """Async counterpart of agent.fetch_url_content(): streamed, capped at MAX_FETCH_BYTES."""
+        fetch = FetchRequest(self.http_cache, url, method, headers, data)
+        # Cache lookups and content extraction run off the event loop
+        early = await asyncio.to_thread(fetch.early_result)
+        if early is not None:
+            return early
+        client = self.backend_http if url.startswith(self.backend_url) else self.http
+        try:
+            async with self._host_limit(url):
+                async with client.stream(fetch.method, url, headers=fetch.headers, json=fetch.json) as response:
+                    if fetch.revalidates(response):
+                        return await asyncio.to_thread(fetch.revalidated, response)
+                    body, truncated = await aread_capped(response.aiter_bytes(CHUNK_SIZE), MAX_FETCH_BYTES)
+            return await asyncio.to_thread(fetch.result, response, body, truncated)
+        except Exception as e:
+            logging.error(f"Fetch error: {e}")
+            return f"FETCH_ERROR: {e}"
+
+    async def call_weather(self, city: str) -> str:
+        url = weather_url(self.backend_url, city)
+        try:
+            if self.direct is not None:
+                return weather_result(await self.direct.aweather(city))
+            response = await self._request("GET", url)
+            response.raise_for_status()
+            return weather_result(response.json())
+        except Exception as e:
+            return weather_error(e)
+
+    async def call_user_api(self, method: str, user_id: int = None, data: dict = None, params: dict = None) -> str:
+        url = user_api_url(self.backend_url, method, user_id, data, params)
+        if self.direct is not None:
+            return await self.direct.ausers(method, user_id=user_id, data=data, params=params)
+        return await self.fetch_url_content(url, method=method, data=data)
+
+    async def _summarize_part(self, text: str, template: str) -> str:
+        profile = self.profiles["summarize"]
+        cached = await asyncio.to_thread(cached_summary, self.http_cache, profile, text, template)
+        if cached is not None:
+            return cached
+        reply = await self.llm.chat("summarize", **summary_request(profile, text, template))
+        return await asyncio.to_thread(store_summary, self.http_cache, profile, text, template, reply["message"]["content"])
+
+    async def map_reduce(self, chunks: list[str]) -> str:
+        """Async counterpart of agent.map_reduce()."""
+        logging.info(f"Map-reduce summarization over {len(chunks)} chunks")
+        limit = asyncio.Semaphore(MAP_CONCURRENCY)
+        parts, template = chunks, CHUNK_PROMPT
+
+        async def summarize(part: str) -> str:
+            async with limit:
+                return await self._summarize_part(part, template)
+
+        while True:
+            result, merged = reduce_round(parts, await asyncio.gather(*(summarize(part) for part in parts)))
+            if result is not None:
+                return result
+            parts, template = merged, REDUCE_PROMPT
+
+    async def prepare_summary_input(self, text: str) -> str:
+        chunks = split_for_llm(text)
+        return chunks[0] if len(chunks) == 1 else await self.map_reduce(chunks)
+
+    async def summarize_response(self, text: str) -> str:
+        logging.info("Summarizing API response")
+        try:
+            text = await self.prepare_summary_input(text)
+            result = await self._summarize_part(text, SUMMARY_PROMPT)
+            logging.info("Summarization completed")
+            return result
+        except Exception as e:
+            logging.error(f"Error summarizing response: {e}")
+            return f"Error summarizing response: {e}"
+
+    async def summarize_response_stream(self, text: str):
+        logging.info("Summarizing API response (streaming)")
+        try:
+            text = await self.prepare_summary_input(text)
+            profile = self.profiles["summarize"]
+            cached = await asyncio.to_thread(cached_summary, self.http_cache, profile, text, SUMMARY_PROMPT)
+            if cached is not None:
+                logging.info("Summary cache hit")
+                yield cached
+                return
+            parts = []
+            async for chunk in await self.llm.chat("summarize", stream=True, **summary_request(profile, text, SUMMARY_PROMPT)):
+                token = chunk["message"]["content"]
+                if token:
+                    parts.append(token)
+                    yield token
+            await asyncio.to_thread(store_summary, self.http_cache, profile, text, SUMMARY_PROMPT, "".join(parts))
+            logging.info("Summarization completed")
+        except Exception as e:
+            logging.error(f"Error summarizing response: {e}")
+            yield f"Error summarizing response: {e}"
+
+    async def run_tool(self, decision: dict):
+        """Async counterpart of agent.run_tool(); returns (result, needs_summary)."""
+        with tracer.span("tool", action=describe_decision(decision)) as span:
+            result, needs_summary = await self.dispatch_tool(decision)
+            span.set(bytes_out=len(result or ""), needs_summary=needs_summary,
+                     error=result if looks_like_error(result) else None)
+            return result, needs_summary
+
+    async def dispatch_tool(self, decision: dict):
+        action = decision["action"]
+
+        if action == "get_weather":
+            return await self.call_weather(decision.get("city")), False
+
+        elif action == "fetch_url":
+            error = invalid_url(decision)
+            if error:
+                return error, False
+            raw = await self.fetch_url_content(decision["url"], method=decision.get("method", "GET"), data=decision.get("data"))
+            return tool_outcome(decision, raw)
+
+        elif action == "manage_users":
+            raw = await self.call_user_api(method=decision.get("method", "GET"), user_id=decision.get("user_id"), data=decision.get("data"))
+            return tool_outcome(decision, raw)
+
+        return None, False
+
+    async def _run_limited(self, limit: asyncio.Semaphore, decision: dict):
+        async with limit:
+            try:
+                return await asyncio.wait_for(self.run_tool(decision), ACTION_TIMEOUT)
+            except asyncio.TimeoutError:
+                logging.error(f"Action timed out: {describe_decision(decision)}")
+                return f"{describe_decision(decision)}: timed out after {ACTION_TIMEOUT:.0f}s", False
+
+    async def _batched_users(self, limit: asyncio.Semaphore, user_ids: list[int]):
+        async with limit:
+            with tracer.span("tool", action="manage_users GET (batched)") as span:
+                try:
+                    raw = await asyncio.wait_for(self.call_user_api("GET", params=user_list_params(user_ids)), ACTION_TIMEOUT)
+                except asyncio.TimeoutError:
+                    raw = "FETCH_ERROR: timed out"
+                span.set(bytes_out=len(raw), error=raw if looks_like_error(raw) else None)
+        outcomes, missing = batch_outcomes(raw, user_ids)
+        # Ids the page did not answer are looked up one by one
+        results = await asyncio.gather(*(self._run_limited(limit, d) for d in missing))
+        outcomes.extend((d, *result) for d, result in zip(missing, results))
+        return outcomes
+
+    async def run_plan(self, plan: list[dict]):
+        """Async counterpart of agent.run_plan(): concurrent actions, capped and individually timed out."""
+        if len(plan) == 1:
+            return await self.run_tool(plan[0])
+
+        limit = asyncio.Semaphore(MAX_PARALLEL_ACTIONS)
+        user_ids, actions = batch_user_lookups(plan)
+        batch = self._batched_users(limit, user_ids) if user_ids else None
+        results = await asyncio.gather(*(self._run_limited(limit, d) for d in actions), *([batch] if batch else []))
+
+        outcomes = []
+        if batch:
+            outcomes.extend(results.pop())
+        outcomes.extend((d, result, needs_summary) for d, (result, needs_summary) in zip(actions, results) if result is not None)
+        if not outcomes:
+            return None, False
+        return combine_results(outcomes)
+
+    async def summarize_history(self, previous: str, transcript: str) -> str:
+        reply = await self.llm.chat("compact", **history_request(self.profiles["compact"], previous, transcript))
+        return reply["message"]["content"]
+
+    def remember_turn(self, memory: ConversationMemory, user_msg: str, reply: str, plan: list[dict]):
+        memory.add_turn(user_msg, reply, tool_note(plan))
+        task = memory.acompact_in_background(self.summarize_history)
+        if task is not None:
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    def forget(self, session_id: str):
+        self.memories.forget(session_id)
+
+    @property
+    def model(self) -> str:
+        return self.profiles["fallback"].model
+
+    def models(self) -> list[str]:
+        return profile_models(self.profiles)
+
+    async def escalate(self, messages: list[dict], reason: str):
+        """Async counterpart of agent.escalate()."""
+        with tracer.span("escalation", **escalation_started(self.profiles, reason)):
+            message = (await self.llm.chat("decide", **decision_request(self.profiles["fallback"], messages)))["message"]
+        return message, plan_from_message(message)
+
+    async def decide(self, messages: list[dict]):
+        """Async counterpart of agent.decide()."""
+        try:
+            message = (await self.llm.chat("decide", **decision_request(self.profiles["decide"], messages)))["message"]
+        except Exception as e:
+            if not can_escalate(self.profiles):
+                raise
+            logging.error(f"Decision model failed: {e}")
+            return await self.escalate(messages, "error")
+        plan = plan_from_message(message)
+        if invalid_decision(self.profiles, message, plan):
+            return await self.escalate(messages, "invalid")
+        return message, plan
+
+    async def chat(self, user_msg: str, session_id: str = DEFAULT_SESSION) -> str:
+        logging.info(f"User message: {user_msg}")
+        memory = self.memories.get(session_id)
+        with tracer.span("turn", root=True, session=session_id, bytes_in=len(user_msg)) as span:
+            reply, plan = await self.chat_turn(user_msg, memory)
+            span.set(actions=len(plan), bytes_out=len(reply))
+        self.remember_turn(memory, user_msg, reply, plan)
+        return reply
+
+    async def chat_turn(self, user_msg: str, memory: ConversationMemory):
+        context = memory.context_for(user_msg)
+        plan = fast_plan(user_msg, self.router, self.decision_cache, self.profiles["decide"].model, context)
+        if plan:
+            result, needs_summary = await self.run_plan(plan)
+            return (await self.summarize_response(result) if needs_summary else result), plan
+
+        try:
+            message, plan = await self.decide(turn_messages(memory, user_msg))
+        except Exception as e:
+            return llm_error(e), []
+
+        content = message["content"]
+        logging.info(f"LLM response: {content} | Tool calls: {message.get('tool_calls')}")
+
+        if plan:
+            remember_plan(user_msg, plan, self.decision_cache, self.profiles["decide"].model, context)
+            result, needs_summary = await self.run_plan(plan)
+            if result is not None:
+                return (await self.summarize_response(result) if needs_summary else result), plan
+
+        return content or INVALID_TOOL_CALL, plan
+
+    async def chat_stream(self, user_msg: str, session_id: str = DEFAULT_SESSION):
+        """Async counterpart of agent.chat_stream(): yields tokens, cuts generation at a complete tool call."""
+        logging.info(f"User message: {user_msg}")
+        memory = self.memories.get(session_id)
+        turn = {"plan": []}
+        parts = []
+        with tracer.span("turn", root=True, session=session_id, bytes_in=len(user_msg), stream=True) as span:
+            try:
+                async for token in self.chat_turn_stream(user_msg, memory, turn):
+                    parts.append(token)
+                    yield token
+            finally:
+                span.set(actions=len(turn["plan"]), bytes_out=sum(len(p) for p in parts))
+                self.remember_turn(memory, user_msg, "".join(parts), turn["plan"])
+
+    async def stream_result(self, result: str, needs_summary: bool):
+        if needs_summary:
+            async for token in self.summarize_response_stream(result):
+                yield token
+        else:
+            yield result
+
+    async def chat_turn_stream(self, user_msg: str, memory: ConversationMemory, turn: dict):
+        context = memory.context_for(user_msg)
+        plan = fast_plan(user_msg, self.router, self.decision_cache, self.profiles["decide"].model, context)
+        if plan:
+            turn["plan"] = plan
+            async for token in self.stream_result(*await self.run_plan(plan)):
+                yield token
+            return
+
+        messages = turn_messages(memory, user_msg)
+
+        decision = DecisionStream()
+        try:
+            llm_stream = await self.llm.chat("decide", stream=True, **decision_request(self.profiles["decide"], messages))
+            async for chunk in llm_stream:
+                text = decision.feed(chunk)
+                if text:
+                    yield text
+                if decision.done:
+                    break
+            if hasattr(llm_stream, "aclose"):
+                await llm_stream.aclose()
+        except Exception as e:
+            if not decision.recoverable(can_escalate(self.profiles)):
+                yield llm_error(e)
+                return
+            logging.error(f"Decision model failed: {e}")
+
+        reason = decision.escalation_reason(can_escalate(self.profiles))
+        if reason:
+            try:
+                text = decision.escalated(*await self.escalate(messages, reason))
+            except Exception as e:
+                yield llm_error(e)
+                return
+            if text:
+                yield text
+
+        logging.info(f"LLM response: {decision.content} | Plan: {decision.plan}")
+        if not decision.tool_mode:
+            return
+
+        if decision.plan:
+            turn["plan"] = decision.plan
+            remember_plan(user_msg, decision.plan, self.decision_cache, self.profiles["decide"].model, context)
+            result, needs_summary = await self.run_plan(decision.plan)
+            if result is not None:
+                async for token in self.stream_result(result, needs_summary):
+                    yield token
+                return
+
+        yield decision.content or INVALID_TOOL_CALL
+
+
+async def main():
+    logging.info("Async agent started")
+    print("Agent active (async). Type 'exit' to quit.")
+    async with AsyncChat(backend_mode=os.environ.get("AGENT_BACKEND", "http")) as agent:
+        warmup = asyncio.create_task(agent.llm.warmup(warmup_profiles(agent.profiles)))
+        try:
+            while True:
+                msg = await asyncio.to_thread(input, "You: ")
+                if msg.lower() in ("exit", "quit"):
+                    logging.info("Agent shutting down")
+                    break
+                print("Assistant: ", end="", flush=True)
+                async for token in agent.chat_stream(msg):
+                    print(token, end="", flush=True)
+                print("\n")
+        finally:
+            # A warmup still loading a model must not outlive the client it runs on
+            warmup.cancel()
+            await asyncio.gather(warmup, return_exceptions=True)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,316 @@
+"""
+Offline benchmark and replay harness for the agent.
+
+Replays a corpus of prompts through agent.chat() against a scripted Ollama stand-in and
+an in-memory backend, so latency and decision accuracy can be measured without llama3.2
+or a running backend. Writes a JSON report meant to be diffed between commits.
+
+    python bench.py                                  # default corpus, report on stdout
+    python bench.py --out before.json --repeat 5
+    python bench.py --record recorded.json           # capture live llama3.2 decisions for replay
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import sys
+import time
+
+import agent
+from compaction import estimate_tokens
+from llm_gateway import LLMGateway, LLMMetrics, percentile
+from tracing import looks_like_error
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_corpus.json")
+
+# Simulated model timings (seconds): time to first token, then per generated token
+DEFAULT_DECIDE_DELAY = 0.05
+DEFAULT_SUMMARIZE_DELAY = 0.08
+DEFAULT_TOKEN_DELAY = 0.002
+DEFAULT_BACKEND_DELAY = 0.005
+
+STUB_SUMMARY = "Here is a short summary of the response."
+
+
+def latency_summary(values: list[float]) -> dict:
+    return {"count": len(values), "p50": percentile(values, 0.50), "p95": percentile(values, 0.95), "p99": percentile(values, 0.99)}
+
+
+def last_user_message(messages: list[dict]) -> str:
+    for message in reversed(messages):
+        if message["role"] == "user":
+            return message["content"]
+    return ""
+
+
+class StubOllama:
+    """
+    Deterministic stand-in for ollama.Client. Decision calls (requests carrying tools) are
+    answered from a script keyed by the prompt; everything else gets a canned summary.
+    Replies carry prompt_eval_count/eval_count estimates so token metrics are populated.
+    """
+
+    def __init__(self, script: dict, decide_delay: float = DEFAULT_DECIDE_DELAY,
+                 summarize_delay: float = DEFAULT_SUMMARIZE_DELAY, token_delay: float = DEFAULT_TOKEN_DELAY):
+        self.script = script
+        self.decide_delay = decide_delay
+        self.summarize_delay = summarize_delay
+        self.token_delay = token_delay
+
+    def _reply(self, request: dict) -> tuple[dict, float]:
+        if request.get("tools"):
+            scripted = self.script.get(last_user_message(request["messages"]), {"content": "I am not sure how to help with that."})
+            return {"role": "assistant", "content": scripted.get("content", ""), "tool_calls": scripted.get("tool_calls")}, self.decide_delay
+        return {"role": "assistant", "content": STUB_SUMMARY}, self.summarize_delay
+
+    def generate(self, **request):
+        return {"response": "", "done": True}
+
+    def chat(self, stream: bool = False, **request):
+        message, delay = self._reply(request)
+        prompt_tokens = sum(estimate_tokens(m["content"] or "") for m in request["messages"])
+        completion_tokens = estimate_tokens(message["content"] or json.dumps(message.get("tool_calls") or ""))
+        if stream:
+            return self._stream(message, delay, prompt_tokens, completion_tokens)
+        time.sleep(delay + self.token_delay * completion_tokens)
+        return {"message": message, "done": True, "prompt_eval_count": prompt_tokens, "eval_count": completion_tokens}
+
+    def _stream(self, message: dict, delay: float, prompt_tokens: int, completion_tokens: int):
+        time.sleep(delay)
+        if message.get("tool_calls"):
+            time.sleep(self.token_delay * completion_tokens)
+            yield {"message": {"role": "assistant", "content": "", "tool_calls": message["tool_calls"]}, "done": False}
+        else:
+            for word in message["content"].split(" "):
+                time.sleep(self.token_delay)
+                yield {"message": {"role": "assistant", "content": word + " "}, "done": False}
+        yield {"message": {"role": "assistant", "content": ""}, "done": True,
+               "prompt_eval_count": prompt_tokens, "eval_count": completion_tokens}
+
+    def close(self):
+        pass
+
+
+class RecordingClient:
+    """Wraps a live ollama.Client and keeps each decision reply so it can be replayed later."""
+
+    def __init__(self, client):
+        self.client = client
+        self.recorded: dict[str, dict] = {}
+
+    def generate(self, **request):
+        return self.client.generate(**request)
+
+    def chat(self, **request):
+        response = self.client.chat(**request)
+        if request.get("tools") and not request.get("stream"):
+            message = response["message"]
+            calls = [{"function": {"name": c["function"]["name"], "arguments": dict(c["function"]["arguments"])}}
+                     for c in message.get("tool_calls") or []]
+            self.recorded[last_user_message(request["messages"])] = {"content": message["content"] or "", "tool_calls": calls or None}
+        return response
+
+
+class StubBackend:
+    """In-memory stand-in with the DirectBackend interface, plus canned responses for fetch_url."""
+
+    def __init__(self, delay: float = DEFAULT_BACKEND_DELAY, users: dict = None):
+        self.delay = delay
+        self.accounts = dict(users or {1: "alice", 2: "bob", 3: "carol"})
+        self.next_id = max(self.accounts, default=0) + 1
+
+    def weather(self, city: str) -> dict:
+        time.sleep(self.delay)
+        return {"city": city, "temperature": round(10 + len(city) * 1.5, 1), "description": "Partly cloudy"}
+
+    def users(self, method: str, user_id: int = None, data: dict = None, params: dict = None) -> str:
+        time.sleep(self.delay)
+        method = method.upper()
+        if method == "GET" and not user_id:
+            wanted = {int(i) for i in str((params or {}).get("ids", "")).split(",") if i}
+            items = [{"user_id": i, "user_name": n} for i, n in sorted(self.accounts.items()) if not wanted or i in wanted]
+            return json.dumps({"items": items, "next_cursor": None, "total_estimate": len(items)})
+        if method == "POST":
+            user_id, self.next_id = self.next_id, self.next_id + 1
+            self.accounts[user_id] = (data or {}).get("user_name", "")
+        elif user_id not in self.accounts:
+            return json.dumps({"detail": f"User with ID {user_id} not found"})
+        elif method == "PUT":
+            self.accounts[user_id] = (data or {}).get("user_name", self.accounts[user_id])
+        elif method == "DELETE":
+            del self.accounts[user_id]
+            return ""
+        return json.dumps({"user_id": user_id, "user_name": self.accounts[user_id]})
+
+    def fetch(self, url: str, method: str = "GET", headers: dict = None, data: dict = None) -> str:
+        time.sleep(self.delay)
+        body = {"url": url, "method": method, "items": [{"id": i, "title": f"Item {i}", "tags": ["a", "b"]} for i in range(20)]}
+        return json.dumps(body, separators=(",", ":"))
+
+
+def decision_matches(expected: list[dict], actual: list[dict]) -> bool:
+    """Same number of calls, and every expected call is a subset of a distinct actual call."""
+    if len(expected) != len(actual):
+        return False
+    remaining = list(actual)
+    for want in expected:
+        match = next((d for d in remaining if all(d.get(k) == v for k, v in want.items())), None)
+        if match is None:
+            return False
+        remaining.remove(match)
+    return True
+
+
+def load_corpus(path: str) -> list[dict]:
+    with open(path) as f:
+        return json.load(f)["cases"]
+
+
+def run_benchmark(cases: list[dict], repeat: int = 1, stream: bool = False, use_router: bool = True,
+                  use_cache: bool = False, client=None, backend: StubBackend = None) -> dict:
+    """Replay every case `repeat` times through agent.chat() and return the report dict."""
+    script = {case["prompt"]: case["response"] for case in cases if "response" in case}
+    client = client or StubOllama(script)
+    backend = backend or StubBackend()
+
+    gateway = LLMGateway(client=client)
+    gateway.metrics = LLMMetrics(window=None)
+    tool_latencies = []
+    turn_latencies = []
+    plans = []
+    original = {name: getattr(agent, name) for name in ("llm_gateway", "direct_backend", "fetch_url_content", "run_plan", "pre_router", "decision_cache", "memories", "http_cache")}
+
+    def timed_run_plan(plan):
+        plans.append(plan)
+        start = time.perf_counter()
+        try:
+            return original["run_plan"](plan)
+        finally:
+            tool_latencies.append(time.perf_counter() - start)
+
+    agent.llm_gateway = gateway
+    agent.direct_backend = backend
+    agent.fetch_url_content = backend.fetch
+    agent.run_plan = timed_run_plan
+    agent.pre_router = original["pre_router"] if use_router else None
+    agent.decision_cache = agent.DecisionCache() if use_cache else None
+    agent.memories = agent.MemoryStore()
+    agent.http_cache = None
+
+    results = []
+    try:
+        for round_index in range(repeat):
+            for index, case in enumerate(cases):
+                session_id = case.get("session", f"bench-{round_index}-{index}")
+                plans.clear()
+                start = time.perf_counter()
+                if stream:
+                    reply = "".join(agent.chat(case["prompt"], stream=True, session_id=session_id))
+                else:
+                    reply = agent.chat(case["prompt"], session_id=session_id)
+                turn_latencies.append(time.perf_counter() - start)
+                actual = copy.deepcopy(plans[0]) if plans else []
+                results.append({"case": case, "plan": actual, "reply": reply})
+    finally:
+        for name, value in original.items():
+            setattr(agent, name, value)
+
+    llm = gateway.metrics.snapshot()
+    scored = [r for r in results if "expect" in r["case"]]
+    failures = [r for r in scored if not decision_matches(r["case"]["expect"], r["plan"])]
+    seen = set()
+    failure_report = []
+    for r in failures:
+        if r["case"]["prompt"] not in seen:
+            seen.add(r["case"]["prompt"])
+            failure_report.append({"prompt": r["case"]["prompt"], "expected": r["case"]["expect"], "actual": r["plan"]})
+    # Replies that are errors fail the case even when the tool choice was right
+    errored = [r for r in results if looks_like_error(r["reply"])]
+    for r in errored:
+        if ("error", r["case"]["prompt"]) not in seen:
+            seen.add(("error", r["case"]["prompt"]))
+            failure_report.append({"prompt": r["case"]["prompt"], "error": r["reply"][:200]})
+
+    def stage(kind: str) -> dict:
+        stats = llm.get(kind, {})
+        return {"count": stats.get("calls", 0), "p50": stats.get("latency_p50"), "p95": stats.get("latency_p95"), "p99": stats.get("latency_p99")}
+
+    return {
+        "config": {
+            "cases": len(cases), "repeat": repeat, "stream": stream, "router": use_router, "cache": use_cache,
+            "models": {stage: profile.model for stage, profile in sorted(agent.PROFILES.items())},
+            "prompt_version": agent.PROMPT_VERSION,
+        },
+        "stages": {
+            "decision": stage("decide"),
+            "tool": latency_summary(tool_latencies),
+            "summarize": stage("summarize"),
+            "turn": latency_summary(turn_latencies),
+        },
+        "tokens": {
+            "in": sum(s["prompt_tokens"] for s in llm.values()),
+            "out": sum(s["completion_tokens"] for s in llm.values()),
+            "by_kind": {kind: {"in": s["prompt_tokens"], "out": s["completion_tokens"]} for kind, s in sorted(llm.items())},
+        },
+        "accuracy": {
+            "scored": len(scored),
+            "correct": len(scored) - len(failures),
+            "tool_choice": round((len(scored) - len(failures)) / len(scored), 4) if scored else None,
+        },
+        "llm_bypassed": len(results) - stage("decide")["count"],
+        "errors": len(errored),
+        "failures": failure_report,
+    }
+
+
+def record(cases: list[dict], path: str):
+    """Run the corpus against live Ollama and save its decisions as a replayable corpus."""
+    client = RecordingClient(agent.llm_gateway.client)
+    run_benchmark([{k: v for k, v in c.items() if k != "response"} for c in cases], use_router=False, client=client)
+    recorded = [{**case, "response": client.recorded[case["prompt"]]} if case["prompt"] in client.recorded else case for case in cases]
+    with open(path, "w") as f:
+        json.dump({"cases": recorded}, f, indent=2)
+    logging.info(f"Recorded {len(client.recorded)} decisions to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a prompt corpus through the agent with a stub LLM and backend")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stream", action="store_true", help="Use the streaming chat path")
+    parser.add_argument("--no-router", action="store_true", help="Send every prompt to the (stub) LLM")
+    parser.add_argument("--cache", action="store_true", help="Enable the in-memory decision cache")
+    parser.add_argument("--decide-delay", type=float, default=DEFAULT_DECIDE_DELAY)
+    parser.add_argument("--summarize-delay", type=float, default=DEFAULT_SUMMARIZE_DELAY)
+    parser.add_argument("--token-delay", type=float, default=DEFAULT_TOKEN_DELAY)
+    parser.add_argument("--backend-delay", type=float, default=DEFAULT_BACKEND_DELAY)
+    parser.add_argument("--record", metavar="PATH", help="Record live Ollama decisions for the corpus into PATH")
+    args = parser.parse_args()
+
+    cases = load_corpus(args.corpus)
+    if args.record:
+        record(cases, args.record)
+        return
+
+    script = {case["prompt"]: case["response"] for case in cases if "response" in case}
+    report = run_benchmark(
+        cases,
+        repeat=args.repeat,
+        stream=args.stream,
+        use_router=not args.no_router,
+        use_cache=args.cache,
+        client=StubOllama(script, args.decide_delay, args.summarize_delay, args.token_delay),
+        backend=StubBackend(args.backend_delay),
+    )
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import json
+import re
+from typing import Any, Optional
+
+# Prompt budget for one summarization call, in estimated tokens
+SUMMARY_TOKEN_BUDGET = 3000
+# Row caps tried in order until the payload fits the budget
+ROW_CAPS = (50, 20, 10, 5, 2)
+MAX_STRING_CHARS = 400
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token estimate without a tokenizer: words count one token per ~6 characters and every
+    punctuation mark counts as one, which tracks llama tokenizers closely enough on JSON,
+    where a flat chars/4 rule badly undercounts.
+    """
+    return sum(1 + (len(piece) - 1) // 6 for piece in _TOKEN_PATTERN.findall(text)) + 1
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _compact(value: Any, max_rows: Optional[int]) -> Any:
+    if isinstance(value, dict):
+        compacted = {key: _compact(item, max_rows) for key, item in value.items()}
+        return {key: item for key, item in compacted.items() if not _is_empty(item)}
+    if isinstance(value, list):
+        return _compact_list(value, max_rows)
+    if isinstance(value, str) and len(value) > MAX_STRING_CHARS:
+        return value[:MAX_STRING_CHARS] + "..."
+    return value
+
+
+def _compact_list(rows: list, max_rows: Optional[int]) -> Any:
+    shown = rows[:max_rows]
+    omitted = len(rows) - len(shown)
+    if len(shown) > 1 and all(isinstance(row, dict) for row in shown):
+        # Homogeneous records become columns + rows, so keys are not repeated per record
+        compacted = [_compact(row, max_rows) for row in shown]
+        columns = list(dict.fromkeys(key for row in compacted for key in row))
+        table = {"columns": columns, "rows": [[row.get(column) for column in columns] for row in compacted]}
+        if omitted:
+            table["total_rows"] = len(rows)
+        return table
+    compacted = [_compact(row, max_rows) for row in shown]
+    if omitted:
+        compacted.append(f"... {omitted} more of {len(rows)}")
+    return compacted
+
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    tokens = estimate_tokens(text)
+    if tokens <= budget:
+        return text
+    keep = int(len(text) * budget / tokens)
+    return text[:keep] + f"\n[truncated: about {tokens - budget} more tokens]"
+
+
+def compact_for_llm(text: str, budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+    Shrink a tool result before it goes into a prompt. JSON is minified with null and
+    empty fields dropped and record lists turned into a columnar table; rows are capped
+    more tightly until the result fits `budget` tokens. Anything else (or JSON that still
+    does not fit) is cut to the budget.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return truncate_to_budget(text, budget)
+    if not isinstance(data, (dict, list)):
+        return truncate_to_budget(text, budget)
+
+    compacted = text
+    for max_rows in ROW_CAPS:
+        compacted = _dump(_compact(data, max_rows))
+        if estimate_tokens(compacted) <= budget:
+            return compacted
+    return truncate_to_budget(compacted, budget)
+
+
+def _text_pieces(text: str, budget: int) -> list[str]:
+    """Paragraphs, falling back to lines and then to fixed slices for oversized ones."""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if estimate_tokens(paragraph) <= budget:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            while estimate_tokens(line) > budget:
+                cut = int(len(line) * budget / estimate_tokens(line))
+                pieces.append(line[:cut])
+                line = line[cut:]
+            pieces.append(line)
+    return [piece for piece in pieces if piece.strip()]
+
+
+def pack_chunks(pieces: list[str], budget: int, separator: str = "\n\n") -> list[str]:
+    """Greedily join consecutive pieces into chunks of at most `budget` tokens."""
+    chunks, current, used = [], [], 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        if current and used + tokens > budget:
+            chunks.append(separator.join(current))
+            current, used = [], 0
+        current.append(piece)
+        used += tokens
+    if current:
+        chunks.append(separator.join(current))
+    return [truncate_to_budget(chunk, budget) for chunk in chunks]
+
+
+def _split_records(rows: list, budget: int, context: dict = None, name: str = "rows") -> list[str]:
+    chunks, start = [], 0
+    header = _dump(context) if context else ""
+    while start < len(rows):
+        # Room for the label and the column list
+        end, used = start, estimate_tokens(header) + 32
+        while end < len(rows):
+            row = _compact(rows[end], None)
+            # Columnar chunks carry values only; keys are paid once per chunk
+            tokens = estimate_tokens(_dump(list(row.values()) if isinstance(row, dict) else row))
+            if end > start and used + tokens > budget:
+                break
+            used += tokens
+            end += 1
+        label = f"{name} {start + 1}-{end} of {len(rows)}:"
+        body = _dump(_compact_list(rows[start:end], None))
+        chunk = f"{header}\n{label}\n{body}" if header else f"{label}\n{body}"
+        chunks.append(truncate_to_budget(chunk, budget))
+        header = ""  # other fields only travel with the first chunk
+        start = end
+    return chunks
+
+
+def split_for_llm(text: str, budget: int = SUMMARY_TOKEN_BUDGET) -> list[str]:
+    """
+    Prepare a tool result for summarization without dropping data. Returns one compacted
+    chunk when it fits `budget`, otherwise several chunks cut on structural boundaries:
+    record lists by rows (each chunk keeps the columnar form), other JSON by top-level
+    field, text by paragraph, then line.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        data = None
+    if not isinstance(data, (dict, list)):
+        return [text] if estimate_tokens(text) <= budget else pack_chunks(_text_pieces(text, budget), budget)
+
+    compacted = _compact(data, None)
+    full = _dump(compacted)
+    if estimate_tokens(full) <= budget:
+        return [full]
+    if isinstance(data, list):
+        return _split_records(data, budget)
+
+    lists = {key: value for key, value in data.items() if isinstance(value, list) and value}
+    if lists:
+        key = max(lists, key=lambda k: len(lists[k]))
+        context = {k: v for k, v in compacted.items() if k != key}
+        return _split_records(lists[key], budget, context, name=key)
+    return pack_chunks([_dump({key: value}) for key, value in compacted.items()], budget, separator="\n")
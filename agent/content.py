@@ -0,0 +1,157 @@
+import codecs
+import json
+import re
+from html.parser import HTMLParser
+from typing import Optional
+
+# Most bytes read from a response body; the rest is never downloaded
+MAX_FETCH_BYTES = 1_000_000
+CHUNK_SIZE = 64 * 1024
+# Most characters of extracted text handed on; longer pages are map-reduced by the summarizer
+MAX_TEXT_CHARS = 200_000
+
+TRUNCATED_MARKER = "\n[truncated]"
+
+# No "head": HTML5 lets </head> be omitted, which would skip the whole body; its
+# title is read separately and meta/link carry no text
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "object"}
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "tr", "table", "section", "article", "header", "footer",
+    "nav", "main", "aside", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "hr", "dd", "dt",
+}
+META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+
+def read_capped(chunks, limit: int = MAX_FETCH_BYTES) -> tuple[bytes, bool]:
+    """Join body chunks until limit bytes. Returns (body, truncated); the caller closes the stream."""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= limit:
+            return bytes(buffer[:limit]), True
+    return bytes(buffer), False
+
+
+async def aread_capped(chunks, limit: int = MAX_FETCH_BYTES) -> tuple[bytes, bool]:
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= limit:
+            return bytes(buffer[:limit]), True
+    return bytes(buffer), False
+
+
+def parse_content_type(header: Optional[str]) -> tuple[str, Optional[str]]:
+    """'text/html; charset=ISO-8859-1' -> ('text/html', 'iso-8859-1')."""
+    if not header:
+        return "", None
+    parts = [p.strip() for p in header.split(";")]
+    charset = None
+    for param in parts[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset" and value:
+            charset = value.strip().strip("\"'").lower()
+    return parts[0].lower(), charset
+
+
+def _known_codec(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def decode_body(body: bytes, media_type: str, charset: Optional[str]) -> str:
+    """Decode with the declared charset, else a BOM or <meta charset>, else UTF-8 (lossy)."""
+    encoding = _known_codec(charset)
+    if encoding is None and body.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    if encoding is None and "html" in media_type:
+        match = META_CHARSET.search(body[:4096])
+        encoding = _known_codec(match.group(1).decode("ascii", "ignore")) if match else None
+    return body.decode(encoding or "utf-8", errors="replace")
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self.title = ""
+        self._skip = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        elif tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag in SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Readable text of an HTML page: scripts, styles and markup removed, whitespace collapsed."""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        # Malformed markup: keep whatever was extracted so far
+        pass
+    lines = (" ".join(line.split()) for line in "".join(parser.parts).splitlines())
+    text = "\n".join(line for line in lines if line)
+    title = " ".join(parser.title.split())
+    return f"{title}\n\n{text}" if title and not text.startswith(title) else text
+
+
+def minify_json(text: str) -> Optional[str]:
+    """Re-serialize a JSON document without whitespace; None if it does not parse."""
+    try:
+        return json.dumps(json.loads(text), separators=(",", ":"), ensure_ascii=False)
+    except ValueError:
+        return None
+
+
+def extract_content(body: bytes, content_type: Optional[str], truncated: bool = False, max_chars: int = MAX_TEXT_CHARS) -> str:
+    """
+    Turn a (possibly truncated) response body into compact text for the renderer or the
+    summarizer: JSON is minified, HTML reduced to its readable text, anything else decoded.
+    """
+    media_type, charset = parse_content_type(content_type)
+    text = decode_body(body, media_type, charset)
+    stripped = text.lstrip()
+
+    if not truncated and ("json" in media_type or stripped[:1] in ("{", "[")):
+        minified = minify_json(text)
+        if minified is not None:
+            # Structured results stay whole so the renderer can parse them
+            return minified
+
+    if "html" in media_type or stripped[:15].lower().startswith(("<!doctype html", "<html")):
+        text = html_to_text(text)
+    else:
+        text = text.strip()
+
+    if truncated or len(text) > max_chars:
+        return text[:max_chars] + TRUNCATED_MARKER
+    return text
@@ -0,0 +1,113 @@
+import copy
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL = 3600.0
+
+
+def normalize_message(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivial variants share a key."""
+    text = " ".join(text.lower().split())
+    return re.sub(r"[\s?.!]+$", "", text)
+
+
+class DecisionCache:
+    """
+    Bounded LRU+TTL cache from (normalized message, model, prompt version, conversation
+    context) to the parsed
+    tool decision (a plan, i.e. a list of tool calls). Only the decision is cached; the
+    tools themselves always run live.
+
+    With db_path set, entries are written through to SQLite and read back on a memory
+    miss, so the cache survives restarts.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL, db_path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[list, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, decision TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM decisions WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    @staticmethod
+    def key(user_msg: str, model: str, prompt_version: str, context: str = "") -> str:
+        raw = f"{model}\0{prompt_version}\0{context}\0{normalize_message(user_msg)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _store(self, key: str, decision: list, expires_at: float):
+        self._entries[key] = (decision, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, user_msg: str, model: str, prompt_version: str, context: str = "") -> Optional[list]:
+        key = self.key(user_msg, model, prompt_version, context)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                decision, expires_at = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return copy.deepcopy(decision)
+                del self._entries[key]
+                self.stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT decision, expires_at FROM decisions WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] >= now:
+                    decision = json.loads(row[0])
+                    self._store(key, decision, row[1])
+                    self.stats["disk_hits"] += 1
+                    return copy.deepcopy(decision)
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, user_msg: str, model: str, prompt_version: str, decision: list, context: str = ""):
+        key = self.key(user_msg, model, prompt_version, context)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, copy.deepcopy(decision), expires_at)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO decisions (key, decision, expires_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(decision), expires_at),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.error(f"Decision cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM decisions")
+                self._db.commit()
+
+    def hit_rate(self) -> float:
+        with self._lock:
+            hits = self.stats["hits"] + self.stats["disk_hits"]
+            total = hits + self.stats["misses"]
+            return hits / total if total else 0.0
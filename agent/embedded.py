@@ -0,0 +1,150 @@
+import asyncio
+import atexit
+import importlib
+import json
+import logging
+import sys
+import threading
+from pathlib import Path
+
+AGENT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = AGENT_DIR.parent / "backend"
+
+# Modules whose names exist on both the agent and the backend side
+SHARED_MODULE_NAMES = ("schemas",)
+# Backend modules DirectBackend uses, imported up front so the backend stays off sys.path
+DIRECT_MODULES = ("storage.db", "services.user_service", "services.pagination", "services.weather_service")
+
+_backend = None
+_backend_schemas = None
+
+
+def load_backend():
+    """
+    Import the backend package in-process and return its `main` module.
+
+    The backend resolves its SQLite files relative to its own modules, so the working
+    directory is left alone. Its directory is on sys.path only while its modules are
+    imported. Both sides ship a top-level `schemas` module; the backend gets its own copy
+    while it is imported and the agent's is put back after.
+    """
+    global _backend, _backend_schemas
+    if _backend is not None:
+        return _backend
+
+    if str(AGENT_DIR) not in sys.path:
+        sys.path.insert(0, str(AGENT_DIR))
+    saved = {name: sys.modules.pop(name) for name in SHARED_MODULE_NAMES if name in sys.modules}
+    sys.path.insert(0, str(BACKEND_DIR))
+    try:
+        backend_main = importlib.import_module("main")
+        for name in DIRECT_MODULES:
+            importlib.import_module(name)
+        _backend_schemas = sys.modules["schemas"]
+    finally:
+        sys.path.remove(str(BACKEND_DIR))
+        for name in SHARED_MODULE_NAMES:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+
+    logging.info(f"Embedded backend loaded from {BACKEND_DIR}")
+    _backend = backend_main
+    return _backend
+
+
+def asgi_client():
+    """
+    Synchronous in-process client for the backend app (no sockets, no uvicorn).
+
+    The client is entered so every request runs on one portal loop, which keeps the
+    backend's pooled upstream connections alive and runs its lifespan once.
+    """
+    from fastapi.testclient import TestClient
+    client = TestClient(load_backend().app, raise_server_exceptions=False)
+    client.__enter__()
+    atexit.register(client.__exit__, None, None, None)
+    return client
+
+
+def async_asgi_client():
+    """Async in-process client for the backend app."""
+    import httpx
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=load_backend().app))
+
+
+class DirectBackend:
+    """
+    Calls the backend services directly with a thread-scoped SQLAlchemy session,
+    skipping HTTP, routing and response serialization. Results are returned as the
+    same JSON text the HTTP API would produce, so rendering downstream is unchanged.
+    """
+
+    def __init__(self):
+        load_backend()
+        from sqlalchemy.orm import scoped_session
+        from storage.db import SessionLocal
+
+        self.sessions = scoped_session(SessionLocal)
+        # The weather service is async with a pooled client tied to one loop; it gets its own
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="direct-backend-loop", daemon=True).start()
+
+    async def _weather(self, city: str) -> dict:
+        from fastapi import HTTPException
+        from services.weather_service import get_weather
+
+        try:
+            return (await get_weather(city)).model_dump()
+        except HTTPException as e:
+            return {"detail": e.detail}
+
+    def weather(self, city: str) -> dict:
+        return asyncio.run_coroutine_threadsafe(self._weather(city), self._loop).result()
+
+    def users(self, method: str, user_id: int = None, data: dict = None, params: dict = None) -> str:
+        from fastapi import HTTPException
+        from pydantic import ValidationError
+        from services import user_service
+        from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+        UserOut = _backend_schemas.UserOut
+        method = method.upper()
+        db = self.sessions()
+        try:
+            if method == "GET" and user_id:
+                user = user_service.get_user(db, user_id)
+            elif method == "GET":
+                params = params or {}
+                limit = min(int(params.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+                ids = [int(i) for i in str(params["ids"]).split(",")] if params.get("ids") else None
+                page = user_service.list_users(db, limit, params.get("after"), params.get("name_prefix"), ids)
+                return _backend_schemas.UserPage.model_validate(page, from_attributes=True).model_dump_json()
+            elif method == "POST":
+                body = _backend_schemas.UserCreate(**(data or {}))
+                user = user_service.create_user(db, body.user_name)
+            elif method == "PUT":
+                body = _backend_schemas.UserUpdate(**(data or {}))
+                user = user_service.update_user(db, user_id, body.user_name)
+            elif method == "DELETE":
+                return "" if user_service.delete_user(db, user_id) else json.dumps({"detail": f"User with ID {user_id} not found"})
+            else:
+                return f"Unsupported HTTP method: {method}"
+
+            if not user:
+                return json.dumps({"detail": f"User with ID {user_id} not found"})
+            return json.dumps(UserOut.model_validate(user).model_dump())
+        except ValidationError as e:
+            return json.dumps({"detail": e.errors(include_url=False, include_context=False)})
+        except HTTPException as e:
+            return json.dumps({"detail": e.detail})
+        except Exception as e:
+            logging.error(f"Direct user call failed: {e}")
+            return f"FETCH_ERROR: {e}"
+        finally:
+            self.sessions.remove()
+
+    async def aweather(self, city: str) -> dict:
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._weather(city), self._loop))
+
+    async def ausers(self, method: str, user_id: int = None, data: dict = None, params: dict = None) -> str:
+        return await asyncio.to_thread(self.users, method, user_id, data, params)
@@ -0,0 +1,262 @@
+import email.utils
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+# Without max-age/Expires, a page is considered fresh for this share of its age since Last-Modified
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX = 3600.0
+# last_used updates from cache hits are held in memory and written in one transaction
+# once this many are pending (or with the next write); a lost batch only blurs LRU order
+TOUCH_BATCH = 64
+
+
+def parse_cache_control(header: Optional[str]) -> dict:
+    """'max-age=60, no-cache' -> {'max-age': '60', 'no-cache': True}."""
+    directives = {}
+    for part in (header or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') if value else True
+    return directives
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers, now: float) -> Optional[float]:
+    """
+    Seconds the response may be served without revalidation, or None when it must not be
+    stored at all. Follows max-age, then Expires, then the Last-Modified heuristic.
+    """
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-store" in directives or headers.get("Vary", "").strip() == "*":
+        return None
+    has_validator = bool(headers.get("ETag") or headers.get("Last-Modified"))
+    if "no-cache" in directives:
+        return 0.0 if has_validator else None
+
+    try:
+        age = float(headers.get("Age") or 0)
+    except ValueError:
+        age = 0.0
+    if "max-age" in directives:
+        try:
+            return max(float(directives["max-age"]) - age, 0.0)
+        except ValueError:
+            return 0.0 if has_validator else None
+    expires = _http_date(headers.get("Expires"))
+    if expires is not None:
+        date = _http_date(headers.get("Date")) or now
+        return max(expires - date - age, 0.0)
+    last_modified = _http_date(headers.get("Last-Modified"))
+    if last_modified is not None:
+        return min(max(now - last_modified, 0.0) * HEURISTIC_FRACTION, HEURISTIC_MAX)
+    return 0.0 if has_validator else None
+
+
+class CachedResponse:
+    def __init__(self, url: str, result: str, etag: str, last_modified: str, expires_at: float, body_hash: str):
+        self.url = url
+        self.result = result
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+        self.body_hash = body_hash
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+    def validators(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    On-disk cache for fetch_url GETs. Stores the extracted result text with its validators
+    and freshness (Cache-Control / Expires / Last-Modified heuristic), answers fresh
+    entries without touching the network, revalidates stale ones with If-None-Match /
+    If-Modified-Since and evicts least recently used entries past max_bytes.
+
+    Summaries are cached next to it, keyed by the hash of the summarized text, so an
+    unchanged page is neither downloaded nor summarized again.
+
+    Hits do not write: their last_used times are batched (see TOUCH_BATCH). The database
+    runs in WAL mode with synchronous=NORMAL, so a commit does not fsync.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0,
+                      "summary_hits": 0, "summary_misses": 0}
+        self._touched: dict[tuple[str, str], float] = {}
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY, result TEXT NOT NULL, body_hash TEXT NOT NULL,
+                etag TEXT, last_modified TEXT, expires_at REAL NOT NULL,
+                size INTEGER NOT NULL, last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY, summary TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL
+            );
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def body_hash(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, etag, last_modified, expires_at, body_hash FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._touch("responses", url)
+        entry = CachedResponse(url, *row)
+        if entry.fresh:
+            with self._lock:
+                self.stats["hits"] += 1
+        return entry
+
+    def store(self, url: str, headers, result: str):
+        """Store a 200 response's extracted result, if its headers allow caching."""
+        now = time.time()
+        lifetime = freshness_lifetime(headers, now)
+        if lifetime is None:
+            return
+        size = len(result.encode())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (url, result, body_hash, etag, last_modified, expires_at, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, result, self.body_hash(result), headers.get("ETag"), headers.get("Last-Modified"), now + lifetime, size, now),
+                )
+                self.stats["stores"] += 1
+                self._flush_touches()
+                self._evict()
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"HTTP cache write failed: {e}")
+
+    def revalidated(self, entry: CachedResponse, headers) -> str:
+        """Handle a 304: extend freshness from the new headers and return the cached result."""
+        now = time.time()
+        lifetime = freshness_lifetime(headers, now) or 0.0
+        with self._lock:
+            self._touched.pop(("responses", entry.url), None)
+            self._db.execute(
+                "UPDATE responses SET expires_at = ?, etag = COALESCE(?, etag), last_used = ? WHERE url = ?",
+                (now + lifetime, headers.get("ETag"), now, entry.url),
+            )
+            self._db.commit()
+            self.stats["revalidated"] += 1
+        return entry.result
+
+    def invalidate(self, url: str):
+        """Drop a URL (and its parent collection) after a request that may have changed it."""
+        parent = url.rstrip("/").rsplit("/", 1)[0]
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE url IN (?, ?)", (url, parent))
+            self._db.commit()
+
+    def _touch(self, table: str, key: str):
+        # Caller holds self._lock
+        self._touched[(table, key)] = time.time()
+        if len(self._touched) >= TOUCH_BATCH:
+            self._flush_touches()
+            self._db.commit()
+
+    def _flush_touches(self):
+        # Caller holds self._lock and commits
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        for table in ("responses", "summaries"):
+            column = "url" if table == "responses" else "key"
+            self._db.executemany(f"UPDATE {table} SET last_used = ? WHERE {column} = ?",
+                                 [(used, key) for (name, key), used in touched.items() if name == table])
+
+    def flush(self):
+        """Write pending last_used updates now."""
+        with self._lock:
+            self._flush_touches()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute(
+            "SELECT COALESCE((SELECT SUM(size) FROM responses), 0) + COALESCE((SELECT SUM(size) FROM summaries), 0)"
+        ).fetchone()[0]
+        while total > self.max_bytes:
+            oldest = self._db.execute(
+                "SELECT 'responses', url, size, last_used FROM responses "
+                "UNION ALL SELECT 'summaries', key, size, last_used FROM summaries ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            if oldest is None:
+                break
+            table, key, size, _ = oldest
+            column = "url" if table == "responses" else "key"
+            self._db.execute(f"DELETE FROM {table} WHERE {column} = ?", (key,))
+            total -= size
+            self.stats["evictions"] += 1
+
+    @classmethod
+    def summary_key(cls, text: str, model: str, prompt: str) -> str:
+        return cls.body_hash(f"{model}\0{prompt}\0{text}")
+
+    def get_summary(self, text: str, model: str, prompt: str) -> Optional[str]:
+        key = self.summary_key(text, model, prompt)
+        with self._lock:
+            row = self._db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["summary_misses"] += 1
+                return None
+            self._touch("summaries", key)
+            self.stats["summary_hits"] += 1
+            return row[0]
+
+    def put_summary(self, text: str, model: str, prompt: str, summary: str):
+        key = self.summary_key(text, model, prompt)
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO summaries (key, summary, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, summary, len(summary.encode()), time.time()),
+                )
+                self._flush_touches()
+                self._evict()
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Summary cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.execute("DELETE FROM summaries")
+            self._db.commit()
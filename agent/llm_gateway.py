@@ -0,0 +1,334 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from ollama import AsyncClient, Client
+
+from tracing import tracer
+
+MAX_IN_FLIGHT = 2
+KEEP_ALIVE = "30m"
+
+# Lower value = served first when the gateway is saturated
+PRIORITIES = {"decide": 0, "summarize": 1, "compact": 2}
+DEFAULT_PRIORITY = 1
+
+LATENCY_WINDOW = 500
+
+# Span name per call kind
+STAGES = {"decide": "decision"}
+
+
+def _get(response, key, default=None):
+    try:
+        value = response[key]
+    except (KeyError, TypeError):
+        return default
+    return default if value is None else value
+
+
+def request_key(**request) -> str:
+    """Stable hash of a non-streaming request, used to coalesce identical calls."""
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def trace_call(kind: str, duration: float, request: dict, response=None, error=None, bytes_out: int = None, coalesced: bool = False):
+    """Record one gateway call as a span: duration, tokens, payload sizes and error."""
+    if bytes_out is None:
+        message = _get(response, "message")
+        bytes_out = len(_get(message, "content", "")) if message is not None else 0
+    tracer.record(
+        STAGES.get(kind, kind),
+        duration,
+        model=request.get("model"),
+        prompt_tokens=0 if coalesced else _get(response, "prompt_eval_count", 0),
+        completion_tokens=0 if coalesced else _get(response, "eval_count", 0),
+        bytes_in=sum(len(m.get("content") or "") for m in request.get("messages", [])),
+        bytes_out=bytes_out,
+        coalesced=coalesced,
+        error=str(error) if error else None,
+    )
+
+
+def percentile(values, q: float):
+    """Nearest-rank percentile of `values` (any order), rounded for reports; None when empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(int(q * len(values)), len(values) - 1)], 4)
+
+
+class LLMMetrics:
+    """Per-kind call counts, errors, coalesced calls, token totals and latency percentiles."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._kinds: dict[str, dict] = {}
+
+    def record(self, kind: str, latency: float, response=None, error: bool = False, coalesced: bool = False):
+        with self._lock:
+            stats = self._kinds.setdefault(kind, {
+                "calls": 0, "errors": 0, "coalesced": 0,
+                "prompt_tokens": 0, "completion_tokens": 0,
+                "latencies": deque(maxlen=self.window),
+            })
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["coalesced"] += int(coalesced)
+            if not coalesced:
+                stats["latencies"].append(latency)
+                if response is not None:
+                    stats["prompt_tokens"] += _get(response, "prompt_eval_count", 0)
+                    stats["completion_tokens"] += _get(response, "eval_count", 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for kind, stats in self._kinds.items():
+                latencies = stats["latencies"]
+                result[kind] = {
+                    **{k: v for k, v in stats.items() if k != "latencies"},
+                    "latency_p50": percentile(latencies, 0.50),
+                    "latency_p95": percentile(latencies, 0.95),
+                    "latency_p99": percentile(latencies, 0.99),
+                }
+            return result
+
+
+class PrioritySemaphore:
+    """Counting semaphore whose waiters are woken in priority order (then FIFO)."""
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._in_use = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def acquire(self, priority: int):
+        with self._lock:
+            if self._in_use < self._limit and not self._waiters:
+                self._in_use += 1
+                return
+            ready = threading.Event()
+            heapq.heappush(self._waiters, (priority, next(self._seq), ready))
+        ready.wait()
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the best waiter
+                heapq.heappop(self._waiters)[2].set()
+            else:
+                self._in_use -= 1
+
+
+class AsyncPrioritySemaphore:
+    """asyncio counterpart of PrioritySemaphore; cancelled waiters give their slot back."""
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._in_use = 0
+        self._waiters = []
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int):
+        if self._in_use < self._limit and not self._waiters:
+            self._in_use += 1
+            return
+        ready = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), ready))
+        try:
+            await ready
+        except asyncio.CancelledError:
+            if ready.done() and not ready.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            ready = heapq.heappop(self._waiters)[2]
+            if not ready.done():
+                ready.set_result(None)
+                return
+        self._in_use -= 1
+
+
+class LLMGateway:
+    """
+    Single entry point for every LLM call. Caps concurrent generations (decision calls are
+    admitted before summaries), coalesces identical in-flight non-streaming requests, keeps
+    the model resident with keep_alive and records per-call latency and token metrics.
+    """
+
+    def __init__(self, client: Client = None, max_in_flight: int = MAX_IN_FLIGHT, keep_alive=KEEP_ALIVE):
+        self.client = client or Client()
+        self.keep_alive = keep_alive
+        self.metrics = LLMMetrics()
+        self._slots = PrioritySemaphore(max_in_flight)
+        self._inflight: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def warmup(self, profiles: list):
+        """
+        Load each profile's model with its options (so num_ctx matches the real calls)
+        ahead of the first request and pin it for keep_alive.
+        """
+        for profile in profiles:
+            start = time.perf_counter()
+            try:
+                self.client.generate(prompt="", keep_alive=self.keep_alive, **profile.request())
+                logging.info(f"Warmed up {profile.model} in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                logging.error(f"Warmup failed for {profile.model}: {e}")
+
+    def chat(self, kind: str, stream: bool = False, **request):
+        request.setdefault("keep_alive", self.keep_alive)
+        priority = PRIORITIES.get(kind, DEFAULT_PRIORITY)
+        if stream:
+            return self._stream(kind, priority, request)
+
+        key = request_key(**request)
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = {"done": threading.Event(), "response": None, "error": None}
+                self._inflight[key] = flight
+
+        if not leader:
+            start = time.perf_counter()
+            flight["done"].wait()
+            self.metrics.record(kind, time.perf_counter() - start, error=flight["error"] is not None, coalesced=True)
+            trace_call(kind, time.perf_counter() - start, request, flight["response"], flight["error"], coalesced=True)
+            if flight["error"] is not None:
+                raise flight["error"]
+            return flight["response"]
+
+        start = time.perf_counter()
+        self._slots.acquire(priority)
+        try:
+            flight["response"] = self.client.chat(**request)
+            return flight["response"]
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight["done"].set()
+            self.metrics.record(kind, time.perf_counter() - start, flight["response"], error=flight["error"] is not None)
+            trace_call(kind, time.perf_counter() - start, request, flight["response"], flight["error"])
+
+    def _stream(self, kind: str, priority: int, request: dict):
+        start = time.perf_counter()
+        last = None
+        error = None
+        bytes_out = 0
+        chunks = None
+        self._slots.acquire(priority)
+        try:
+            chunks = self.client.chat(stream=True, **request)
+            for chunk in chunks:
+                last = chunk
+                bytes_out += len(chunk["message"]["content"] or "")
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Callers may stop early (e.g. once a tool call is complete); end the HTTP stream too
+            if hasattr(chunks, "close"):
+                chunks.close()
+            self._slots.release()
+            self.metrics.record(kind, time.perf_counter() - start, last, error=error is not None)
+            trace_call(kind, time.perf_counter() - start, request, last, error, bytes_out=bytes_out)
+
+
+class AsyncLLMGateway:
+    """asyncio counterpart of LLMGateway around ollama.AsyncClient."""
+
+    def __init__(self, client: AsyncClient = None, max_in_flight: int = MAX_IN_FLIGHT, keep_alive=KEEP_ALIVE):
+        self.client = client or AsyncClient()
+        self.keep_alive = keep_alive
+        self.metrics = LLMMetrics()
+        self._slots = AsyncPrioritySemaphore(max_in_flight)
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def warmup(self, profiles: list):
+        for profile in profiles:
+            start = time.perf_counter()
+            try:
+                await self.client.generate(prompt="", keep_alive=self.keep_alive, **profile.request())
+                logging.info(f"Warmed up {profile.model} in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                logging.error(f"Warmup failed for {profile.model}: {e}")
+
+    async def chat(self, kind: str, stream: bool = False, **request):
+        request.setdefault("keep_alive", self.keep_alive)
+        priority = PRIORITIES.get(kind, DEFAULT_PRIORITY)
+        if stream:
+            return self._stream(kind, priority, request)
+
+        key = request_key(**request)
+        task = self._inflight.get(key)
+        if task is not None:
+            start = time.perf_counter()
+            try:
+                return await asyncio.shield(task)
+            finally:
+                failed = task.done() and (task.cancelled() or task.exception() is not None)
+                self.metrics.record(kind, time.perf_counter() - start, error=failed, coalesced=True)
+                trace_call(kind, time.perf_counter() - start, request, error="failed" if failed else None, bytes_out=0, coalesced=True)
+
+        task = asyncio.create_task(self._call(kind, priority, request))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _call(self, kind: str, priority: int, request: dict):
+        start = time.perf_counter()
+        response = None
+        error = None
+        await self._slots.acquire(priority)
+        try:
+            response = await self.client.chat(**request)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._slots.release()
+            self.metrics.record(kind, time.perf_counter() - start, response, error=response is None)
+            trace_call(kind, time.perf_counter() - start, request, response, error)
+
+    async def _stream(self, kind: str, priority: int, request: dict):
+        start = time.perf_counter()
+        last = None
+        error = None
+        bytes_out = 0
+        chunks = None
+        await self._slots.acquire(priority)
+        try:
+            chunks = await self.client.chat(stream=True, **request)
+            async for chunk in chunks:
+                last = chunk
+                bytes_out += len(chunk["message"]["content"] or "")
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+            self._slots.release()
+            self.metrics.record(kind, time.perf_counter() - start, last, error=error is not None)
+            trace_call(kind, time.perf_counter() - start, request, last, error, bytes_out=bytes_out)
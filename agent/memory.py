@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+
+from compaction import estimate_tokens
+
+# History budget per session, in estimated tokens (summary + verbatim turns)
+TOKEN_BUDGET = 2000
+# Background compaction starts once history passes this share of the budget
+COMPACT_AT = 0.75
+# Most recent turns always kept verbatim
+KEEP_RECENT_TURNS = 2
+# Tool-backed replies are stored truncated; the full payload is never kept in history
+MAX_STORED_REPLY_CHARS = 600
+
+SUMMARY_PREFIX = "Conversation so far: "
+
+# Messages that lean on earlier turns ("delete that user", "and tomorrow?", "what about Paris")
+REFERS_BACK = re.compile(
+    r"\b(?:it|its|that|this|those|these|them|they|he|she|him|her|his|there|same|again|previous|last one|"
+    r"the one|above|earlier|instead|too|also)\b|^\s*(?:and|also|what about|how about|then)\b",
+    re.IGNORECASE,
+)
+
+
+def refers_back(message: str) -> bool:
+    return bool(REFERS_BACK.search(message))
+
+
+class ConversationMemory:
+    """
+    Per-session history under a hard token budget.
+
+    Recent turns are kept verbatim; older ones are rolled into a running summary by a
+    background compaction, so a turn never waits on it. Compaction is done in batches down
+    to KEEP_RECENT_TURNS, which keeps the prompt prefix (system prompt + summary + older
+    turns) byte-identical between compactions; with the model kept resident, Ollama reuses
+    its cached prefix and prefill cost stays flat as the conversation grows. If compaction
+    falls behind, the oldest turns are dropped so the budget is never exceeded.
+    """
+
+    def __init__(self, budget: int = TOKEN_BUDGET, keep_recent: int = KEEP_RECENT_TURNS):
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.summary = ""
+        self.turns: list[dict] = []
+        self.stats = {"turns": 0, "compactions": 0, "dropped_turns": 0}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._compacting = False
+
+    @staticmethod
+    def _turn_tokens(turn: dict) -> int:
+        return estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"])
+
+    def tokens(self) -> int:
+        with self._lock:
+            return estimate_tokens(self.summary) + sum(self._turn_tokens(t) for t in self.turns)
+
+    def fingerprint(self) -> str:
+        """Identifies the conversation context; empty for a fresh session."""
+        with self._lock:
+            if not self.summary and not self.turns:
+                return ""
+            raw = self.summary + "".join(t["user"] + t["assistant"] for t in self.turns)
+        return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+    def context_for(self, message: str) -> str:
+        """
+        Decision-cache context for `message`: empty when the message stands on its own, so
+        "weather in Paris" hits the same entry in every session, and the history fingerprint
+        when it refers back to earlier turns.
+        """
+        return self.fingerprint() if refers_back(message) else ""
+
+    def messages(self, system_prompt: str) -> list[dict]:
+        with self._lock:
+            messages = [{"role": "system", "content": system_prompt}]
+            if self.summary:
+                messages.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+            for turn in self.turns:
+                messages.append({"role": "user", "content": turn["user"]})
+                messages.append({"role": "assistant", "content": turn["assistant"]})
+            return messages
+
+    def add_turn(self, user_msg: str, reply: str, tool_note: str = None):
+        if tool_note:
+            reply = f"[{tool_note}] {reply}"
+        if len(reply) > MAX_STORED_REPLY_CHARS:
+            reply = reply[:MAX_STORED_REPLY_CHARS] + " ..."
+        with self._lock:
+            self._seq += 1
+            self.turns.append({"seq": self._seq, "user": user_msg, "assistant": reply})
+            self.stats["turns"] += 1
+            self._enforce_budget()
+
+    def _enforce_budget(self):
+        total = estimate_tokens(self.summary) + sum(self._turn_tokens(t) for t in self.turns)
+        while total > self.budget and len(self.turns) > 1:
+            dropped = self.turns.pop(0)
+            total -= self._turn_tokens(dropped)
+            self.stats["dropped_turns"] += 1
+            logging.warning("Conversation over token budget, dropped oldest turn")
+
+    def needs_compaction(self) -> bool:
+        with self._lock:
+            total = estimate_tokens(self.summary) + sum(self._turn_tokens(t) for t in self.turns)
+            return not self._compacting and len(self.turns) > self.keep_recent and total > self.budget * COMPACT_AT
+
+    def _begin(self):
+        with self._lock:
+            if self._compacting or len(self.turns) <= self.keep_recent:
+                return None
+            self._compacting = True
+            old = self.turns[:-self.keep_recent] if self.keep_recent else list(self.turns)
+            transcript = "\n".join(f"User: {t['user']}\nAssistant: {t['assistant']}" for t in old)
+            return old[-1]["seq"], self.summary, transcript
+
+    def _finish(self, last_seq: int, summary: str = None):
+        with self._lock:
+            self._compacting = False
+            if summary is None:
+                return
+            self.summary = summary.strip()
+            self.turns = [t for t in self.turns if t["seq"] > last_seq]
+            self.stats["compactions"] += 1
+            self._enforce_budget()
+
+    def compact(self, summarizer):
+        """Fold older turns into the summary. summarizer(previous_summary, transcript) -> str."""
+        job = self._begin()
+        if job is None:
+            return
+        last_seq, previous, transcript = job
+        summary = None
+        try:
+            summary = summarizer(previous, transcript)
+        except Exception as e:
+            logging.error(f"Conversation compaction failed: {e}")
+        finally:
+            self._finish(last_seq, summary)
+
+    async def acompact(self, summarizer):
+        """Async counterpart of compact(); summarizer is a coroutine function."""
+        job = self._begin()
+        if job is None:
+            return
+        last_seq, previous, transcript = job
+        summary = None
+        try:
+            summary = await summarizer(previous, transcript)
+        except Exception as e:
+            logging.error(f"Conversation compaction failed: {e}")
+        finally:
+            self._finish(last_seq, summary)
+
+    def compact_in_background(self, summarizer):
+        if self.needs_compaction():
+            threading.Thread(target=self.compact, args=(summarizer,), daemon=True).start()
+
+    def acompact_in_background(self, summarizer):
+        if self.needs_compaction():
+            return asyncio.create_task(self.acompact(summarizer))
+        return None
+
+
+class MemoryStore:
+    """Session id -> ConversationMemory."""
+
+    def __init__(self, budget: int = TOKEN_BUDGET):
+        self.budget = budget
+        self._sessions: dict[str, ConversationMemory] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> ConversationMemory:
+        with self._lock:
+            if session_id not in self._sessions:
+                self._sessions[session_id] = ConversationMemory(self.budget)
+            return self._sessions[session_id]
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+from typing import Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+SMALL_MODEL = "llama3.2:1b"
+
+STAGES = ("decide", "fallback", "summarize", "compact")
+
+
+class ModelProfile(BaseModel):
+    """Model and generation options for one pipeline stage."""
+    model: str = Field(..., min_length=1)
+    num_ctx: Optional[int] = Field(default=None, gt=0, description="Context window to allocate")
+    temperature: Optional[float] = Field(default=None, ge=0)
+    num_predict: Optional[int] = Field(default=None, gt=0, description="Cap on generated tokens")
+
+    def options(self) -> dict:
+        return self.model_dump(exclude={"model"}, exclude_none=True)
+
+    def request(self) -> dict:
+        """Keyword arguments for an ollama chat call."""
+        options = self.options()
+        return {"model": self.model, "options": options} if options else {"model": self.model}
+
+
+def default_profiles(model: str) -> dict[str, ModelProfile]:
+    """
+    Routing is a small classification task, so decisions (and history compaction) go to
+    the small model; summaries and escalated decisions use `model`. Stages sharing a model
+    share its num_ctx, see shared_num_ctx().
+    """
+    return {
+        "decide": ModelProfile(model=SMALL_MODEL, num_ctx=4096, temperature=0.0, num_predict=256),
+        "fallback": ModelProfile(model=model, num_ctx=8192, temperature=0.0, num_predict=384),
+        "summarize": ModelProfile(model=model, num_ctx=8192, temperature=0.2, num_predict=512),
+        "compact": ModelProfile(model=SMALL_MODEL, num_ctx=4096, temperature=0.0, num_predict=256),
+    }
+
+
+def load_profiles(model: str, path: str = None) -> dict[str, ModelProfile]:
+    """
+    Defaults, then a JSON file of per-stage overrides (AGENT_MODEL_PROFILES, e.g.
+    {"decide": {"model": "qwen2.5:0.5b", "num_ctx": 2048}}), then AGENT_<STAGE>_MODEL.
+    Invalid overrides are logged and ignored.
+    """
+    profiles = default_profiles(model)
+    path = path or os.environ.get("AGENT_MODEL_PROFILES")
+    if path:
+        try:
+            with open(path) as f:
+                overrides = json.load(f)
+            for stage, values in overrides.items():
+                if stage not in profiles:
+                    logging.warning(f"Unknown model profile stage: {stage}")
+                    continue
+                profiles[stage] = ModelProfile(**{**profiles[stage].model_dump(), **values})
+        except (OSError, ValueError, ValidationError) as e:
+            logging.error(f"Could not load model profiles from {path}: {e}")
+    for stage in STAGES:
+        env_model = os.environ.get(f"AGENT_{stage.upper()}_MODEL")
+        if env_model:
+            profiles[stage] = profiles[stage].model_copy(update={"model": env_model})
+    return shared_num_ctx(profiles)
+
+
+def shared_num_ctx(profiles: dict[str, ModelProfile]) -> dict[str, ModelProfile]:
+    """
+    Give every stage of a model the largest num_ctx any of them asks for. Ollama reloads a
+    model whenever the context size changes, so stages alternating on one model with
+    different num_ctx would pay a cold load each time.
+    """
+    largest: dict[str, int] = {}
+    for profile in profiles.values():
+        if profile.num_ctx:
+            largest[profile.model] = max(largest.get(profile.model, 0), profile.num_ctx)
+    shared = {}
+    for stage, profile in profiles.items():
+        num_ctx = largest.get(profile.model)
+        if num_ctx and profile.num_ctx != num_ctx:
+            logging.info(f"Profile {stage}: num_ctx {profile.num_ctx} -> {num_ctx}, shared by every {profile.model} stage")
+            profile = profile.model_copy(update={"num_ctx": num_ctx})
+        shared[stage] = profile
+    return shared
+
+
+def profile_models(profiles: dict[str, ModelProfile]) -> list[str]:
+    """Distinct models in use."""
+    return sorted({profile.model for profile in profiles.values()})
+
+
+def warmup_profiles(profiles: dict[str, ModelProfile]) -> list[ModelProfile]:
+    """
+    One profile per distinct (model, num_ctx) to load at startup. The options go with the
+    warmup, since a model loaded with another context size is reloaded on first use.
+    """
+    distinct = {}
+    for profile in profiles.values():
+        distinct.setdefault((profile.model, profile.num_ctx), profile)
+    return list(distinct.values())
@@ -0,0 +1,101 @@
+import json
+from typing import Optional
+from pydantic import BaseModel, Field
+
+class SummaryPolicy(BaseModel):
+    """Decides when a tool result is rendered locally instead of going through the LLM."""
+    enabled: bool = Field(default=True, description="Set False to always use the LLM summarizer")
+    max_chars: int = Field(default=4000, ge=0, description="Raw payloads longer than this go to the LLM")
+    max_rows: int = Field(default=25, ge=0, description="Lists longer than this go to the LLM")
+
+SUMMARY_POLICY = SummaryPolicy()
+
+USER_FIELDS = {"user_id", "user_name"}
+INVENTORY_FIELDS = {"item_id", "item_name", "quantity"}
+WEATHER_FIELDS = {"city", "temperature", "description"}
+PAGE_FIELDS = {"items", "next_cursor", "total_estimate"}
+
+VERBS = {"POST": "Created", "PUT": "Updated"}
+
+def _render_user(row: dict) -> str:
+    return f"#{row['user_id']} {row['user_name']}"
+
+def _render_item(row: dict) -> str:
+    return f"#{row['item_id']} {row['item_name']} (qty {row['quantity']})"
+
+def _render_error(detail) -> str:
+    if isinstance(detail, list):
+        messages = [f"{'.'.join(str(p) for p in err.get('loc', [])[1:])}: {err.get('msg')}".lstrip(": ") for err in detail if isinstance(err, dict)]
+        return "Error: " + "; ".join(messages)
+    return f"Error: {detail}"
+
+def _render_rows(rows: list, policy: SummaryPolicy) -> Optional[str]:
+    if not rows:
+        return "No results."
+    if len(rows) > policy.max_rows or not all(isinstance(r, dict) for r in rows):
+        return None
+    keys = set(rows[0])
+    if not all(set(r) == keys for r in rows):
+        return None
+    if keys == USER_FIELDS:
+        noun, render = "user", _render_user
+    elif keys == INVENTORY_FIELDS:
+        noun, render = "item", _render_item
+    else:
+        return None
+    lines = [f"{len(rows)} {noun}{'s' if len(rows) != 1 else ''}:"]
+    lines.extend(f"- {render(r)}" for r in rows)
+    return "\n".join(lines)
+
+def _render_page(page: dict, policy: SummaryPolicy) -> Optional[str]:
+    rendered = _render_rows(page["items"], policy)
+    if rendered is None or not page["next_cursor"]:
+        return rendered
+    return f"{rendered}\n(first {len(page['items'])} of about {page['total_estimate']})"
+
+def _render_object(obj: dict, method: str) -> Optional[str]:
+    keys = set(obj)
+    verb = VERBS.get(method)
+    if keys == USER_FIELDS:
+        return f"{verb} user {_render_user(obj)}" if verb else f"User {_render_user(obj)}"
+    if keys == INVENTORY_FIELDS:
+        return f"{verb} item {_render_item(obj)}" if verb else f"Item {_render_item(obj)}"
+    if keys == WEATHER_FIELDS:
+        return f"{obj['city']}: {obj['description']}, {obj['temperature']}°C"
+    if keys == {"detail"}:
+        return _render_error(obj["detail"])
+    return None
+
+def render_tool_result(raw: str, method: str = "GET", target: str = None, policy: SummaryPolicy = None) -> Optional[str]:
+    """
+    Deterministic rendering of known backend response shapes (users, inventory rows,
+    deletes, errors). Returns None when the payload is unknown or too large for the
+    policy, meaning the caller should fall back to the LLM summarizer.
+    """
+    policy = policy or SUMMARY_POLICY
+    if not policy.enabled or len(raw) > policy.max_chars:
+        return None
+
+    method = (method or "GET").upper()
+    text = raw.strip()
+    if text.startswith("FETCH_ERROR:"):
+        return "Request failed: " + text[len("FETCH_ERROR:"):].strip()
+    if text.startswith("Unsupported HTTP method"):
+        return text
+    if not text:
+        if method == "DELETE":
+            return f"Deleted {target}." if target else "Deleted."
+        return "Done (no content)."
+
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return None
+
+    if isinstance(payload, list):
+        return _render_rows(payload, policy)
+    if isinstance(payload, dict) and set(payload) == PAGE_FIELDS and isinstance(payload["items"], list):
+        return _render_page(payload, policy)
+    if isinstance(payload, dict):
+        return _render_object(payload, method)
+    return None
@@ -0,0 +1,191 @@
+import logging
+import re
+import threading
+from typing import Callable, Optional
+
+from pydantic import ValidationError
+from schemas import TOOL_ARGS
+
+# A classifier returns (action, [arguments, ...], confidence) or None when it has no opinion
+Classifier = Callable[[str], Optional[tuple[str, list[dict], float]]]
+
+DEFAULT_THRESHOLD = 0.8
+
+
+LIST_SEPARATOR = re.compile(r"\s*(?:,|&|\band\b)\s*", re.IGNORECASE)
+# Confidence of a rule match whose arguments fail their check: below the threshold, so the LLM decides
+UNSURE_CONFIDENCE = 0.5
+
+# Words that do not occur in place names but do in the clauses that follow them
+NOT_A_PLACE = {
+    "a", "an", "the", "is", "are", "was", "it", "its", "be", "do", "does", "should", "will", "can", "could",
+    "would", "what", "how", "who", "which", "me", "my", "you", "your", "we", "our", "please", "list", "show",
+    "user", "users", "raining", "rain", "snowing", "sunny", "cold", "hot", "weather", "temperature", "forecast",
+    # Conjunctions: an unsplit "X and Y" may be two places or one, so the LLM decides
+    "and", "or", "but", "vs",
+    # Places relative to the user, which wttr.in cannot resolve
+    "home", "here", "there", "work", "office", "school", "outside", "inside", "nearby", "near", "local",
+}
+# Time words trail the place ("weather in paris tomorrow"); the LLM handles those
+TIME_WORDS = {
+    "today", "tonight", "tomorrow", "yesterday", "now", "currently", "later", "morning", "afternoon",
+    "evening", "weekend", "week", "next", "this", "monday", "tuesday", "wednesday", "thursday", "friday",
+    "saturday", "sunday",
+}
+MAX_PLACE_WORDS = 3
+
+
+def looks_like_city(text: str) -> bool:
+    """Conservative check for a place name: a few plain words, none of them a stop-word."""
+    words = text.lower().split()
+    if not words or len(words) > MAX_PLACE_WORDS or len(text) > 40:
+        return False
+    return all(
+        re.fullmatch(r"[a-z][a-z.'-]*", word) and word not in NOT_A_PLACE and word not in TIME_WORDS
+        for word in words
+    )
+
+
+def split_places(text: str) -> Optional[list[str]]:
+    """
+    Items of a place list, or None when the split is not trustworthy. A bare "X and Y"
+    without commas is ambiguous ("Paris and London" vs "Trinidad and Tobago") and gives None.
+    """
+    if "," not in text and "&" not in text:
+        return [text] if looks_like_city(text) else None
+    items = [item for item in LIST_SEPARATOR.split(text) if item]
+    return items if items and all(looks_like_city(item) for item in items) else None
+
+
+class Rule:
+    """
+    A regex that maps a whole message to tool calls with a fixed confidence. With `fan_out`
+    set, that group may hold a list ("London, Paris and Tokyo") and yields one call per item;
+    when the items do not all look like places the match is kept at UNSURE_CONFIDENCE.
+    `checks` maps a group to a predicate its value must pass, with the same fallback.
+    """
+
+    def __init__(self, name: str, action: str, pattern: str, confidence: float = 1.0, defaults: dict = None,
+                 fan_out: str = None, checks: dict[str, Callable[[str], bool]] = None):
+        self.name = name
+        self.action = action
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.confidence = confidence
+        self.defaults = defaults or {}
+        self.fan_out = fan_out
+        self.checks = checks or {}
+
+    def match(self, text: str) -> Optional[tuple[str, list[dict], float]]:
+        m = self.pattern.match(text)
+        if not m:
+            return None
+        arguments = {**self.defaults, **{k: v.strip() for k, v in m.groupdict().items() if v}}
+        if not all(check(arguments[group]) for group, check in self.checks.items() if group in arguments):
+            return self.action, [arguments], min(self.confidence, UNSURE_CONFIDENCE)
+        if self.fan_out and self.fan_out in arguments:
+            items = split_places(arguments[self.fan_out])
+            if items is None:
+                return self.action, [arguments], min(self.confidence, UNSURE_CONFIDENCE)
+            return self.action, [{**arguments, self.fan_out: item} for item in items], self.confidence
+        return self.action, [arguments], self.confidence
+
+
+# At most MAX_PLACE_WORDS words; looks_like_city rejects the stop- and time words
+CITY = r"(?P<city>[a-z][a-z.'-]*(?: [a-z][a-z.'-]*){0,2}?)"
+CITIES = r"(?P<city>[a-z][a-z .,&'-]*?)"
+USER_ID = r"#?(?P<user_id>\d+)"
+# Sentence punctuation ends the name: "create user bob." creates "bob"
+USER_NAME = r"(?P<user_name>[^\s.,!?]+)"
+END = r"\s*[?.!]*$"
+
+DEFAULT_RULES = [
+    Rule("weather", "get_weather",
+         r"^(?:what(?:'s| is) )?(?:the )?(?:weather|temperature|forecast) (?:like )?(?:in|for|at) " + CITIES + END,
+         fan_out="city"),
+    Rule("weather_suffix", "get_weather", r"^" + CITY + r" weather" + END, checks={"city": looks_like_city}),
+    # Loose match for tuning: weather mentioned with a trailing place, possibly followed by other words
+    Rule("weather_loose", "get_weather", r"^.*\bweather\b.*\b(?:in|for|at) " + CITY + END, confidence=0.6,
+         checks={"city": looks_like_city}),
+    Rule("list_users", "manage_users", r"^(?:list|show|get)(?: me)? (?:all )?(?:the )?users" + END,
+         defaults={"method": "GET"}),
+    Rule("get_user", "manage_users", r"^(?:get|show|find) user " + USER_ID + END,
+         defaults={"method": "GET"}),
+    Rule("delete_user", "manage_users", r"^(?:delete|remove) user " + USER_ID + END,
+         defaults={"method": "DELETE"}),
+    Rule("create_user", "manage_users", r"^(?:create|add)(?: a)?(?: new)? user(?: named| called)? " + USER_NAME + END,
+         defaults={"method": "POST"}),
+    Rule("rename_user", "manage_users", r"^(?:rename|update) user " + USER_ID + r" (?:to|as) " + USER_NAME + END,
+         defaults={"method": "PUT"}),
+]
+
+
+class IntentRouter:
+    """
+    Cheap pre-router in front of the LLM. Rules (and an optional classifier) propose a
+    tool call with a confidence; only proposals at or above the threshold are dispatched,
+    everything else falls back to the LLM. Per-route counters record how often each route
+    matched and how often it was actually used, so thresholds can be tuned from traffic.
+    """
+
+    def __init__(self, rules: list[Rule] = None, classifier: Classifier = None, threshold: float = DEFAULT_THRESHOLD):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.classifier = classifier
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.stats = {"messages": 0, "dispatched": 0, "llm_fallback": 0, "routes": {}}
+
+    def _count(self, route: str, dispatched: bool):
+        counters = self.stats["routes"].setdefault(route, {"matched": 0, "dispatched": 0})
+        counters["matched"] += 1
+        if dispatched:
+            counters["dispatched"] += 1
+
+    def _candidates(self, text: str):
+        for rule in self.rules:
+            proposal = rule.match(text)
+            if proposal:
+                yield rule.name, proposal
+        if self.classifier is not None:
+            try:
+                proposal = self.classifier(text)
+            except Exception as e:
+                logging.error(f"Router classifier failed: {e}")
+                proposal = None
+            if proposal:
+                yield "classifier", proposal
+
+    def route(self, user_msg: str) -> list[dict]:
+        """Return a validated plan (list of decisions) for high-confidence intents, else []."""
+        text = " ".join(user_msg.split())
+        plan = []
+        route_name = None
+        with self._lock:
+            self.stats["messages"] += 1
+        for name, (action, calls, confidence) in self._candidates(text):
+            if confidence >= self.threshold:
+                try:
+                    plan = [
+                        {"action": action, **TOOL_ARGS[action].model_validate(arguments).model_dump(mode="json", exclude_none=True)}
+                        for arguments in calls
+                    ]
+                except ValidationError as e:
+                    logging.warning(f"Router route {name} produced invalid arguments: {e}")
+            with self._lock:
+                self._count(name, bool(plan))
+            if plan:
+                route_name = name
+                break
+
+        with self._lock:
+            self.stats["dispatched" if plan else "llm_fallback"] += 1
+        if plan:
+            logging.info(f"Pre-router dispatched via {route_name}: {plan}")
+        return plan
+
+    def hit_rates(self) -> dict:
+        """Share of messages each route dispatched, plus the overall LLM bypass rate."""
+        with self._lock:
+            total = self.stats["messages"] or 1
+            rates = {name: c["dispatched"] / total for name, c in self.stats["routes"].items()}
+            rates["overall"] = self.stats["dispatched"] / total
+            return rates
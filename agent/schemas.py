@@ -1,8 +1,10 @@
-from pydantic import BaseModel
+from typing import Literal, Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic.json_schema import SkipJsonSchema
 
 class WeatherResponse(BaseModel):
     city: str
-    temperature: str
+    temperature: float
     description: str
 
 class FetchResponse(BaseModel):
@@ -15,4 +17,91 @@ class UserCreate(BaseModel):
 
 class UserOut(BaseModel):
     id:int
-    user_name:str
\ No newline at end of file
+    user_name:str
+
+# Tool argument schemas
+HttpMethod = Literal["GET", "POST", "PUT", "DELETE"]
+
+class GetWeatherArgs(BaseModel):
+    city: str = Field(..., min_length=1, description="City name")
+
+class FetchUrlArgs(BaseModel):
+    url: str = Field(..., description="Full http(s) URL")
+    method: HttpMethod = Field(default="GET", description="HTTP method")
+    data: Optional[dict] = Field(default=None, description="JSON body for POST/PUT")
+
+    @field_validator('method', mode='before')
+    @classmethod
+    def upper_method(cls, v):
+        return v.upper() if isinstance(v, str) else v
+
+    @field_validator('url')
+    @classmethod
+    def validate_url(cls, v: str) -> str:
+        if not v.startswith("http"):
+            raise ValueError(f'Invalid URL: {v}')
+        return v
+
+class ManageUsersArgs(BaseModel):
+    method: HttpMethod = Field(default="GET", description="GET lists or reads, POST creates, PUT renames, DELETE removes")
+    user_id: Optional[int] = Field(default=None, gt=0, description="Target user for GET/PUT/DELETE")
+    user_name: Optional[str] = Field(default=None, min_length=1, description="Name for POST/PUT")
+    # Request body as sent to the backend; filled from user_name
+    data: SkipJsonSchema[Optional[UserCreate]] = None
+
+    @field_validator('method', mode='before')
+    @classmethod
+    def upper_method(cls, v):
+        return v.upper() if isinstance(v, str) else v
+
+    @model_validator(mode='after')
+    def fold_user_name(self):
+        if self.data is None and self.user_name:
+            self.data = UserCreate(user_name=self.user_name)
+        if self.method in ("POST", "PUT") and self.data is None:
+            raise ValueError(f'user_name is required for {self.method}')
+        if self.method in ("PUT", "DELETE") and self.user_id is None:
+            raise ValueError(f'user_id is required for {self.method}')
+        return self
+
+TOOL_ARGS = {
+    "get_weather": GetWeatherArgs,
+    "fetch_url": FetchUrlArgs,
+    "manage_users": ManageUsersArgs,
+}
+
+TOOL_DESCRIPTIONS = {
+    "get_weather": "Current weather for a city. Always use this for weather questions.",
+    "fetch_url": "Fetch an HTTP/HTTPS URL with GET, POST, PUT or DELETE.",
+    "manage_users": "Create, read, update, list or delete users on the /users API.",
+}
+
+def _parameters(model: type[BaseModel]) -> dict:
+    """Flat JSON schema for a tool: Optional[X] is collapsed to X, titles are dropped."""
+    schema = model.model_json_schema()
+    properties = {}
+    for name, prop in schema["properties"].items():
+        prop = dict(prop)
+        for option in prop.pop("anyOf", []):
+            if option.get("type") != "null":
+                prop.update(option)
+                break
+        prop.pop("title", None)
+        if prop.get("default", ...) is None:
+            prop.pop("default")
+        properties[name] = prop
+    return {"type": "object", "properties": properties, "required": schema.get("required", [])}
+
+def tool_schemas() -> list[dict]:
+    """Tool definitions in the function-calling format Ollama expects."""
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": TOOL_DESCRIPTIONS[name],
+                "parameters": _parameters(model),
+            },
+        }
+        for name, model in TOOL_ARGS.items()
+    ]
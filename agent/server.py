@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from async_agent import AsyncChat
+from profiles import warmup_profiles
+from tracing import tracer
+
+# Concurrent turns sent towards Ollama, and how many more may wait before we shed load
+MAX_WORKERS = int(os.environ.get("AGENT_WORKERS", "4"))
+MAX_QUEUE = int(os.environ.get("AGENT_QUEUE", "32"))
+# Tokens a worker may run ahead of a slow reader before it waits for them to be sent
+TOKEN_BUFFER = 256
+SESSION_TTL = 1800.0
+SESSION_SWEEP_INTERVAL = 60.0
+
+
+class ChatRequest(BaseModel):
+    message: str = Field(..., min_length=1, description="User message")
+    session_id: Optional[str] = Field(default=None, description="Existing session; a new one is created when omitted")
+    stream: bool = Field(default=False, description="Stream the reply as plain text chunks")
+
+
+class ChatReply(BaseModel):
+    session_id: str
+    reply: str
+
+
+class Session:
+    """Per-conversation state. A session has at most one turn pending at a time."""
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.created = time.time()
+        self.last_active = self.created
+        self.turns = 0
+        self.busy = False
+
+    def info(self) -> dict:
+        return {"session_id": self.id, "created": self.created, "last_active": self.last_active, "turns": self.turns}
+
+
+class Job:
+    def __init__(self, session: Session, message: str):
+        self.session = session
+        self.message = message
+        self.tokens: asyncio.Queue = asyncio.Queue(maxsize=TOKEN_BUFFER)
+        self.cancelled = False
+
+    def cancel(self):
+        """Stop the worker early; draining unblocks it if it is waiting on a full buffer."""
+        self.cancelled = True
+        while not self.tokens.empty():
+            self.tokens.get_nowait()
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class SessionBusyError(Exception):
+    pass
+
+
+class AgentServer:
+    """
+    Multiplexes many sessions over one AsyncChat. Turns go through a bounded queue that a
+    fixed pool of workers drains, so at most MAX_WORKERS generations hit Ollama at once and
+    excess load is rejected up front instead of piling up.
+    """
+
+    def __init__(self, agent: AsyncChat, workers: int = MAX_WORKERS, queue_size: int = MAX_QUEUE):
+        self.agent = agent
+        self.worker_count = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sessions: dict[str, Session] = {}
+        self.active = 0
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.worker_count)]
+        self._tasks.append(asyncio.create_task(self.agent.llm.warmup(warmup_profiles(self.agent.profiles))))
+        self._tasks.append(asyncio.create_task(self._sweep_sessions()))
+        logging.info(f"Agent server started with {self.worker_count} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.agent.aclose()
+        logging.info("Agent server stopped")
+
+    def session(self, session_id: str = None) -> Session:
+        session_id = session_id or uuid.uuid4().hex
+        if session_id not in self.sessions:
+            self.sessions[session_id] = Session(session_id)
+        return self.sessions[session_id]
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self.queue.get()
+            self.active += 1
+            tokens = self.agent.chat_stream(job.message, job.session.id)
+            try:
+                if job.cancelled:
+                    continue
+                async for token in tokens:
+                    if job.cancelled:
+                        break
+                    await job.tokens.put(token)
+            except Exception as e:
+                logging.error(f"Worker {index} failed: {e}")
+                if not job.cancelled:
+                    await job.tokens.put(f"Agent error: {e}")
+            finally:
+                # Closing the generator runs its cleanup now rather than whenever it is collected
+                await tokens.aclose()
+                self.active -= 1
+                if not job.cancelled:
+                    await job.tokens.put(None)
+                self.queue.task_done()
+
+    async def _sweep_sessions(self):
+        while True:
+            await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+            cutoff = time.time() - SESSION_TTL
+            for session_id in [s.id for s in self.sessions.values() if s.last_active < cutoff and not s.busy]:
+                self.forget(session_id)
+                logging.info(f"Session expired: {session_id}")
+
+    def forget(self, session_id: str) -> bool:
+        self.agent.forget(session_id)
+        return self.sessions.pop(session_id, None) is not None
+
+    async def turn(self, session: Session, message: str):
+        """
+        Queue one turn and yield its reply tokens. Raises QueueFullError under overload and
+        SessionBusyError while the session's previous turn is still pending.
+        """
+        if session.busy:
+            raise SessionBusyError(f"Session {session.id} already has a turn in progress")
+        job = Job(session, message)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Agent is busy, try again shortly")
+        session.busy = True
+        session.turns += 1
+        session.last_active = time.time()
+        try:
+            while True:
+                token = await job.tokens.get()
+                if token is None:
+                    break
+                yield token
+        finally:
+            job.cancel()
+            session.busy = False
+            session.last_active = time.time()
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "queued": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "active": self.active,
+            "workers": self.worker_count,
+            "llm": self.agent.llm.metrics.snapshot(),
+        }
+
+
+server: AgentServer = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global server
+    server = AgentServer(AsyncChat(backend_mode=os.environ.get("AGENT_BACKEND", "http")))
+    await server.start()
+    yield
+    await server.stop()
+
+
+app = FastAPI(
+    title="fast-bot agent server",
+    description="HTTP and WebSocket front end for the agent with per-session state",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", **server.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Per-stage latency histograms, errors, tokens and payload sizes in Prometheus text format."""
+    return PlainTextResponse(tracer.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/chat", response_model=ChatReply)
+async def chat_route(request: ChatRequest):
+    """Run one turn. With stream=true the reply is sent as plain text chunks as it is generated."""
+    session = server.session(request.session_id)
+    tokens = server.turn(session, request.message)
+
+    # Pull the first token before responding so overload surfaces as a 503, not a broken stream
+    try:
+        first = await anext(tokens, "")
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except SessionBusyError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+    if request.stream:
+        async def body():
+            try:
+                yield first
+                async for token in tokens:
+                    yield token
+            finally:
+                # A client that hangs up mid-stream frees the worker and the session now
+                await tokens.aclose()
+        return StreamingResponse(body(), media_type="text/plain; charset=utf-8", headers={"X-Session-Id": session.id})
+
+    reply = first + "".join([token async for token in tokens])
+    return ChatReply(session_id=session.id, reply=reply)
+
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = server.sessions.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    memory = server.agent.memories.get(session_id)
+    return {**session.info(), "history_tokens": memory.tokens(), "memory": memory.stats}
+
+
+@app.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_session(session_id: str):
+    if not server.forget(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return None
+
+
+@app.websocket("/ws")
+async def chat_socket(websocket: WebSocket, session_id: Optional[str] = None):
+    """
+    One socket is one session. Send {"message": "..."}; the reply arrives as
+    {"type": "token", "data": ...} frames followed by {"type": "done"}.
+    """
+    await websocket.accept()
+    session = server.session(session_id)
+    await websocket.send_json({"type": "session", "session_id": session.id})
+    try:
+        while True:
+            try:
+                payload = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "frames must be JSON"})
+                continue
+            message = (payload.get("message") or "").strip() if isinstance(payload, dict) else ""
+            if not message:
+                await websocket.send_json({"type": "error", "detail": "message is required"})
+                continue
+            try:
+                async for token in server.turn(session, message):
+                    await websocket.send_json({"type": "token", "data": token})
+            except (QueueFullError, SessionBusyError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            await websocket.send_json({"type": "done"})
+    except WebSocketDisconnect:
+        logging.info(f"WebSocket closed for session {session.id}")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=os.environ.get("AGENT_HOST", "127.0.0.1"), port=int(os.environ.get("AGENT_PORT", "8100")))
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Agent modules are imported as top-level names, as when running from agent/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Keep the log and caches written at import out of the source tree
+os.environ.setdefault("AGENT_DATA_DIR", tempfile.mkdtemp(prefix="agent-tests-"))
@@ -0,0 +1,201 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from async_agent import AsyncChat
+from http_cache import HttpCache
+from profiles import ModelProfile
+
+BACKEND = "http://backend.test"
+
+
+class Upstream:
+    """
+    httpx MockTransport handler. `routes` maps a path to (status, headers, body), or to a
+    function of the request returning one.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        route = self.routes.get(request.url.path, (404, {}, b'{"detail": "Not Found"}'))
+        status, headers, body = route(request) if callable(route) else route
+        if request.headers.get("If-None-Match") and request.headers["If-None-Match"] == headers.get("ETag"):
+            return httpx.Response(304, headers=headers)
+        return httpx.Response(status, headers=headers, content=body)
+
+
+class FakeOllama:
+    """
+    ollama.AsyncClient stand-in answering each model from `replies`: a message, an
+    exception, or a function of the messages returning a message.
+    """
+
+    def __init__(self):
+        self.replies = {}
+        self.models = []
+
+    async def chat(self, model=None, messages=None, stream=False, **_):
+        self.models.append(model)
+        reply = self.replies[model]
+        if callable(reply):
+            reply = reply(messages)
+        if isinstance(reply, Exception):
+            raise reply
+        if stream:
+            return self._stream(reply)
+        return {"message": reply}
+
+    async def _stream(self, reply):
+        if reply.get("tool_calls"):
+            yield {"message": {"content": "", "tool_calls": reply["tool_calls"]}}
+            return
+        for word in reply["content"].split(" "):
+            yield {"message": {"content": word + " "}}
+
+
+PROFILES = {
+    "decide": ModelProfile(model="small"),
+    "fallback": ModelProfile(model="big"),
+    "summarize": ModelProfile(model="big"),
+    "compact": ModelProfile(model="small"),
+}
+WEATHER_CALL = {"function": {"name": "get_weather", "arguments": {"city": "Paris"}}}
+
+
+@pytest.fixture
+def upstream():
+    return Upstream()
+
+
+@pytest.fixture
+def make_chat(upstream, ollama, tmp_path):
+    def make(**kwargs):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        kwargs.setdefault("http_cache", HttpCache(str(tmp_path / "cache.db")))
+        kwargs.setdefault("profiles", PROFILES)
+        chat = AsyncChat(backend_url=BACKEND, http_client=client, router=False, decision_cache=False, **kwargs)
+        chat.llm.client = ollama
+        return chat
+    return make
+
+
+@pytest.fixture
+def ollama():
+    return FakeOllama()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_fetch_serves_fresh_entries_and_revalidates_stale_ones(make_chat, upstream):
+    upstream.routes["/fresh"] = (200, {"Cache-Control": "max-age=60", "Content-Type": "text/plain"}, b"fresh body")
+    upstream.routes["/stale"] = (200, {"Cache-Control": "max-age=0", "ETag": '"v1"', "Content-Type": "text/plain"}, b"stale body")
+
+    async def scenario():
+        async with make_chat() as chat:
+            return [await chat.fetch_url_content(f"http://example.test/{path}") for path in ("fresh", "fresh", "stale", "stale")]
+
+    assert run(scenario()) == ["fresh body", "fresh body", "stale body", "stale body"]
+    assert [(r.url.path, r.headers.get("If-None-Match")) for r in upstream.requests] == [
+        ("/fresh", None), ("/stale", None), ("/stale", '"v1"'),
+    ]
+
+
+def test_fetch_rejects_unsupported_methods_without_a_request(make_chat, upstream):
+    async def scenario():
+        async with make_chat() as chat:
+            return await chat.fetch_url_content("http://example.test/x", method="PATCH")
+
+    assert run(scenario()) == "Unsupported HTTP method: PATCH"
+    assert upstream.requests == []
+
+
+def user_list(request):
+    ids = [int(n) for n in request.url.params["ids"].split(",")]
+    items = [{"user_id": n, "user_name": f"user{n}"} for n in ids if n != 404]
+    return 200, {"Content-Type": "application/json"}, json.dumps({"items": items, "next_cursor": None, "total_estimate": len(items)}).encode()
+
+
+def test_user_lookups_in_a_plan_share_one_list_call(make_chat, upstream):
+    upstream.routes["/users"] = user_list
+    plan = [{"action": "manage_users", "method": "GET", "user_id": n} for n in (4, 2, 404)]
+
+    async def scenario():
+        async with make_chat(http_cache=False) as chat:
+            return await chat.run_plan(plan)
+
+    result, needs_summary = run(scenario())
+    assert [str(r.url) for r in upstream.requests] == [f"{BACKEND}/users?ids=2%2C4%2C404&limit=3"]
+    assert "#2 user2" in result and "#4 user4" in result and "User with ID 404 not found" in result
+    assert not needs_summary
+
+
+@pytest.mark.parametrize("small_reply", [{"content": '{"action": "get_weather"}'}, RuntimeError("model not loaded")])
+def test_invalid_or_failed_decision_escalates(make_chat, ollama, small_reply):
+    ollama.replies = {"small": small_reply, "big": {"content": "", "tool_calls": [WEATHER_CALL]}}
+
+    async def scenario():
+        async with make_chat() as chat:
+            return await chat.decide([])
+
+    _, plan = run(scenario())
+    assert plan == [{"action": "get_weather", "city": "Paris"}]
+    assert ollama.models == ["small", "big"]
+
+
+def weather(request):
+    payload = {"city": "Paris", "temperature": 21, "description": "Sunny"}
+    return 200, {"Content-Type": "application/json"}, json.dumps(payload).encode()
+
+
+def stream_reply(make_chat, message):
+    async def scenario():
+        async with make_chat(http_cache=False) as chat:
+            return [token async for token in chat.chat_stream(message)]
+    return run(scenario())
+
+
+def test_plain_streamed_reply_is_shown_as_it_arrives(make_chat, ollama):
+    ollama.replies = {"small": {"content": "Hello there"}}
+    assert stream_reply(make_chat, "hi") == ["Hello ", "there "]
+
+
+def test_streamed_tool_call_runs_the_plan(make_chat, ollama, upstream):
+    upstream.routes["/weather/city/Paris"] = weather
+    ollama.replies = {"small": {"content": '{"action": "get_weather", "city": "Paris"} and more'}}
+    assert stream_reply(make_chat, "weather?") == ["Paris: Sunny, 21°C"]
+    assert ollama.models == ["small"]
+
+
+def test_invalid_streamed_tool_call_escalates(make_chat, ollama, upstream):
+    upstream.routes["/weather/city/Paris"] = weather
+    ollama.replies = {"small": {"content": '{"action": "launch_rocket"}'}, "big": {"content": "", "tool_calls": [WEATHER_CALL]}}
+    assert stream_reply(make_chat, "weather?") == ["Paris: Sunny, 21°C"]
+    assert ollama.models == ["small", "big"]
+
+
+def test_large_results_are_map_reduced_with_cached_chunks(make_chat, ollama):
+    ollama.replies = {"big": lambda messages: {"content": "summary of " + messages[0]["content"].splitlines()[1][:12]}}
+    rows = [{"id": n, "text": f"row {n} " + "word " * 40} for n in range(200)]
+
+    async def scenario():
+        async with make_chat() as chat:
+            first = await chat.summarize_response(json.dumps(rows))
+            calls = len(ollama.models)
+            rows[-1]["text"] = "changed"
+            await chat.summarize_response(json.dumps(rows))
+            return first, calls, len(ollama.models) - calls
+
+    first, first_calls, second_calls = run(scenario())
+    assert first.startswith("summary of ")
+    # Each chunk, then the final summary
+    assert first_calls > 2
+    # Only the changed chunk runs again; its summary is the same, so the final one is cached
+    assert second_calls == 1
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from compaction import compact_for_llm, estimate_tokens, pack_chunks, split_for_llm
+
+ROWS = [{"id": n, "name": f"user{n}", "note": None, "tags": []} for n in range(300)]
+
+
+def test_estimate_counts_punctuation_as_tokens():
+    # chars/4 would call this 3 tokens; a llama tokenizer needs about a dozen
+    assert estimate_tokens('{"a":[1,2]}') >= 10
+    assert estimate_tokens("word " * 100) == 101
+
+
+def test_compaction_drops_empty_fields_and_uses_columns():
+    compacted = json.loads(compact_for_llm(json.dumps(ROWS[:3], indent=2)))
+    assert compacted == {"columns": ["id", "name"], "rows": [[0, "user0"], [1, "user1"], [2, "user2"]]}
+
+
+def test_compaction_caps_rows_until_the_budget_fits():
+    compacted = compact_for_llm(json.dumps(ROWS), budget=200)
+    assert estimate_tokens(compacted) <= 200
+    assert json.loads(compacted)["total_rows"] == 300
+
+
+def test_plain_text_is_cut_to_the_budget():
+    assert "[truncated:" in compact_for_llm("word " * 1000, budget=50)
+
+
+@pytest.mark.parametrize("payload", [ROWS, {"total": 300, "items": ROWS}])
+def test_large_payloads_split_into_budgeted_chunks_without_losing_rows(payload):
+    chunks = split_for_llm(json.dumps(payload), budget=500)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 500 for chunk in chunks)
+    rows = [row for chunk in chunks for row in json.loads(chunk.splitlines()[-1])["rows"]]
+    assert [row[0] for row in rows] == list(range(300))
+
+
+def test_text_is_packed_by_paragraph():
+    paragraphs = [f"paragraph {n} " + "word " * 40 for n in range(20)]
+    chunks = pack_chunks(paragraphs, budget=100)
+    assert all(estimate_tokens(chunk) <= 100 for chunk in chunks)
+    assert "\n\n".join(chunks) == "\n\n".join(paragraphs)
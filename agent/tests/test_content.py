@@ -0,0 +1,19 @@
+from content import extract_content, read_capped
+
+
+def test_unclosed_head_keeps_body():
+    assert extract_content(b"<html><head><title>T</title><body><p>Hello</p>", "text/html") == "T\n\nHello"
+
+
+def test_scripts_and_styles_are_dropped():
+    html = b"<html><head><style>p{}</style><script>x()</script></head><body><p>One</p><p>Two</p></body></html>"
+    assert extract_content(html, "text/html; charset=utf-8") == "One\nTwo"
+
+
+def test_json_is_minified():
+    assert extract_content(b'{ "a": [1, 2] }', "application/json") == '{"a":[1,2]}'
+
+
+def test_read_capped_stops_at_limit():
+    body, truncated = read_capped(iter([b"abc", b"def", b"ghi"]), limit=5)
+    assert (body, truncated) == (b"abcde", True)
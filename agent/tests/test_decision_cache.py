@@ -0,0 +1,41 @@
+import time
+
+from decision_cache import DecisionCache
+
+PLAN = [{"action": "get_weather", "city": "Paris"}]
+
+
+def test_trivial_variants_share_an_entry():
+    cache = DecisionCache()
+    cache.put("Weather in Paris?", "m", "v1", PLAN)
+    assert cache.get("  weather   in paris!! ", "m", "v1") == PLAN
+    assert cache.get("weather in paris", "other-model", "v1") is None
+    assert cache.get("weather in paris", "m", "v2") is None
+
+
+def test_entries_expire_and_least_recent_is_evicted(monkeypatch):
+    cache = DecisionCache(max_entries=2, ttl=10)
+    for message in ("a", "b"):
+        cache.put(message, "m", "v1", PLAN)
+    cache.get("a", "m", "v1")
+    cache.put("c", "m", "v1", PLAN)
+    assert cache.get("b", "m", "v1") is None
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get("a", "m", "v1") is None
+    assert cache.stats["evictions"] == 1 and cache.stats["expired"] == 1
+
+
+def test_returned_plans_are_copies():
+    cache = DecisionCache()
+    cache.put("a", "m", "v1", PLAN)
+    cache.get("a", "m", "v1")[0]["city"] = "Rome"
+    assert cache.get("a", "m", "v1") == PLAN
+
+
+def test_entries_survive_a_restart_on_disk(tmp_path):
+    path = str(tmp_path / "decisions.db")
+    DecisionCache(db_path=path).put("a", "m", "v1", PLAN)
+    cache = DecisionCache(db_path=path)
+    assert cache.get("a", "m", "v1") == PLAN
+    assert cache.stats["disk_hits"] == 1
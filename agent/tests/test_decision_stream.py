@@ -0,0 +1,70 @@
+import json
+
+from agent import DecisionStream
+
+
+def chunks(*tokens):
+    return [{"message": {"role": "assistant", "content": token}} for token in tokens]
+
+
+def run(decision, stream):
+    shown = []
+    for chunk in stream:
+        text = decision.feed(chunk)
+        if text:
+            shown.append(text)
+        if decision.done:
+            break
+    return shown
+
+
+def test_plain_reply_is_shown_token_by_token():
+    decision = DecisionStream()
+    assert run(decision, chunks("", " Hello", " there")) == [" Hello", " there"]
+    assert decision.tool_mode is False and not decision.done
+    assert decision.escalation_reason(can_escalate=True) is None
+
+
+def test_json_tool_call_is_cut_off_when_the_object_closes():
+    decision = DecisionStream()
+    call = json.dumps({"action": "get_weather", "city": "Paris"})
+    shown = run(decision, chunks(call[:10], call[10:], " and some trailing text"))
+    assert shown == []
+    assert decision.done and decision.tool_mode
+    assert decision.plan == [{"action": "get_weather", "city": "Paris"}]
+
+
+def test_native_tool_calls_end_the_stream():
+    decision = DecisionStream()
+    tool_calls = [{"function": {"name": "manage_users", "arguments": {"method": "GET", "user_id": 2}}}]
+    assert run(decision, [{"message": {"content": "", "tool_calls": tool_calls}}] + chunks("late")) == []
+    assert decision.plan == [{"action": "manage_users", "method": "GET", "user_id": 2}]
+
+
+def test_invalid_tool_call_escalates():
+    decision = DecisionStream()
+    run(decision, chunks('{"action": "launch_rocket"}'))
+    assert decision.done and decision.plan == []
+    assert decision.escalation_reason(can_escalate=True) == "invalid"
+    assert decision.escalation_reason(can_escalate=False) is None
+
+
+def test_failure_before_any_output_is_recoverable():
+    decision = DecisionStream()
+    assert decision.recoverable(can_escalate=True)
+    assert decision.escalation_reason(can_escalate=True) == "error"
+    assert decision.escalated({"content": "Hi!"}, []) == "Hi!"
+    assert not decision.tool_mode
+
+
+def test_failure_after_output_is_not_recoverable():
+    decision = DecisionStream()
+    run(decision, chunks("Partial"))
+    assert not decision.recoverable(can_escalate=True)
+
+
+def test_escalated_tool_call_is_not_shown():
+    decision = DecisionStream()
+    plan = [{"action": "get_weather", "city": "Rome"}]
+    assert decision.escalated({"content": ""}, plan) == ""
+    assert decision.tool_mode and decision.plan == plan
@@ -0,0 +1,28 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+AGENT_DIR = Path(__file__).resolve().parent.parent
+
+SCRIPT = """
+import json, sys
+import embedded
+embedded.load_backend()
+import schemas
+print(json.dumps({
+    "backend_on_path": str(embedded.BACKEND_DIR) in sys.path,
+    "agent_schemas": schemas.__file__.startswith(str(embedded.AGENT_DIR)),
+    "backend_schemas": embedded._backend_schemas.__file__.startswith(str(embedded.BACKEND_DIR)),
+}))
+"""
+
+
+def test_backend_dir_is_only_on_sys_path_while_loading(tmp_path):
+    env = {**os.environ, "PYTHONPATH": str(AGENT_DIR), "AGENT_DATA_DIR": str(tmp_path),
+           "APP_DB_FILE": str(tmp_path / "app.db")}
+    result = subprocess.run([sys.executable, "-c", SCRIPT], cwd=tmp_path, env=env,
+                            check=True, capture_output=True, text=True, timeout=60)
+    assert json.loads(result.stdout.splitlines()[-1]) == {
+        "backend_on_path": False, "agent_schemas": True, "backend_schemas": True}
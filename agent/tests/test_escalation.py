@@ -0,0 +1,61 @@
+import pytest
+
+import agent
+from profiles import ModelProfile
+
+WEATHER_CALL = {"function": {"name": "get_weather", "arguments": {"city": "Paris"}}}
+
+
+@pytest.fixture
+def models(monkeypatch):
+    """Replies per model, set by each test; records the model of every decision call."""
+    replies, calls = {}, []
+
+    def chat(kind, messages=None, tools=None, model=None, options=None, **_):
+        calls.append(model)
+        reply = replies[model]
+        if isinstance(reply, Exception):
+            raise reply
+        return {"message": reply}
+
+    monkeypatch.setattr(agent.llm_gateway, "chat", chat)
+    monkeypatch.setitem(agent.PROFILES, "decide", ModelProfile(model="small"))
+    monkeypatch.setitem(agent.PROFILES, "fallback", ModelProfile(model="big"))
+    return replies, calls
+
+
+def test_valid_decision_stays_on_the_small_model(models):
+    replies, calls = models
+    replies["small"] = {"content": "", "tool_calls": [WEATHER_CALL]}
+    _, plan = agent.decide([])
+    assert plan == [{"action": "get_weather", "city": "Paris"}]
+    assert calls == ["small"]
+
+
+def test_plain_text_answer_is_not_escalated(models):
+    replies, calls = models
+    replies["small"] = {"content": "Hello there"}
+    assert agent.decide([]) == (replies["small"], [])
+    assert calls == ["small"]
+
+
+@pytest.mark.parametrize("small_reply", [
+    {"content": '{"action": "get_weather"}'},
+    {"content": "", "tool_calls": [{"function": {"name": "no_such_tool", "arguments": {}}}]},
+    RuntimeError("model not loaded"),
+])
+def test_invalid_or_failed_decision_escalates(models, small_reply):
+    replies, calls = models
+    replies["small"] = small_reply
+    replies["big"] = {"content": "", "tool_calls": [WEATHER_CALL]}
+    _, plan = agent.decide([])
+    assert plan == [{"action": "get_weather", "city": "Paris"}]
+    assert calls == ["small", "big"]
+
+
+def test_no_escalation_when_both_stages_use_one_model(models, monkeypatch):
+    replies, calls = models
+    monkeypatch.setitem(agent.PROFILES, "fallback", ModelProfile(model="small"))
+    replies["small"] = {"content": '{"action": "get_weather"}'}
+    assert agent.decide([])[1] == []
+    assert calls == ["small"]
@@ -0,0 +1,37 @@
+import pytest
+
+from agent import FetchRequest
+from http_cache import HttpCache
+
+
+class Response:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+@pytest.mark.parametrize("method", ["PATCH", "options"])
+def test_unsupported_methods_are_answered_without_a_request(method):
+    assert FetchRequest(None, "http://example.com", method).early_result() == f"Unsupported HTTP method: {method.upper()}"
+
+
+def test_only_bodies_of_writes_are_sent():
+    assert FetchRequest(None, "http://example.com", "post", data={"a": 1}).json == {"a": 1}
+    assert FetchRequest(None, "http://example.com", "DELETE", data={"a": 1}).json is None
+
+
+def test_stale_entry_is_revalidated_and_fresh_one_served(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.db"))
+    url = "http://example.com/page"
+    first = FetchRequest(cache, url)
+    assert first.early_result() is None
+    first.result(Response(headers={"ETag": '"v1"', "Cache-Control": "max-age=0"}), b"hello", False)
+
+    second = FetchRequest(cache, url)
+    assert second.early_result() is None
+    assert second.headers == {"If-None-Match": '"v1"'}
+    not_modified = Response(304, {"Cache-Control": "max-age=60"})
+    assert second.revalidates(not_modified)
+    assert second.revalidated(not_modified) == "hello"
+
+    assert FetchRequest(cache, url).early_result() == "hello"
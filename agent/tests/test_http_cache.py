@@ -0,0 +1,112 @@
+import email.utils
+import time
+
+import pytest
+
+import http_cache
+from http_cache import HttpCache, freshness_lifetime
+
+NOW = 1_700_000_000.0
+
+
+def http_date(timestamp: float) -> str:
+    return email.utils.formatdate(timestamp, usegmt=True)
+
+
+@pytest.mark.parametrize("headers, lifetime", [
+    ({"Cache-Control": "max-age=60"}, 60.0),
+    ({"Cache-Control": "public, max-age=60", "Age": "15"}, 45.0),
+    ({"Cache-Control": "max-age=10", "Age": "30"}, 0.0),
+    ({"Expires": http_date(NOW + 120), "Date": http_date(NOW)}, 120.0),
+    ({"Last-Modified": http_date(NOW - 1000)}, 100.0),
+    ({"Last-Modified": http_date(NOW - 10 ** 6)}, http_cache.HEURISTIC_MAX),
+    ({"Cache-Control": "no-cache", "ETag": '"v1"'}, 0.0),
+    ({"ETag": '"v1"'}, 0.0),
+    ({"Cache-Control": "no-store", "ETag": '"v1"'}, None),
+    ({"Cache-Control": "no-cache"}, None),
+    ({"Cache-Control": "max-age=60", "Vary": "*"}, None),
+    ({}, None),
+])
+def test_freshness_lifetime(headers, lifetime):
+    assert freshness_lifetime(headers, NOW) == lifetime
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HttpCache(str(tmp_path / "cache.db"))
+
+
+def test_fresh_entry_is_a_hit(cache):
+    cache.store("http://x/a", {"Cache-Control": "max-age=60"}, "page a")
+    entry = cache.lookup("http://x/a")
+    assert entry.fresh and entry.result == "page a"
+    assert cache.stats["hits"] == 1
+
+
+def test_uncacheable_response_is_not_stored(cache):
+    cache.store("http://x/a", {"Cache-Control": "no-store"}, "page a")
+    assert cache.lookup("http://x/a") is None
+
+
+def test_stale_entry_is_revalidated_with_its_validators(cache):
+    last_modified = http_date(time.time() - 60)
+    cache.store("http://x/a", {"ETag": '"v1"', "Last-Modified": last_modified, "Cache-Control": "no-cache"}, "page a")
+    entry = cache.lookup("http://x/a")
+    assert not entry.fresh
+    assert entry.validators() == {"If-None-Match": '"v1"', "If-Modified-Since": last_modified}
+
+    assert cache.revalidated(entry, {"Cache-Control": "max-age=300", "ETag": '"v2"'}) == "page a"
+    refreshed = cache.lookup("http://x/a")
+    assert refreshed.fresh and refreshed.etag == '"v2"'
+    assert cache.stats["revalidated"] == 1
+
+
+def test_writes_invalidate_the_url_and_its_collection(cache):
+    cache.store("http://x/users", {"Cache-Control": "max-age=60"}, "list")
+    cache.store("http://x/users/3", {"Cache-Control": "max-age=60"}, "user 3")
+    cache.invalidate("http://x/users/3")
+    assert cache.lookup("http://x/users") is None
+    assert cache.lookup("http://x/users/3") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.db"), max_bytes=25)
+    cache.store("http://x/a", {"Cache-Control": "max-age=60"}, "a" * 10)
+    time.sleep(0.01)
+    cache.store("http://x/b", {"Cache-Control": "max-age=60"}, "b" * 10)
+    time.sleep(0.01)
+    assert cache.lookup("http://x/a") is not None
+    time.sleep(0.01)
+    cache.put_summary("text", "model", "prompt", "s" * 10)
+    assert cache.lookup("http://x/b") is None
+    assert cache.lookup("http://x/a") is not None
+    assert cache.get_summary("text", "model", "prompt") == "s" * 10
+    assert cache.stats["evictions"] == 1
+
+
+def test_hits_do_not_write_until_a_batch_is_pending(cache, monkeypatch):
+    monkeypatch.setattr(http_cache, "TOUCH_BATCH", 3)
+    urls = [f"http://x/{name}" for name in "abc"]
+    for url in urls:
+        cache.store(url, {"Cache-Control": "max-age=60"}, url)
+    changes = cache._db.total_changes
+    for url in urls[:2]:
+        cache.lookup(url)
+        cache.lookup(url)
+    assert cache._db.total_changes == changes
+
+    cache.lookup(urls[2])
+    assert cache._db.total_changes == changes + 3
+
+
+def test_flush_writes_pending_touches(cache):
+    cache.store("http://x/a", {"Cache-Control": "max-age=60"}, "page a")
+    changes = cache._db.total_changes
+    cache.lookup("http://x/a")
+    cache.flush()
+    assert cache._db.total_changes == changes + 1
+
+
+def test_database_runs_in_wal_mode(cache):
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert cache._db.execute("PRAGMA synchronous").fetchone()[0] == 1
@@ -0,0 +1,17 @@
+from llm_gateway import LLMMetrics, percentile
+
+
+def test_percentile_is_nearest_rank_over_unsorted_values():
+    values = [0.5, 0.1, 0.4, 0.2, 0.3]
+    assert (percentile(values, 0.0), percentile(values, 0.5), percentile(values, 0.99)) == (0.1, 0.3, 0.5)
+    assert percentile([], 0.5) is None
+
+
+def test_snapshot_reports_latency_percentiles_per_kind():
+    metrics = LLMMetrics()
+    for latency in (0.3, 0.1, 0.2):
+        metrics.record("decide", latency)
+    metrics.record("decide", 9.0, coalesced=True)
+    snapshot = metrics.snapshot()["decide"]
+    assert snapshot["calls"] == 4 and snapshot["coalesced"] == 1
+    assert (snapshot["latency_p50"], snapshot["latency_p99"]) == (0.2, 0.3)
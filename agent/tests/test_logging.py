@@ -0,0 +1,25 @@
+import subprocess
+import sys
+from pathlib import Path
+
+AGENT_DIR = Path(__file__).resolve().parent.parent
+
+
+def run_agent(script: str, cwd: Path, data_dir: Path):
+    subprocess.run([sys.executable, "-c", f"import logging, agent\n{script}"], cwd=cwd,
+                   env={"PYTHONPATH": str(AGENT_DIR), "AGENT_DATA_DIR": str(data_dir)},
+                   check=True, capture_output=True, timeout=60)
+
+
+def test_queued_records_are_written_before_exit(tmp_path):
+    run_agent("for i in range(2000):\n    logging.info(f'line {i}')", tmp_path, tmp_path)
+    lines = (tmp_path / "agent.log").read_text().splitlines()
+    assert sum("line " in line for line in lines) == 2000
+
+
+def test_files_go_to_the_data_dir_not_the_working_directory(tmp_path):
+    cwd, data_dir = tmp_path / "cwd", tmp_path / "data"
+    cwd.mkdir()
+    run_agent("logging.info('hello')", cwd, data_dir)
+    assert list(cwd.iterdir()) == []
+    assert {"agent.log", "http_cache.db"} <= {path.name for path in data_dir.iterdir()}
@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+import agent
+from http_cache import HttpCache
+
+
+@pytest.fixture
+def summarizer(tmp_path, monkeypatch):
+    """Summarizes each part to its first line; records prompts and peak concurrency."""
+    prompts, lock = [], threading.Lock()
+    active = {"now": 0, "peak": 0}
+
+    def chat(kind, messages=None, **_):
+        prompt = messages[0]["content"]
+        with lock:
+            prompts.append(prompt)
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.02)
+        with lock:
+            active["now"] -= 1
+        return {"message": {"content": "summary of " + prompt.splitlines()[1]}}
+
+    monkeypatch.setattr(agent.llm_gateway, "chat", chat)
+    monkeypatch.setattr(agent, "http_cache", HttpCache(str(tmp_path / "cache.db")))
+    return prompts, active
+
+
+def chunks(*names):
+    return [f"{name}\n" + "detail " * 50 for name in names]
+
+
+def test_chunks_are_summarized_concurrently_up_to_the_cap(summarizer):
+    prompts, active = summarizer
+    result = agent.map_reduce(chunks(*"abcdefg"))
+    assert len(prompts) == 7
+    assert 1 < active["peak"] <= agent.MAP_CONCURRENCY
+    assert result.splitlines()[0] == "summary of a"
+
+
+def test_only_changed_chunks_are_summarized_again(summarizer):
+    prompts, _ = summarizer
+    agent.map_reduce(chunks("a", "b", "c"))
+    prompts.clear()
+    result = agent.map_reduce(chunks("a", "B", "c"))
+    assert [prompt.splitlines()[1] for prompt in prompts] == ["B"]
+    assert "summary of a" in result and "summary of B" in result
+
+
+def test_summaries_over_the_budget_are_reduced_again(summarizer, monkeypatch):
+    prompts, _ = summarizer
+    monkeypatch.setattr(agent, "SUMMARY_TOKEN_BUDGET", 12)
+    agent.map_reduce(chunks(*"abcd"))
+    assert any(prompt.startswith(agent.REDUCE_PROMPT.split("{")[0]) for prompt in prompts)
@@ -0,0 +1,20 @@
+import pytest
+
+from memory import ConversationMemory, refers_back
+
+
+@pytest.mark.parametrize("message", ["weather in Paris", "list users", "get user 3", "create user bob"])
+def test_standalone_messages_keep_the_shared_cache_key(message):
+    memory = ConversationMemory()
+    memory.add_turn("list users", "2 users: #1 ann, #2 bob")
+    assert not refers_back(message)
+    assert memory.context_for(message) == ""
+
+
+@pytest.mark.parametrize("message", ["delete that user", "and tomorrow?", "what about Rome", "rename it to carl"])
+def test_follow_ups_are_keyed_by_history(message):
+    memory = ConversationMemory()
+    assert memory.context_for(message) == ""
+    memory.add_turn("get user 2", "User #2 bob")
+    assert refers_back(message)
+    assert memory.context_for(message) == memory.fingerprint() != ""
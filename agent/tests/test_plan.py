@@ -0,0 +1,60 @@
+import json
+import pytest
+
+import agent
+from agent import USER_BATCH_LIMIT, batch_user_lookups, run_plan, split_user_list
+
+
+def lookup(user_id):
+    return {"action": "manage_users", "method": "GET", "user_id": user_id}
+
+
+def test_lookups_share_one_list_call():
+    weather = {"action": "get_weather", "city": "Paris"}
+    user_ids, remaining = batch_user_lookups([lookup(3), weather, lookup(7)])
+    assert user_ids == [3, 7]
+    assert remaining == [weather]
+
+
+@pytest.mark.parametrize("plan", [
+    [lookup(3)],
+    [lookup(n) for n in range(1, USER_BATCH_LIMIT + 2)],
+    [lookup(0), lookup(4)],
+    [lookup("3"), lookup(4)],
+])
+def test_single_invalid_or_too_many_ids_are_not_batched(plan):
+    assert batch_user_lookups(plan) == ([], plan)
+
+
+def test_split_user_list_marks_absent_ids_on_a_complete_page():
+    page = json.dumps({"items": [{"user_id": 1, "user_name": "ann"}], "next_cursor": None, "total_estimate": 1})
+    found = split_user_list(page, [1, 2])
+    assert json.loads(found[1]) == {"user_id": 1, "user_name": "ann"}
+    assert "not found" in json.loads(found[2])["detail"]
+
+
+@pytest.fixture
+def user_api(monkeypatch):
+    calls = []
+
+    def call_user_api(method, user_id=None, data=None, params=None):
+        calls.append((user_id, params))
+        wanted = [int(n) for n in params["ids"].split(",")]
+        users = [{"user_id": n, "user_name": f"user{n}"} for n in wanted if n != 404]
+        return json.dumps({"items": users, "next_cursor": None, "total_estimate": len(users)})
+
+    monkeypatch.setattr(agent, "call_user_api", call_user_api)
+    return calls
+
+
+def test_lookups_ask_for_exactly_their_ids(user_api):
+    result, needs_summary = run_plan([lookup(4), lookup(2), lookup(4)])
+    assert user_api == [(None, {"ids": "2,4", "limit": 2})]
+    assert "user2" in result and "user4" in result
+    assert not needs_summary
+
+
+def test_high_and_missing_ids_are_batched_too(user_api):
+    result, _ = run_plan([lookup(5000), lookup(404)])
+    assert user_api == [(None, {"ids": "404,5000", "limit": 2})]
+    assert "user5000" in result and "User with ID 404 not found" in result
@@ -0,0 +1,48 @@
+import json
+
+from llm_gateway import LLMGateway
+from profiles import SMALL_MODEL, ModelProfile, default_profiles, load_profiles, shared_num_ctx, warmup_profiles
+
+
+def num_ctx_by_model(profiles):
+    seen = {}
+    for profile in profiles.values():
+        seen.setdefault(profile.model, set()).add(profile.num_ctx)
+    return seen
+
+
+def test_defaults_use_one_num_ctx_per_model():
+    assert all(len(sizes) == 1 for sizes in num_ctx_by_model(default_profiles("llama3.2")).values())
+
+
+def test_stages_on_one_model_share_the_largest_num_ctx():
+    profiles = shared_num_ctx({
+        "decide": ModelProfile(model="m", num_ctx=2048),
+        "summarize": ModelProfile(model="m", num_ctx=8192),
+        "compact": ModelProfile(model="m"),
+        "fallback": ModelProfile(model="big", num_ctx=4096),
+    })
+    assert {stage: p.num_ctx for stage, p in profiles.items()} == {
+        "decide": 8192, "summarize": 8192, "compact": 8192, "fallback": 4096}
+
+
+def test_overrides_moving_a_stage_onto_another_model_stay_consistent(tmp_path, monkeypatch):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps({"summarize": {"model": SMALL_MODEL, "num_ctx": 16384}}))
+    monkeypatch.delenv("AGENT_DECIDE_MODEL", raising=False)
+    profiles = load_profiles("llama3.2", str(path))
+    assert profiles["decide"].num_ctx == profiles["summarize"].num_ctx == 16384
+    assert all(len(sizes) == 1 for sizes in num_ctx_by_model(profiles).values())
+
+
+def test_warmup_loads_each_model_with_the_stage_context_size():
+    class Client:
+        def __init__(self):
+            self.loads = []
+
+        def generate(self, **request):
+            self.loads.append((request["model"], request.get("options", {}).get("num_ctx")))
+
+    client = Client()
+    LLMGateway(client).warmup(warmup_profiles(default_profiles("llama3.2")))
+    assert sorted(client.loads) == [("llama3.2", 8192), (SMALL_MODEL, 4096)]
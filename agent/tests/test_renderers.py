@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from agent import invalid_url, tool_outcome
+from renderers import SummaryPolicy, render_tool_result
+
+
+@pytest.mark.parametrize("raw, method, rendered", [
+    ('{"user_id": 3, "user_name": "ann"}', "GET", "User #3 ann"),
+    ('{"user_id": 3, "user_name": "ann"}', "POST", "Created user #3 ann"),
+    ('{"city": "Paris", "temperature": 21, "description": "Sunny"}', "GET", "Paris: Sunny, 21°C"),
+    ('{"detail": "User with ID 9 not found"}', "GET", "Error: User with ID 9 not found"),
+    ("FETCH_ERROR: timed out", "GET", "Request failed: timed out"),
+    ("[]", "GET", "No results."),
+])
+def test_known_shapes_skip_the_summarizer(raw, method, rendered):
+    assert render_tool_result(raw, method) == rendered
+
+
+def test_pages_mention_that_more_rows_exist():
+    page = {"items": [{"user_id": 1, "user_name": "ann"}], "next_cursor": "abc", "total_estimate": 40}
+    assert render_tool_result(json.dumps(page)) == "1 user:\n- #1 ann\n(first 1 of about 40)"
+
+
+def test_unknown_or_oversized_payloads_go_to_the_llm():
+    rows = [{"user_id": n, "user_name": f"user{n}"} for n in range(30)]
+    assert render_tool_result('{"temp": 3}') is None
+    assert render_tool_result(json.dumps(rows)) is None
+    assert render_tool_result('{"user_id": 3, "user_name": "ann"}', policy=SummaryPolicy(enabled=False)) is None
+
+
+def test_tool_outcome_renders_known_shapes_and_summarizes_the_rest():
+    lookup = {"action": "manage_users", "method": "DELETE", "user_id": 3}
+    assert tool_outcome(lookup, "") == ("Deleted user 3.", False)
+    page = {"action": "fetch_url", "url": "http://example.com"}
+    assert tool_outcome(page, "<p>some page</p>") == ("<p>some page</p>", True)
+
+
+@pytest.mark.parametrize("url", [None, "ftp://example.com", "example.com"])
+def test_invalid_urls_are_not_fetched(url):
+    assert invalid_url({"action": "fetch_url", "url": url}) == f"Invalid URL: {url}"
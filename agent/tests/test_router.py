@@ -0,0 +1,91 @@
+import pytest
+
+from router import IntentRouter, looks_like_city, split_places
+
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize("message, cities", [
+    ("weather in London", ["London"]),
+    ("What's the weather like in New York?", ["New York"]),
+    ("temperature for st. louis", ["st. louis"]),
+    ("weather in London, Paris and Tokyo", ["London", "Paris", "Tokyo"]),
+    ("weather in London & Paris", ["London", "Paris"]),
+    ("paris weather", ["paris"]),
+])
+def test_weather_dispatched(router, message, cities):
+    plan = router.route(message)
+    assert [d["city"] for d in plan] == cities
+    assert all(d["action"] == "get_weather" for d in plan)
+
+
+@pytest.mark.parametrize("message", [
+    "weather in paris tomorrow",
+    "weather in london this weekend",
+    "weather for users",
+    "Weather in Rome and the list of users please",
+    "What is the weather in London, and is it raining",
+    "weather in rio de janeiro brazil south america",
+    "should i bring an umbrella weather",
+    "what is the weather in paris or is it raining in rome",
+    "weather in Paris and London",
+    "weather in Bosnia and Herzegovina",
+    "weather at home",
+    "what's the weather like here",
+    "weather for work",
+])
+def test_weather_near_misses_fall_back_to_llm(router, message):
+    assert router.route(message) == []
+    assert router.stats["llm_fallback"] == 1
+
+
+def test_near_miss_is_counted_as_matched_not_dispatched(router):
+    router.route("weather in paris tomorrow")
+    assert router.stats["routes"]["weather"] == {"matched": 1, "dispatched": 0}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("London", True),
+    ("san luis obispo", True),
+    ("l'aquila", True),
+    ("paris tomorrow", False),
+    ("users", False),
+    ("the list of users please", False),
+    ("is it raining", False),
+    ("a b c d", False),
+    ("paris 2", False),
+    ("Paris and London", False),
+    ("home", False),
+])
+def test_looks_like_city(text, expected):
+    assert looks_like_city(text) is expected
+
+
+def test_split_places():
+    assert split_places("London, Paris and Tokyo") == ["London", "Paris", "Tokyo"]
+    assert split_places("Trinidad and Tobago") is None
+    assert split_places("Paris and London") is None
+    assert split_places("London, and is it raining") is None
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("list users", {"action": "manage_users", "method": "GET"}),
+    ("get user #12", {"action": "manage_users", "method": "GET", "user_id": 12}),
+    ("delete user 3", {"action": "manage_users", "method": "DELETE", "user_id": 3}),
+    ("rename user 3 to bob", {"action": "manage_users", "method": "PUT", "user_id": 3, "data": {"user_name": "bob"}}),
+    ("create user bob.", {"action": "manage_users", "method": "POST", "data": {"user_name": "bob"}}),
+    ("add user named Bob!", {"action": "manage_users", "method": "POST", "data": {"user_name": "Bob"}}),
+    ("create a new user called ann?", {"action": "manage_users", "method": "POST", "data": {"user_name": "ann"}}),
+    ("rename user 2 to alice.", {"action": "manage_users", "method": "PUT", "user_id": 2, "data": {"user_name": "alice"}}),
+])
+def test_user_rules(router, message, expected):
+    plan = router.route(message)
+    assert len(plan) == 1
+    assert {k: plan[0].get(k) for k in expected} == expected
+
+
+def test_unrelated_message_goes_to_llm(router):
+    assert router.route("tell me a joke") == []
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from memory import MemoryStore
+from server import AgentServer, SessionBusyError
+
+
+class FakeLLM:
+    class metrics:
+        @staticmethod
+        def snapshot():
+            return {}
+
+    async def warmup(self, profiles):
+        pass
+
+
+class FakeAgent:
+    """Streams the message back word by word, or endlessly for "forever"."""
+
+    def __init__(self):
+        self.llm = FakeLLM()
+        self.profiles = {}
+        self.memories = MemoryStore()
+        self.closed_streams = 0
+
+    async def chat_stream(self, message, session_id):
+        try:
+            if message == "forever":
+                while True:
+                    yield "."
+                    await asyncio.sleep(0)
+            for word in message.split():
+                yield word + " "
+        finally:
+            self.closed_streams += 1
+
+    def forget(self, session_id):
+        self.memories.forget(session_id)
+
+    async def aclose(self):
+        pass
+
+
+def run_with_server(scenario, **kwargs):
+    async def main():
+        agent_server = AgentServer(FakeAgent(), **kwargs)
+        await agent_server.start()
+        try:
+            return await scenario(agent_server)
+        finally:
+            await agent_server.stop()
+    return asyncio.run(main())
+
+
+def test_second_turn_in_a_busy_session_is_rejected():
+    async def scenario(agent_server):
+        session = agent_server.session()
+        first = agent_server.turn(session, "forever")
+        await anext(first)
+        with pytest.raises(SessionBusyError):
+            await anext(agent_server.turn(session, "hello"))
+        await first.aclose()
+        return [token async for token in agent_server.turn(session, "hello again")]
+
+    assert run_with_server(scenario, workers=1) == ["hello ", "again "]
+
+
+def test_abandoned_turn_frees_its_worker():
+    async def scenario(agent_server):
+        session = agent_server.session()
+        tokens = agent_server.turn(session, "forever")
+        await anext(tokens)
+        await tokens.aclose()
+        for _ in range(100):
+            if agent_server.active == 0:
+                break
+            await asyncio.sleep(0.01)
+        return agent_server.active, agent_server.agent.closed_streams
+
+    assert run_with_server(scenario, workers=1) == (0, 1)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "AsyncChat", lambda **kwargs: FakeAgent())
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+def test_chat_route_replies_in_one_body(client):
+    reply = client.post("/chat", json={"message": "hi there"}).json()
+    assert reply["reply"] == "hi there "
+    assert reply["session_id"] in server.server.sessions
+
+
+def test_websocket_reports_malformed_frames_and_keeps_going(client):
+    with client.websocket_connect("/ws") as socket:
+        assert socket.receive_json()["type"] == "session"
+        socket.send_text("not json")
+        assert socket.receive_json() == {"type": "error", "detail": "frames must be JSON"}
+        socket.send_json({"message": "still here"})
+        frames = [socket.receive_json() for _ in range(3)]
+        assert [f.get("data") for f in frames[:2]] == ["still ", "here "]
+        assert frames[2] == {"type": "done"}
@@ -0,0 +1,27 @@
+from agent import plan_from_message
+
+
+def call(name, **arguments):
+    return {"function": {"name": name, "arguments": arguments}}
+
+
+def test_native_tool_calls_become_a_plan():
+    message = {"content": "", "tool_calls": [call("get_weather", city="Paris"), call("manage_users", method="GET", user_id=3)]}
+    assert plan_from_message(message) == [
+        {"action": "get_weather", "city": "Paris"},
+        {"action": "manage_users", "method": "GET", "user_id": 3},
+    ]
+
+
+def test_one_invalid_call_rejects_the_whole_plan():
+    message = {"content": "", "tool_calls": [call("get_weather", city="Paris"), call("get_weather")]}
+    assert plan_from_message(message) == []
+
+
+def test_json_in_the_text_is_still_accepted():
+    message = {"content": 'Sure: {"actions": [{"action": "get_weather", "city": "Oslo"}]}'}
+    assert plan_from_message(message) == [{"action": "get_weather", "city": "Oslo"}]
+
+
+def test_plain_text_is_not_a_plan():
+    assert plan_from_message({"content": "Hello! How can I help?"}) == []
@@ -0,0 +1,219 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Spans waiting for the exporter; beyond this they are dropped rather than block a turn
+MAX_PENDING_SPANS = 10000
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Tool and agent replies that report a failure instead of a result
+ERROR_PREFIXES = ("Error", "FETCH_ERROR", "LLM connection error", "Agent error", "Invalid URL", "Unsupported HTTP method")
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def looks_like_error(text) -> bool:
+    return isinstance(text, str) and text.startswith(ERROR_PREFIXES)
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attrs: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.attrs = attrs or {}
+        self.start = time.time()
+        self._started = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, duration: float) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(duration * 1000, 3),
+            **self.attrs,
+        }
+
+
+class StageAggregates:
+    """Per-stage histograms and counters behind the Prometheus text endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: dict[str, dict] = {}
+        self.dropped = 0
+
+    def add(self, span: dict):
+        seconds = span["duration_ms"] / 1000
+        with self._lock:
+            stage = self._stages.setdefault(span["name"], {
+                "buckets": [0] * len(DURATION_BUCKETS), "count": 0, "sum": 0.0, "errors": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "bytes_in": 0, "bytes_out": 0,
+            })
+            stage["count"] += 1
+            stage["sum"] += seconds
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    stage["buckets"][i] += 1
+            stage["errors"] += int(bool(span.get("error")))
+            for key in ("prompt_tokens", "completion_tokens", "bytes_in", "bytes_out"):
+                stage[key] += span.get(key) or 0
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            stages = sorted(self._stages.items())
+            lines = [
+                "# HELP agent_stage_duration_seconds Time spent in each agent pipeline stage",
+                "# TYPE agent_stage_duration_seconds histogram",
+            ]
+            for name, stage in stages:
+                for bound, count in zip(DURATION_BUCKETS, stage["buckets"]):
+                    lines.append(f'agent_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'agent_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stage["count"]}')
+                lines.append(f'agent_stage_duration_seconds_sum{{stage="{name}"}} {stage["sum"]:.6f}')
+                lines.append(f'agent_stage_duration_seconds_count{{stage="{name}"}} {stage["count"]}')
+            lines += ["# HELP agent_stage_errors_total Failed stage executions", "# TYPE agent_stage_errors_total counter"]
+            lines += [f'agent_stage_errors_total{{stage="{name}"}} {stage["errors"]}' for name, stage in stages]
+            lines += ["# HELP agent_llm_tokens_total LLM tokens by stage", "# TYPE agent_llm_tokens_total counter"]
+            for name, stage in stages:
+                if stage["prompt_tokens"] or stage["completion_tokens"]:
+                    lines.append(f'agent_llm_tokens_total{{stage="{name}",type="prompt"}} {stage["prompt_tokens"]}')
+                    lines.append(f'agent_llm_tokens_total{{stage="{name}",type="completion"}} {stage["completion_tokens"]}')
+            lines += ["# HELP agent_stage_bytes_total Payload bytes in and out of each stage", "# TYPE agent_stage_bytes_total counter"]
+            for name, stage in stages:
+                lines.append(f'agent_stage_bytes_total{{stage="{name}",direction="in"}} {stage["bytes_in"]}')
+                lines.append(f'agent_stage_bytes_total{{stage="{name}",direction="out"}} {stage["bytes_out"]}')
+            lines += ["# HELP agent_trace_spans_dropped_total Spans dropped because the exporter fell behind",
+                      "# TYPE agent_trace_spans_dropped_total counter",
+                      f"agent_trace_spans_dropped_total {self.dropped}"]
+            return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    """
+    Structured spans for the agent pipeline. Finishing a span only puts a dict on a queue;
+    a background thread appends it to the JSONL file (when a path is set) and folds it
+    into the per-stage aggregates, so tracing never does I/O on the request path.
+    The current span lives in a context variable, so nesting works across asyncio tasks;
+    worker threads need bind() to inherit it.
+    """
+
+    def __init__(self, path: str = None, max_pending: int = MAX_PENDING_SPANS):
+        self.path = path
+        self.aggregates = StageAggregates()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._export, name="trace-exporter", daemon=True)
+                    self._worker.start()
+
+    def _export(self):
+        sink = open(self.path, "a", encoding="utf-8") if self.path else None
+        while True:
+            span = self._queue.get()
+            try:
+                self.aggregates.add(span)
+                if sink is not None:
+                    sink.write(json.dumps(span, default=str) + "\n")
+                    if self._queue.empty():
+                        sink.flush()
+            except Exception as e:
+                logging.error(f"Trace export failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def emit(self, span: dict):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.aggregates.dropped += 1
+
+    @contextmanager
+    def span(self, name: str, root: bool = False, **attrs):
+        """Time a block as a child of the current span (or as a new trace with root=True)."""
+        parent = None if root else _current.get()
+        span = Span(name, parent.trace_id if parent else _new_id(), parent.span_id if parent else None, attrs)
+        _current.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.set(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            # set() rather than reset(): generators may finish in a different context than they started
+            _current.set(parent)
+            self.emit(span.to_dict(time.perf_counter() - span._started))
+
+    def record(self, name: str, duration: float, **attrs):
+        """Emit an already-timed stage as a child of the current span."""
+        parent = _current.get()
+        span = Span(name, parent.trace_id if parent else _new_id(), parent.span_id if parent else None, attrs)
+        span.start -= duration
+        self.emit(span.to_dict(duration))
+
+    @staticmethod
+    def bind(fn):
+        """Wrap fn to run in a copy of the caller's context, e.g. before handing it to a thread pool."""
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+    def flush(self, timeout: float = 2.0):
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def prometheus_text(self) -> str:
+        return self.aggregates.prometheus_text()
+
+    def serve_metrics(self, port: int, host: str = "127.0.0.1"):
+        """Expose prometheus_text() on http://host:port/metrics from a daemon thread."""
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Metrics endpoint on http://{host}:{port}/metrics")
+        return httpd
+
+
+# Process-wide tracer; AGENT_TRACE_FILE enables the JSONL sink
+tracer = Tracer(path=os.environ.get("AGENT_TRACE_FILE"))
+atexit.register(tracer.flush)
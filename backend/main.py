@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes import user_routes, inventory_routes, random_routes
@@ -7,12 +8,18 @@ from routes.backup_routes import router as backup_router
 from storage.db import initialize_database
 from routes.weather_routes import router as weather_router
 from services.backup_scheduler import lifespan_with_backup
+from services.weather_prefetcher import lifespan_with_prefetch
+
+@asynccontextmanager
+async def lifespan(app):
+    async with lifespan_with_backup(app), lifespan_with_prefetch(app):
+        yield
 
 app = FastAPI(
     title="Full CRUD + Weather API with Auto-Backup",
     description="FastAPI application with automatic database backups every 5 minutes",
     version="1.0.2",
-    lifespan=lifespan_with_backup
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -1,18 +1,47 @@
-from fastapi import APIRouter, HTTPException
-from services.db_service import get_table_data, list_tables
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from services.db_service import get_table_data, list_tables, table_query, export_ndjson, export_csv
 
 router = APIRouter(prefix="/db", tags=["Database"])
 
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
 @router.get("/")
 def get_all_tables():
 
     tables = list_tables()
     return {"tables": tables}
 
+def _export_format(request: Request, format: Optional[str]) -> str:
+    if format:
+        return format
+    accept = request.headers.get("accept", "")
+    for name, media_type in EXPORT_MEDIA_TYPES.items():
+        if media_type in accept:
+            return name
+    return "json"
+
 @router.get("/{table_name}")
-def get_table_rows(table_name: str):
+def get_table_rows(
+    table_name: str,
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson|csv)$", description="Defaults from Accept; ndjson and csv are streamed"),
+    columns: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    min_rowid: Optional[int] = Query(None, description="First rowid to include"),
+    max_rowid: Optional[int] = Query(None, description="Last rowid to include"),
+):
+    selected = [name.strip() for name in columns.split(",") if name.strip()] if columns else None
+    export = _export_format(request, format)
+    if export in EXPORT_MEDIA_TYPES:
+        # Built up front so an unknown table or column is a 404/400, not a broken stream
+        query = table_query(table_name, selected, min_rowid, max_rowid)
+        body = export_ndjson(query) if export == "ndjson" else export_csv(query)
+        headers = {"Content-Disposition": f'attachment; filename="{table_name}.csv"'} if export == "csv" else None
+        return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[export], headers=headers)
+
     try:
-        rows = get_table_data(table_name)
+        rows = get_table_data(table_name, selected, min_rowid, max_rowid)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     return {"table": table_name, "rows": rows}
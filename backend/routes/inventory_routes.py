@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
 from sqlalchemy.orm import Session
 from services.inventory_service import create_item, list_items, update_item, delete_item
-from storage.db import get_db
-from schemas import InventoryCreate, InventoryUpdate, InventoryOut
+from storage.db import get_db, get_read_db
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from schemas import InventoryCreate, InventoryUpdate, InventoryOut, InventoryPage
 
 router = APIRouter(prefix="/inventory", tags=["Inventory"])
 
@@ -11,10 +13,15 @@ def create_item_route(item: InventoryCreate, db: Session = Depends(get_db)):
     """Create a new inventory item"""
     return create_item(db, item.item_name, item.quantity)
 
-@router.get("/", response_model=list[InventoryOut])
-def list_items_route(db: Session = Depends(get_db)):
-    """List all inventory items"""
-    return list_items(db)
+@router.get("/", response_model=InventoryPage)
+def list_items_route(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    after: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    name_prefix: Optional[str] = Query(None, min_length=1, max_length=100, description="Case-sensitive name prefix"),
+    db: Session = Depends(get_read_db)
+):
+    """List inventory items, one page at a time in ID order"""
+    return list_items(db, limit, after, name_prefix)
 
 @router.put("/{item_id}", response_model=InventoryOut)
 def update_item_route(
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
 from sqlalchemy.orm import Session
 from services.user_service import create_user, get_user, list_users, update_user, delete_user
-from storage.db import get_db
-from schemas import UserCreate, UserUpdate, UserOut
+from storage.db import get_db, get_read_db
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from schemas import UserCreate, UserUpdate, UserOut, UserPage
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -14,7 +16,7 @@ def create_user_route(user: UserCreate, db: Session = Depends(get_db)):
 @router.get("/{user_id}", response_model=UserOut)
 def get_user_route(
     user_id: int = Path(..., gt=0, description="User ID must be positive"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get a specific user by ID"""
     user = get_user(db, user_id)
@@ -22,10 +24,19 @@ def get_user_route(
         raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found")
     return user
 
-@router.get("/", response_model=list[UserOut])
-def list_users_route(db: Session = Depends(get_db)):
-    """List all users"""
-    return list_users(db)
+@router.get("/", response_model=UserPage)
+def list_users_route(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    after: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    name_prefix: Optional[str] = Query(None, min_length=1, max_length=100, description="Case-sensitive name prefix"),
+    ids: Optional[str] = Query(None, pattern=r"^\d+(,\d+)*$", description="Comma-separated user IDs to return"),
+    db: Session = Depends(get_read_db)
+):
+    """List users, one page at a time in ID order"""
+    user_ids = [int(user_id) for user_id in ids.split(",")] if ids else None
+    if user_ids and len(user_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} ids per request")
+    return list_users(db, limit, after, name_prefix, user_ids)
 
 @router.put("/{user_id}", response_model=UserOut)
 def update_user_route(
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Path
-from services.weather_service import get_weather
-from schemas import WeatherOut
+from fastapi.responses import StreamingResponse
+from services.weather_service import get_weather, get_weather_batch, iter_weather_batch, weather_cache_stats
+from schemas import WeatherOut, WeatherBatchIn, WeatherBatchOut
 
 router = APIRouter(prefix="/weather", tags=["Weather"])
 
@@ -11,4 +12,31 @@ async def weather_by_city(
     """
     Get current weather information for a specified city
     """
-    return get_weather(city)
\ No newline at end of file
+    return await get_weather(city)
+
+@router.post("/cities", response_model=WeatherBatchOut)
+async def weather_by_cities(body: WeatherBatchIn):
+    """
+    Get weather for many cities at once; cities that fail carry their own error
+    """
+    results = await get_weather_batch(body.cities)
+    succeeded = sum(1 for item in results if item.weather is not None)
+    return WeatherBatchOut(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+@router.post("/cities/stream")
+async def weather_by_cities_stream(body: WeatherBatchIn):
+    """
+    Same as /weather/cities, streamed as NDJSON in completion order (use `index` to place results)
+    """
+    async def lines():
+        async for item in iter_weather_batch(body.cities):
+            yield item.model_dump_json(exclude_none=True) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/cache/stats")
+async def weather_cache_statistics():
+    """
+    Hit, miss, coalesced and stale counters of the weather cache
+    """
+    return weather_cache_stats()
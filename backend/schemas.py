@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator, ConfigDict
-from typing import Optional
+from typing import List, Optional
 
 # User Schemas
 class UserCreate(BaseModel):
@@ -28,6 +28,11 @@ class UserOut(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
+class UserPage(BaseModel):
+    items: List[UserOut]
+    next_cursor: Optional[str] = Field(default=None, description="Pass as `after` for the next page; null on the last page")
+    total_estimate: int = Field(..., ge=0, description="Matching rows, refreshed at most every few seconds")
+
 # Inventory Schemas
 class InventoryCreate(BaseModel):
     item_name: str = Field(..., min_length=1, max_length=200, description="Item name must be 1-200 characters")
@@ -58,12 +63,40 @@ class InventoryOut(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
+class InventoryPage(BaseModel):
+    items: List[InventoryOut]
+    next_cursor: Optional[str] = Field(default=None, description="Pass as `after` for the next page; null on the last page")
+    total_estimate: int = Field(..., ge=0, description="Matching rows, refreshed at most every few seconds")
+
 # Weather Schemas
 class WeatherOut(BaseModel):
     city: str = Field(..., min_length=1, description="City name is required")
     temperature: float = Field(..., description="Temperature in Celsius")
     description: str = Field(..., min_length=1, description="Weather description")
 
+class WeatherBatchIn(BaseModel):
+    cities: List[str] = Field(..., min_length=1, max_length=100, description="1-100 city names")
+
+    @field_validator('cities')
+    @classmethod
+    def validate_cities(cls, v: List[str]) -> List[str]:
+        cities = [city.strip() for city in v]
+        if any(not city or len(city) > 100 for city in cities):
+            raise ValueError('City names must be 1-100 characters')
+        return cities
+
+class WeatherBatchItem(BaseModel):
+    index: int = Field(..., ge=0, description="Position of the city in the request")
+    city: str
+    weather: Optional[WeatherOut] = None
+    status_code: int = Field(..., description="HTTP status this city would have returned on its own")
+    error: Optional[str] = None
+
+class WeatherBatchOut(BaseModel):
+    results: List[WeatherBatchItem]
+    succeeded: int = Field(..., ge=0)
+    failed: int = Field(..., ge=0)
+
 # Random Number Schema
 class RandomNumberOut(BaseModel):
     number: int = Field(..., ge=0, le=100, description="Random number between 0 and 100")
@@ -1,16 +1,30 @@
-import shutil
 import os
 import sqlite3
 from datetime import datetime
 from pathlib import Path
 import logging
+from storage.db import DB_FILE
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-DB_FILE = "storage/app.db"
-BACKUP_DB_FILE = "storage/app_backup.db"
-BACKUP_FOLDER = "storage/backups"
+# Backups live next to the main database
+BACKUP_DB_FILE = os.path.join(os.path.dirname(DB_FILE), "app_backup.db")
+BACKUP_FOLDER = os.path.join(os.path.dirname(DB_FILE), "backups")
+
+def copy_database(source: str, target: str):
+    """
+    Copy through SQLite's online backup API rather than the file: in WAL mode recent
+    commits live in the -wal file until a checkpoint, so a plain file copy misses them,
+    and overwriting a live database file under its -wal can corrupt it.
+    """
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
 
 def ensure_backup_folder():
     Path(BACKUP_FOLDER).mkdir(parents=True, exist_ok=True)
@@ -24,7 +38,7 @@ def create_backup_database():
         os.makedirs(os.path.dirname(BACKUP_DB_FILE), exist_ok=True)
         
         if not os.path.exists(BACKUP_DB_FILE):
-            shutil.copy2(DB_FILE, BACKUP_DB_FILE)
+            copy_database(DB_FILE, BACKUP_DB_FILE)
             logger.info(f"Backup database created at {BACKUP_DB_FILE}")
         
         return True
@@ -40,7 +54,7 @@ def backup_to_secondary_db():
         
         create_backup_database()
         
-        shutil.copy2(DB_FILE, BACKUP_DB_FILE)
+        copy_database(DB_FILE, BACKUP_DB_FILE)
         logger.info(f"Database backed up to {BACKUP_DB_FILE}")
         return True
     except Exception as e:
@@ -58,7 +72,7 @@ def backup_to_timestamped_file():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_file = os.path.join(BACKUP_FOLDER, f"app_backup_{timestamp}.db")
         
-        shutil.copy2(DB_FILE, backup_file)
+        copy_database(DB_FILE, backup_file)
         logger.info(f"Timestamped backup created: {backup_file}")
         
         cleanup_old_backups(keep_count=50)
@@ -91,10 +105,10 @@ def restore_from_backup():
         
         if os.path.exists(DB_FILE):
             safety_backup = f"{DB_FILE}.before_restore"
-            shutil.copy2(DB_FILE, safety_backup)
+            copy_database(DB_FILE, safety_backup)
             logger.info(f"Safety backup created at {safety_backup}")
         
-        shutil.copy2(BACKUP_DB_FILE, DB_FILE)
+        copy_database(BACKUP_DB_FILE, DB_FILE)
         logger.info(f"Database restored from {BACKUP_DB_FILE}")
         return True
     except Exception as e:
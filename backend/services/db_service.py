@@ -1,52 +1,98 @@
-import os
-from typing import List, Dict
-from sqlalchemy import create_engine, Table, MetaData, select, inspect
-from sqlalchemy.orm import sessionmaker
+import csv
+import io
+import json
+from typing import Iterator, List, Dict, Optional
+from sqlalchemy import Table, MetaData, column, select, inspect
 from fastapi import HTTPException
-
-DB_FILE = "storage/app.db"
-os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
-
-DATABASE_URL = f"sqlite:///{DB_FILE}"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+from storage.db import read_engine, ReadSessionLocal
 
 metadata = MetaData()
 
-def get_db():
-    """Database session generator for dependency injection"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Rows fetched from SQLite per round trip when streaming an export
+EXPORT_CHUNK_ROWS = 1000
 
-def get_table_data(table_name: str) -> List[Dict]:
-    """Retrieve all rows from a specified table"""
+def _reflect_table(table_name: str) -> Table:
     try:
-        table = Table(table_name, metadata, autoload_with=engine)
+        return Table(table_name, metadata, autoload_with=read_engine)
     except Exception as e:
         raise HTTPException(
             status_code=404, 
             detail=f"Table '{table_name}' not found: {str(e)}"
         )
 
-    db = SessionLocal()
+def table_query(table_name: str, columns: Optional[List[str]] = None,
+                min_rowid: Optional[int] = None, max_rowid: Optional[int] = None):
+    """SELECT of the requested columns (all by default), limited to a rowid range and in rowid order"""
+    table = _reflect_table(table_name)
+    if columns:
+        unknown = [name for name in columns if name not in table.c]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown columns for '{table_name}': {', '.join(unknown)}")
+        query = select(*(table.c[name] for name in columns))
+    else:
+        query = select(table)
+    rowid = column("rowid")
+    if min_rowid is not None:
+        query = query.where(rowid >= min_rowid)
+    if max_rowid is not None:
+        query = query.where(rowid <= max_rowid)
+    if min_rowid is not None or max_rowid is not None:
+        query = query.order_by(rowid)
+    return query
+
+def get_table_data(table_name: str, columns: Optional[List[str]] = None,
+                   min_rowid: Optional[int] = None, max_rowid: Optional[int] = None) -> List[Dict]:
+    """Retrieve all rows from a specified table"""
+    query = table_query(table_name, columns, min_rowid, max_rowid)
+
+    db = ReadSessionLocal()
     try:
-        result = db.execute(select(table))
+        result = db.execute(query)
         return [dict(row._mapping) for row in result.fetchall()]
     finally:
         db.close()
 
+def iter_table_chunks(query, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[tuple[List[str], list]]:
+    """
+    Run `query` on a read-only connection and yield (column names, rows) chunk by chunk,
+    so only one chunk is held in memory however large the table is.
+    """
+    with read_engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_rows).execute(query)
+        names = list(result.keys())
+        for rows in result.partitions():
+            yield names, rows
+
+def export_ndjson(query) -> Iterator[str]:
+    """One JSON object per row; values SQLite returns that JSON cannot hold (blobs) become strings"""
+    for names, rows in iter_table_chunks(query):
+        yield "".join(json.dumps(dict(zip(names, row)), default=str) + "\n" for row in rows)
+
+def export_csv(query) -> Iterator[str]:
+    """Header line, then the rows"""
+    header_written = False
+    for names, rows in iter_table_chunks(query):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not header_written:
+            writer.writerow(names)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue()
+    if not header_written:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow([c.name for c in query.selected_columns])
+        yield buffer.getvalue()
+
 def list_tables() -> List[str]:
     """List all tables in the database"""
-    inspector = inspect(engine)
+    inspector = inspect(read_engine)
     return inspector.get_table_names()
 
 def check_database_health() -> bool:
     """Check if database is accessible and responsive"""
     try:
-        db = SessionLocal()
+        db = ReadSessionLocal()
         db.execute(select(1))
         db.close()
         return True
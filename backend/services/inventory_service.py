@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from storage.models import Inventory
 from typing import Optional
+from services.pagination import DEFAULT_PAGE_SIZE, invalidate_counts, keyset_page, with_prefix
 
 def create_item(db: Session, item_name: str, quantity: int = 0) -> Inventory:
     """Create a new inventory item"""
@@ -10,14 +11,17 @@ def create_item(db: Session, item_name: str, quantity: int = 0) -> Inventory:
         db.add(item)
         db.commit()
         db.refresh(item)
+        invalidate_counts("inventory")
         return item
     except SQLAlchemyError as e:
         db.rollback()
         raise Exception(f"Database error creating item: {str(e)}")
 
-def list_items(db: Session) -> list[Inventory]:
-    """List all inventory items"""
-    return db.query(Inventory).all()
+def list_items(db: Session, limit: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None,
+               name_prefix: Optional[str] = None) -> dict:
+    """List one page of inventory items ordered by ID, optionally only names starting with name_prefix"""
+    query = with_prefix(db.query(Inventory), Inventory.item_name, name_prefix)
+    return keyset_page(query, Inventory.item_id, limit, after, ("inventory", name_prefix))
 
 def update_item(db: Session, item_id: int, item_name: str, quantity: int) -> Optional[Inventory]:
     """Update an inventory item"""
@@ -40,6 +44,7 @@ def delete_item(db: Session, item_id: int) -> Optional[dict]:
         if item:
             db.delete(item)
             db.commit()
+            invalidate_counts("inventory")
             return {"detail": "Item deleted"}
         return None
     except SQLAlchemyError as e:
@@ -0,0 +1,75 @@
+import base64
+import binascii
+import os
+import threading
+import time
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Row counts are cached this long, so paging does not COUNT(*) the table on every call
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "30"))
+
+_counts: dict[tuple, tuple[int, float]] = {}
+_counts_lock = threading.Lock()
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"k1:{last_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """Primary key to continue after; 400 on anything that did not come from encode_cursor"""
+    try:
+        text = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        version, _, last_id = text.partition(":")
+        if version != "k1":
+            raise ValueError(version)
+        return int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def with_prefix(query: Query, column, prefix: Optional[str]) -> Query:
+    """
+    Case-sensitive name prefix as a range (name >= prefix AND name < prefix + U+10FFFF),
+    which SQLite answers from a plain index on the column, unlike LIKE.
+    """
+    if not prefix:
+        return query
+    return query.filter(column >= prefix, column < prefix + "\U0010ffff")
+
+def count_estimate(query: Query, key: tuple) -> int:
+    """Row count of `query`, at most COUNT_CACHE_TTL seconds old"""
+    now = time.monotonic()
+    with _counts_lock:
+        cached = _counts.get(key)
+        if cached is not None and now - cached[1] < COUNT_CACHE_TTL:
+            return cached[0]
+    total = query.order_by(None).count()
+    with _counts_lock:
+        _counts[key] = (total, now)
+        if len(_counts) > 1000:
+            _counts.clear()
+    return total
+
+def invalidate_counts(table: str):
+    """Drop cached counts for a table after rows were added or removed"""
+    with _counts_lock:
+        for key in [key for key in _counts if key[0] == table]:
+            del _counts[key]
+
+def keyset_page(query: Query, key_column, limit: int, after: Optional[str], count_key: tuple) -> dict:
+    """
+    One page ordered by primary key: rows with key > the cursor, limit + 1 fetched to
+    know whether another page follows. Cost depends on the page size, not the table size.
+    """
+    page_query = query
+    if after:
+        page_query = page_query.filter(key_column > decode_cursor(after))
+    rows = page_query.order_by(key_column).limit(limit + 1).all()
+    next_cursor = encode_cursor(getattr(rows[limit - 1], key_column.key)) if len(rows) > limit else None
+    return {
+        "items": rows[:limit],
+        "next_cursor": next_cursor,
+        "total_estimate": count_estimate(query, count_key),
+    }
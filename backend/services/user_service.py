@@ -1,7 +1,8 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from storage.models import User
-from typing import Optional
+from typing import List, Optional
+from services.pagination import DEFAULT_PAGE_SIZE, invalidate_counts, keyset_page, with_prefix
 
 def create_user(db: Session, user_name: str) -> User:
     """Create a new user"""
@@ -10,6 +11,7 @@ def create_user(db: Session, user_name: str) -> User:
         db.add(user)
         db.commit()
         db.refresh(user)
+        invalidate_counts("users")
         return user
     except SQLAlchemyError as e:
         db.rollback()
@@ -19,9 +21,16 @@ def get_user(db: Session, user_id: int) -> Optional[User]:
     """Get a user by ID"""
     return db.query(User).filter(User.user_id == user_id).first()
 
-def list_users(db: Session) -> list[User]:
-    """List all users"""
-    return db.query(User).all()
+def list_users(db: Session, limit: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None,
+               name_prefix: Optional[str] = None, ids: Optional[List[int]] = None) -> dict:
+    """
+    List one page of users ordered by ID, optionally only names starting with name_prefix
+    and only the given IDs (looked up by primary key, so several users cost one query)
+    """
+    query = with_prefix(db.query(User), User.user_name, name_prefix)
+    if ids:
+        query = query.filter(User.user_id.in_(ids))
+    return keyset_page(query, User.user_id, limit, after, ("users", name_prefix, tuple(sorted(set(ids or ())))))
 
 def update_user(db: Session, user_id: int, user_name: str) -> Optional[User]:
     """Update a user's information"""
@@ -43,6 +52,7 @@ def delete_user(db: Session, user_id: int) -> Optional[dict]:
         if user:
             db.delete(user)
             db.commit()
+            invalidate_counts("users")
             return {"detail": "User deleted"}
         return None
     except SQLAlchemyError as e:
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from services import weather_service
+
+logger = logging.getLogger(__name__)
+
+# Cities kept warm, how often the refresher wakes up, and how close to expiry it refreshes
+PREFETCH_TOP_K = int(os.getenv("WEATHER_PREFETCH_TOP_K", "20"))
+PREFETCH_INTERVAL = float(os.getenv("WEATHER_PREFETCH_INTERVAL", "30"))
+PREFETCH_AHEAD = float(os.getenv("WEATHER_PREFETCH_AHEAD", "0.8"))
+# Decayed request score a city needs to be kept warm; scores halve every half-life without
+# traffic but never reach zero, so without a floor a single old request is refreshed forever
+PREFETCH_MIN_SCORE = float(os.getenv("WEATHER_PREFETCH_MIN_SCORE", "2"))
+# Upstream calls the refresher may spend per minute (user requests are not counted)
+PREFETCH_PER_MINUTE = float(os.getenv("WEATHER_PREFETCH_PER_MINUTE", "20"))
+
+prefetch_task = None
+
+
+def due_for_refresh(top_k: int = PREFETCH_TOP_K, min_score: float = PREFETCH_MIN_SCORE) -> list[str]:
+    """
+    Popular cities (score at least min_score) whose cached entry is past PREFETCH_AHEAD
+    of its TTL, most popular first. Cities that are not cached at all are left to user
+    requests, so unknown names are not retried in the background.
+    """
+    threshold = weather_service.weather_cache.ttl * PREFETCH_AHEAD
+    due = []
+    for city, score in weather_service.popularity.top(top_k):
+        if score < min_score:
+            break
+        age = weather_service.weather_cache.age(city)
+        if age is not None and age >= threshold:
+            due.append(city)
+    return due
+
+
+async def refresh_popular(budget: int) -> int:
+    """
+    Refresh due cities until `budget` upstream calls are spent; returns the calls made.
+    Joining a lookup already in flight costs nothing.
+    """
+    calls = 0
+    for city in due_for_refresh():
+        if calls >= budget or weather_service.breaker.state == "open":
+            break
+        try:
+            started = await weather_service.weather_cache.refresh(city, weather_service.fetch_weather)
+        except HTTPException as e:
+            logger.warning(f"Prefetch of {city} failed: {e.detail}")
+            started = True
+        calls += started
+    return calls
+
+
+async def periodic_prefetch():
+    logger.info(f"Starting weather prefetch task (top {PREFETCH_TOP_K} cities every {PREFETCH_INTERVAL}s)")
+
+    # Token bucket: refills at PREFETCH_PER_MINUTE, holds at most one minute's worth
+    tokens = 0.0
+    while True:
+        try:
+            await asyncio.sleep(PREFETCH_INTERVAL)
+            tokens = min(tokens + PREFETCH_PER_MINUTE * PREFETCH_INTERVAL / 60, PREFETCH_PER_MINUTE)
+            calls = await refresh_popular(int(tokens))
+            tokens -= calls
+            if calls:
+                logger.info(f"Prefetched weather for {calls} popular cities")
+
+        except asyncio.CancelledError:
+            logger.info("Prefetch task cancelled")
+            break
+        except Exception as e:
+            logger.error(f"Error in weather prefetch: {str(e)}")
+
+@asynccontextmanager
+async def lifespan_with_prefetch(app):
+    global prefetch_task
+
+    prefetch_task = asyncio.create_task(periodic_prefetch())
+
+    yield
+
+    if prefetch_task:
+        prefetch_task.cancel()
+        try:
+            await prefetch_task
+        except asyncio.CancelledError:
+            pass
+    await weather_service.close_client()
+    logger.info("Prefetch task stopped")
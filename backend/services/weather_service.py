@@ -1,35 +1,393 @@
-import requests
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from urllib.parse import quote
+
+import httpx
 from fastapi import HTTPException
-from schemas import WeatherOut
+from schemas import WeatherBatchItem, WeatherOut
+
+logger = logging.getLogger(__name__)
+
+# Upstream weather API; point it at a local stub in tests
+WEATHER_BASE_URL = os.getenv("WEATHER_BASE_URL", "https://wttr.in")
+WEATHER_CONNECT_TIMEOUT = float(os.getenv("WEATHER_CONNECT_TIMEOUT", "2"))
+WEATHER_READ_TIMEOUT = float(os.getenv("WEATHER_READ_TIMEOUT", "5"))
+WEATHER_MAX_CONNECTIONS = int(os.getenv("WEATHER_MAX_CONNECTIONS", "20"))
+# Consecutive upstream failures that open the circuit, and how long it stays open
+WEATHER_BREAKER_THRESHOLD = int(os.getenv("WEATHER_BREAKER_THRESHOLD", "5"))
+WEATHER_BREAKER_RESET = float(os.getenv("WEATHER_BREAKER_RESET", "30"))
+# Upstream lookups one batch request may have in flight at once
+WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "8"))
+
+# Weather barely changes minute to minute; entries are fresh for this long
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+# Expired entries are kept this long to answer when wttr.in is failing
+WEATHER_STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", "21600"))
+# Optional bound on cached cities (least recently used are dropped first)
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "0")) or None
+# Half-life of the per-city request counters that drive prefetching
+WEATHER_POPULARITY_HALF_LIFE = float(os.getenv("WEATHER_POPULARITY_HALF_LIFE", "3600"))
+
+
+def normalize_city(city: str) -> str:
+    """Cache key for a city: case-folded with whitespace collapsed."""
+    return " ".join(city.split()).casefold()
 
-def get_weather(city: str) -> WeatherOut:
+
+class CircuitBreaker:
+    """
+    Fails fast while the upstream is down: after `threshold` consecutive failures the
+    circuit opens for `reset_timeout` seconds, then a single trial call is let through
+    (half-open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, threshold: int = WEATHER_BREAKER_THRESHOLD, reset_timeout: float = WEATHER_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                # Let one trial through; the window restarts in case it never reports back
+                self.opened_at = time.monotonic()
+            return state != "open"
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Weather upstream failing, circuit open for {self.reset_timeout}s")
+                self.opened_at = time.monotonic()
+
+
+class WeatherCache:
+    """
+    TTL cache of WeatherOut per normalized city with single-flight loading: concurrent
+    misses for one city await a single upstream call. When the upstream fails, an
+    expired entry (up to stale_ttl old) is served instead of the error.
+    """
+
+    def __init__(self, ttl: float = WEATHER_CACHE_TTL, stale_ttl: float = WEATHER_STALE_TTL,
+                 max_entries: Optional[int] = WEATHER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[WeatherOut, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "stale": 0, "errors": 0, "evictions": 0,
+                       "prefetched": 0}
+
+    def _store(self, key: str, weather: WeatherOut):
+        self._entries[key] = (weather, time.time())
+        self._entries.move_to_end(key)
+        if self.max_entries:
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    async def get(self, city: str, fetch: Callable[[str], Awaitable[WeatherOut]]) -> WeatherOut:
+        key = normalize_city(city)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0].model_copy(update={"city": city})
+            task, _ = self._flight(key, city, fetch, loop)
+
+        # Shielded: a client going away must not cancel the fetch other callers await
+        weather = await asyncio.shield(task)
+        return weather.model_copy(update={"city": city})
+
+    async def refresh(self, city: str, fetch: Callable[[str], Awaitable[WeatherOut]]) -> bool:
+        """
+        Fetch ahead of expiry, joining a lookup already in flight; not counted as a miss.
+        Returns True when this call went upstream, False when it joined another lookup
+        (whose failure is left to the caller that started it).
+        """
+        key = normalize_city(city)
+        with self._lock:
+            task, started = self._flight(key, city, fetch, asyncio.get_running_loop(), count=False)
+            if started:
+                self._stats["prefetched"] += 1
+        try:
+            await asyncio.shield(task)
+        except HTTPException:
+            if started:
+                raise
+        return started
+
+    def age(self, city: str) -> Optional[float]:
+        """Seconds since the city was last fetched, None when it is not cached"""
+        with self._lock:
+            entry = self._entries.get(normalize_city(city))
+        return None if entry is None else time.time() - entry[1]
+
+    def _flight(self, key: str, city: str, fetch, loop, count: bool = True) -> tuple[asyncio.Task, bool]:
+        # Caller holds self._lock; returns the task and whether it was started here
+        task = self._inflight.get(key)
+        started = task is None or task.get_loop() is not loop
+        if started:
+            if count:
+                self._stats["misses"] += 1
+            task = loop.create_task(self._load(key, city, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        elif count:
+            self._stats["coalesced"] += 1
+        return task, started
+
+    def _finished(self, key: str, task: asyncio.Task):
+        with self._lock:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    async def _load(self, key: str, city: str, fetch: Callable[[str], Awaitable[WeatherOut]]) -> WeatherOut:
+        try:
+            weather = await fetch(city)
+        except HTTPException as e:
+            stale = self._stale(key, e)
+            if stale is None:
+                raise
+            return stale
+        with self._lock:
+            self._store(key, weather)
+        return weather
+
+    def _stale(self, key: str, error: HTTPException) -> Optional[WeatherOut]:
+        with self._lock:
+            self._stats["errors"] += 1
+            entry = self._entries.get(key)
+            # Only upstream failures fall back; "city not found" is a real answer
+            if error.status_code < 500 or entry is None or time.time() - entry[1] > self.ttl + self.stale_ttl:
+                return None
+            self._stats["stale"] += 1
+            return entry[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"] + self._stats["coalesced"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hit_rate": round((self._stats["hits"] + self._stats["coalesced"]) / lookups, 4) if lookups else 0.0,
+                "circuit": breaker.state,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class PopularityTracker:
+    """
+    Exponentially decaying request count per normalized city: a city's score halves every
+    `half_life` seconds without requests, so yesterday's burst does not outrank today's traffic.
+    """
+
+    def __init__(self, half_life: float = WEATHER_POPULARITY_HALF_LIFE, max_cities: int = 1000):
+        self.half_life = half_life
+        self.max_cities = max_cities
+        self._scores: dict[str, tuple[float, float, str]] = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, updated: float, now: float) -> float:
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+    def record(self, city: str):
+        key = normalize_city(city)
+        now = time.time()
+        with self._lock:
+            score, updated, _ = self._scores.get(key, (0.0, now, city))
+            self._scores[key] = (self._decayed(score, updated, now) + 1.0, now, city)
+            if len(self._scores) > self.max_cities:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        ranked = sorted(self._scores, key=lambda k: self._decayed(*self._scores[k][:2], now), reverse=True)
+        for key in ranked[self.max_cities // 2:]:
+            del self._scores[key]
+
+    def top(self, k: int) -> list[tuple[str, float]]:
+        """The k most requested cities as (city, score), highest first"""
+        now = time.time()
+        with self._lock:
+            scored = [(city, self._decayed(score, updated, now)) for score, updated, city in self._scores.values()]
+        return sorted(scored, key=lambda item: item[1], reverse=True)[:k]
+
+
+breaker = CircuitBreaker()
+weather_cache = WeatherCache()
+popularity = PopularityTracker()
+
+
+_client: Optional[httpx.AsyncClient] = None
+# Event loop _client was opened on
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+# Upstream requests in flight across all callers (batches included), sized to the pool so
+# callers queue here instead of timing out waiting for a connection
+_upstream_slots: Optional[asyncio.Semaphore] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """
+    Shared pooled client. Connections belong to the event loop that opened them, so a
+    caller on another loop gets a fresh client and the previous one is closed.
+    """
+    global _client, _client_loop, _upstream_slots
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        if _client is not None and not _client.is_closed:
+            _retire(_client, _client_loop, loop)
+        _client = httpx.AsyncClient(
+            base_url=WEATHER_BASE_URL,
+            timeout=httpx.Timeout(WEATHER_READ_TIMEOUT, connect=WEATHER_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=WEATHER_MAX_CONNECTIONS, max_keepalive_connections=WEATHER_MAX_CONNECTIONS),
+        )
+        _client_loop = loop
+        _upstream_slots = asyncio.Semaphore(WEATHER_MAX_CONNECTIONS)
+    return _client
+
+
+def _retire(client: httpx.AsyncClient, owner: Optional[asyncio.AbstractEventLoop], loop: asyncio.AbstractEventLoop):
+    """Close a client from another loop: on that loop while it runs, else from this one."""
+    if owner is not None and owner.is_running() and not owner.is_closed():
+        asyncio.run_coroutine_threadsafe(_close_quietly(client), owner)
+    else:
+        loop.create_task(_close_quietly(client))
+
+
+async def _close_quietly(client: httpx.AsyncClient):
+    try:
+        await client.aclose()
+    except RuntimeError:
+        # Its loop is already gone; the sockets are closed when the transports are collected
+        pass
+
+
+async def close_client():
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _close_quietly(_client)
+    _client = None
+    _client_loop = None
+
+
+async def fetch_weather(city: str) -> WeatherOut:
     """
     Fetch weather data for a given city from wttr.in API
     """
-    if not city or not city.strip():
-        raise HTTPException(status_code=400, detail="City name cannot be empty")
-    
-    city = city.strip()
-    url = f"https://wttr.in/{city}?format=j1"
-    
+    if not breaker.allow():
+        raise HTTPException(status_code=503, detail="Weather service unavailable: upstream is failing, retry later")
+
     try:
-        response = requests.get(url, timeout=10)
+        client = _get_client()
+        # Quoted as one path segment: "/", "?" or "#" in a city must not change the request
+        async with _upstream_slots:
+            response = await client.get(f"/{quote(city, safe='')}", params={"format": "j1"})
+        if response.status_code >= 500:
+            breaker.failure()
+        elif response.status_code >= 400:
+            # The upstream is up and rejected this city: pass it on, without touching the breaker
+            raise HTTPException(status_code=404 if response.status_code == 404 else 400,
+                                detail=f"Weather data not found for city: {city} (upstream {response.status_code})")
+        else:
+            breaker.success()
         response.raise_for_status()
         data = response.json()
-        
+
         if 'current_condition' not in data or not data['current_condition']:
             raise HTTPException(status_code=404, detail=f"Weather data not found for city: {city}")
-        
+
         current_condition = data['current_condition'][0]
         temp_c = float(current_condition['temp_C'])
         desc = current_condition['weatherDesc'][0]['value']
-        
+
         return WeatherOut(
             city=city,
             temperature=temp_c,
             description=desc
         )
-    except requests.RequestException as e:
+    except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=503, detail=f"Weather service unavailable: {str(e)}")
+    except httpx.PoolTimeout:
+        # Our own connection pool is saturated; wttr.in is not at fault, so the breaker is left alone
+        raise HTTPException(status_code=503, detail="Weather service busy, retry later")
+    except httpx.HTTPError as e:
+        breaker.failure()
+        raise HTTPException(status_code=503, detail=f"Weather service unavailable: {type(e).__name__} {str(e)}")
     except (KeyError, ValueError, IndexError) as e:
-        raise HTTPException(status_code=500, detail=f"Error parsing weather data: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error parsing weather data: {str(e)}")
+
+
+async def get_weather(city: str) -> WeatherOut:
+    """
+    Get weather for a city, served from the TTL cache when fresh
+    """
+    if not city or not city.strip():
+        raise HTTPException(status_code=400, detail="City name cannot be empty")
+
+    popularity.record(city.strip())
+    return await weather_cache.get(city.strip(), fetch_weather)
+
+
+async def _batch_item(index: int, city: str, limit: asyncio.Semaphore) -> WeatherBatchItem:
+    async with limit:
+        try:
+            weather = await get_weather(city)
+        except HTTPException as e:
+            return WeatherBatchItem(index=index, city=city, status_code=e.status_code, error=str(e.detail))
+    return WeatherBatchItem(index=index, city=city, weather=weather, status_code=200)
+
+
+async def iter_weather_batch(cities: list[str], concurrency: int = WEATHER_BATCH_CONCURRENCY) -> AsyncIterator[WeatherBatchItem]:
+    """
+    Look up many cities concurrently (at most `concurrency` at a time) and yield each
+    result as soon as it is ready. Failures are yielded as items with an error instead
+    of failing the batch; duplicate cities share one upstream call through the cache.
+    """
+    limit = asyncio.Semaphore(max(concurrency, 1))
+    tasks = [asyncio.create_task(_batch_item(index, city, limit)) for index, city in enumerate(cities)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The client went away mid-stream: stop the lookups nobody will read
+        for task in tasks:
+            task.cancel()
+
+
+async def get_weather_batch(cities: list[str], concurrency: int = WEATHER_BATCH_CONCURRENCY) -> list[WeatherBatchItem]:
+    """Results of iter_weather_batch in request order"""
+    results = [item async for item in iter_weather_batch(cities, concurrency)]
+    return sorted(results, key=lambda item: item.index)
+
+
+def weather_cache_stats() -> dict:
+    """Hit/miss/stale counters of the weather cache"""
+    return weather_cache.stats()
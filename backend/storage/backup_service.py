@@ -8,9 +8,10 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-DB_FILE = "storage/app.db"
-BACKUP_DB_FILE = "storage/app_backup.db"
-BACKUP_FOLDER = "storage/backups"
+STORAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_FILE = os.path.join(STORAGE_DIR, "app.db")
+BACKUP_DB_FILE = os.path.join(STORAGE_DIR, "app_backup.db")
+BACKUP_FOLDER = os.path.join(STORAGE_DIR, "backups")
 
 def ensure_backup_folder():
     """Create backup folder if it doesn't exist"""
@@ -1,19 +1,50 @@
 import sqlite3
 import os
-from typing import List, Dict
-from sqlalchemy import create_engine, Table, MetaData, select
+import logging
+from pathlib import Path
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from fastapi import HTTPException
 from storage.models import Base
 
-DB_FILE = "storage/app.db"
-SQL_FOLDER = "storage/models"
+logger = logging.getLogger(__name__)
+
+# Resolved from this module, not the working directory, so the backend can be imported from anywhere
+STORAGE_DIR = Path(__file__).resolve().parent
+DB_FILE = os.getenv("APP_DB_FILE", str(STORAGE_DIR / "app.db"))
+SQL_FOLDER = str(STORAGE_DIR / "models")
+
+# Connection settings applied to every connection to DB_FILE
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "20000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# SQLite has a single writer, so the read-write pool stays small; reads get their own
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
 
 os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
 
+def apply_pragmas(conn, read_only: bool = False):
+    """
+    WAL lets readers run alongside the writer; synchronous=NORMAL is durable in WAL mode
+    except for the last commits on power loss. cache_size is negative to mean KiB.
+    """
+    cursor = conn.cursor()
+    if not read_only:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
 def get_sqlite_connection():
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
+    apply_pragmas(conn)
     return conn
 
 def initialize_database():
@@ -30,10 +61,36 @@ def initialize_database():
 
     conn.commit()
     conn.close()
+    validate_database()
 
 DATABASE_URL = f"sqlite:///{DB_FILE}"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+READ_DATABASE_URL = f"sqlite:///file:{DB_FILE}?mode=ro&uri=true"
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": DB_BUSY_TIMEOUT_MS / 1000},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_POOL_SIZE,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
+read_engine = create_engine(
+    READ_DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": DB_BUSY_TIMEOUT_MS / 1000},
+    pool_size=DB_READ_POOL_SIZE,
+    max_overflow=DB_READ_POOL_SIZE,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_conn, connection_record):
+    apply_pragmas(dbapi_conn)
+
+@event.listens_for(read_engine, "connect")
+def _on_read_connect(dbapi_conn, connection_record):
+    apply_pragmas(dbapi_conn, read_only=True)
+
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
 
 def get_db():
     db = SessionLocal()
@@ -42,19 +99,36 @@ def get_db():
     finally:
         db.close()
 
-metadata = MetaData()
-
-def get_table_data(table_name: str) -> List[Dict]:
-
-    try:
-        table = Table(table_name, metadata, autoload_with=engine)
-    except Exception:
-        raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found")
-
-    db = SessionLocal()
+def get_read_db():
+    """Session from the read-only pool, for GET routes"""
+    db = ReadSessionLocal()
     try:
-        result = db.execute(select(table))
-        rows = [dict(row) for row in result.fetchall()]
-        return rows
+        yield db
     finally:
         db.close()
+
+def database_settings(target_engine=engine) -> dict:
+    with target_engine.connect() as conn:
+        return {
+            name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "query_only")
+        }
+
+def validate_database():
+    """
+    Check at startup that both pools got the intended settings. journal_mode can be
+    refused (e.g. on some network filesystems), and mmap_size is capped by the build,
+    so those are checked against what SQLite reports rather than assumed.
+    """
+    expected = {"journal_mode": "wal", "synchronous": 1, "busy_timeout": DB_BUSY_TIMEOUT_MS,
+                "cache_size": -DB_CACHE_SIZE_KB}
+    for name, target_engine, read_only in (("read-write", engine, 0), ("read-only", read_engine, 1)):
+        settings = database_settings(target_engine)
+        wrong = {key: settings[key] for key, value in expected.items() if settings[key] != value}
+        if settings["query_only"] != read_only:
+            wrong["query_only"] = settings["query_only"]
+        if wrong:
+            raise RuntimeError(f"SQLite {name} pool has unexpected settings: {wrong}")
+        if settings["mmap_size"] != DB_MMAP_SIZE:
+            logger.warning(f"SQLite mmap_size is {settings['mmap_size']}, requested {DB_MMAP_SIZE}")
+        logger.info(f"SQLite {name} pool settings: {settings}")
@@ -7,10 +7,10 @@ Base = declarative_base()
 class User(Base):
     __tablename__ = "users"
     user_id = Column(Integer, primary_key=True)
-    user_name = Column(String, nullable=False)
+    user_name = Column(String, nullable=False, index=True)
 
 class Inventory(Base):
     __tablename__ = "inventory"
     item_id = Column(Integer, primary_key=True)
-    item_name = Column(String, nullable=False)
+    item_name = Column(String, nullable=False, index=True)
     quantity = Column(Integer, default=0)
@@ -3,3 +3,4 @@ CREATE TABLE IF NOT EXISTS inventory (
     item_name TEXT NOT NULL,
     quantity INTEGER DEFAULT 0
 );
+CREATE INDEX IF NOT EXISTS ix_inventory_item_name ON inventory (item_name);
@@ -2,3 +2,4 @@ CREATE TABLE IF NOT EXISTS users (
     user_id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_name TEXT NOT NULL
 );
+CREATE INDEX IF NOT EXISTS ix_users_user_name ON users (user_name);
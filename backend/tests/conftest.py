@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+import pytest
+
+
+class StubWeather:
+    """
+    Local stand-in for wttr.in. Cities answer 200 with a temperature by default;
+    `fail` maps a city to the status it returns instead, `missing` cities answer
+    without conditions, `hits` counts requests per city and `peak` the most handled at once.
+    """
+
+    def __init__(self):
+        self.delay = 0.0
+        self.reset()
+
+    def reset(self):
+        self.delay = 0.0
+        self.fail: dict[str, int] = {}
+        self.missing: set[str] = set()
+        self.hits: dict[str, int] = {}
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def respond(self, city: str) -> tuple[int, dict]:
+        key = city.casefold()
+        with self._lock:
+            self.hits[key] = self.hits.get(key, 0) + 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if key in self.fail:
+            return self.fail[key], {"error": "stub failure"}
+        if key in self.missing:
+            return 200, {"current_condition": []}
+        return 200, {"current_condition": [{"temp_C": "21", "weatherDesc": [{"value": "Sunny"}]}]}
+
+
+stub = StubWeather()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, payload = stub.respond(unquote(urlsplit(self.path).path.lstrip("/")))
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# The backend reads its settings at import time, so they are set before anything imports it
+_server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+threading.Thread(target=_server.serve_forever, name="stub-weather", daemon=True).start()
+os.environ["WEATHER_BASE_URL"] = f"http://127.0.0.1:{_server.server_port}"
+os.environ["WEATHER_PREFETCH_INTERVAL"] = "3600"
+os.environ["APP_DB_FILE"] = str(Path(tempfile.mkdtemp(prefix="backend-tests-")) / "app.db")
+
+# Backend modules are imported as top-level names, as when running from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def weather_stub():
+    from services.weather_service import breaker, weather_cache
+    stub.reset()
+    weather_cache.clear()
+    breaker.success()
+    yield stub
@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def user_range(client):
+    names = [f"export-{uuid.uuid4().hex[:8]}-{n}" for n in range(3)]
+    ids = [client.post("/users/", json={"user_name": name}).json()["user_id"] for name in names]
+    return ids, names
+
+
+def test_rowid_range_and_columns(client, user_range):
+    ids, names = user_range
+    response = client.get("/db/users", params={"min_rowid": ids[0], "max_rowid": ids[-1], "columns": "user_name"})
+    assert response.status_code == 200
+    assert response.json() == {"table": "users", "rows": [{"user_name": name} for name in names]}
+
+
+def test_ndjson_export_from_accept_header(client, user_range):
+    ids, names = user_range
+    response = client.get("/db/users", params={"min_rowid": ids[1], "max_rowid": ids[-1]},
+                          headers={"Accept": "application/x-ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == [{"user_id": user_id, "user_name": name} for user_id, name in zip(ids[1:], names[1:])]
+
+
+def test_csv_export(client, user_range):
+    ids, names = user_range
+    response = client.get("/db/users", params={"format": "csv", "columns": "user_id", "min_rowid": ids[0],
+                                               "max_rowid": ids[0]})
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="users.csv"' in response.headers["content-disposition"]
+    assert list(csv.reader(io.StringIO(response.text))) == [["user_id"], [str(ids[0])]]
+
+
+def test_empty_csv_export_still_has_a_header(client):
+    response = client.get("/db/users", params={"format": "csv", "min_rowid": -2, "max_rowid": -1})
+    assert list(csv.reader(io.StringIO(response.text))) == [["user_id", "user_name"]]
+
+
+@pytest.mark.parametrize("format", ["json", "csv"])
+def test_unknown_column_is_a_400(client, format):
+    response = client.get("/db/users", params={"columns": "user_id,password", "format": format})
+    assert response.status_code == 400
+    assert "password" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("format", ["json", "ndjson"])
+def test_unknown_table_is_a_404(client, format):
+    assert client.get("/db/no_such_table", params={"format": format}).status_code == 404
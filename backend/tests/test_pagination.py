@@ -0,0 +1,51 @@
+import base64
+import uuid
+
+import pytest
+
+from services.pagination import decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def named_users(client):
+    prefix = f"page-{uuid.uuid4().hex[:8]}-"
+    ids = [client.post("/users/", json={"user_name": f"{prefix}{n}"}).json()["user_id"] for n in range(5)]
+    return prefix, ids
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(12345)) == 12345
+
+
+def test_pages_follow_the_cursor_to_the_end(client, named_users):
+    prefix, ids = named_users
+    seen, after = [], None
+    while True:
+        params = {"limit": 2, "name_prefix": prefix}
+        if after:
+            params["after"] = after
+        page = client.get("/users/", params=params).json()
+        assert page["total_estimate"] == 5
+        seen += [user["user_id"] for user in page["items"]]
+        after = page["next_cursor"]
+        if after is None:
+            break
+    assert seen == ids
+
+
+def test_name_prefix_is_a_prefix_match(client, named_users):
+    prefix, ids = named_users
+    page = client.get("/users/", params={"name_prefix": prefix + "3"}).json()
+    assert [user["user_id"] for user in page["items"]] == [ids[3]]
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    base64.urlsafe_b64encode(b"k2:10").decode(),
+    base64.urlsafe_b64encode(b"k1:ten").decode(),
+])
+def test_bad_cursor_is_a_400(client, cursor):
+    response = client.get("/users/", params={"after": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
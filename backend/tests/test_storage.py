@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from storage import db
+
+
+def test_read_write_pool_runs_in_wal_mode():
+    settings = db.database_settings(db.engine)
+    assert settings["journal_mode"] == "wal"
+    assert settings["synchronous"] == 1
+    assert settings["busy_timeout"] == db.DB_BUSY_TIMEOUT_MS
+    assert settings["query_only"] == 0
+
+
+def test_read_only_pool_refuses_writes(client):
+    assert db.database_settings(db.read_engine)["query_only"] == 1
+    session = db.ReadSessionLocal()
+    try:
+        with pytest.raises(OperationalError, match="readonly"):
+            session.execute(text("INSERT INTO users (user_name) VALUES ('read-only')"))
+    finally:
+        session.close()
+
+
+def test_startup_validation_accepts_the_configured_pools():
+    db.validate_database()
+
+
+def test_startup_validation_rejects_unexpected_settings(monkeypatch):
+    monkeypatch.setattr(db, "DB_CACHE_SIZE_KB", db.DB_CACHE_SIZE_KB + 1)
+    with pytest.raises(RuntimeError, match="cache_size"):
+        db.validate_database()
@@ -0,0 +1,14 @@
+import uuid
+
+
+def test_ids_filter_returns_only_those_users(client):
+    created = [client.post("/users/", json={"user_name": f"ids-{uuid.uuid4().hex[:8]}"}).json()["user_id"] for _ in range(3)]
+    wanted = [created[2], created[0], 999999]
+    page = client.get("/users/", params={"ids": ",".join(map(str, wanted)), "limit": 3}).json()
+    assert [u["user_id"] for u in page["items"]] == sorted(created[::2])
+    assert page["next_cursor"] is None
+
+
+def test_ids_filter_rejects_malformed_lists(client):
+    assert client.get("/users/", params={"ids": "1,,2"}).status_code == 422
+    assert client.get("/users/", params={"ids": "1,x"}).status_code == 422
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from services import weather_service
+from services.weather_service import breaker
+
+
+def test_city_is_fetched_from_the_configured_upstream(client, weather_stub):
+    response = client.get("/weather/city/Paris")
+    assert response.status_code == 200
+    assert response.json() == {"city": "Paris", "temperature": 21.0, "description": "Sunny"}
+    assert weather_stub.hits == {"paris": 1}
+
+
+@pytest.fixture
+def quick_breaker(monkeypatch):
+    monkeypatch.setattr(breaker, "threshold", 2)
+    monkeypatch.setattr(breaker, "reset_timeout", 0.2)
+    yield breaker
+    breaker.success()
+
+
+def test_breaker_opens_after_repeated_failures(client, weather_stub, quick_breaker):
+    weather_stub.fail["lima"] = 500
+    for _ in range(2):
+        assert client.get("/weather/city/Lima").status_code == 503
+    assert quick_breaker.state == "open"
+
+    response = client.get("/weather/city/Lima")
+    assert response.status_code == 503
+    assert "retry later" in response.json()["detail"]
+    assert weather_stub.hits == {"lima": 2}
+
+
+def test_half_open_trial_closes_the_breaker(client, weather_stub, quick_breaker):
+    weather_stub.fail["lima"] = 500
+    for _ in range(2):
+        client.get("/weather/city/Lima")
+    time.sleep(0.25)
+    assert quick_breaker.state == "half-open"
+
+    del weather_stub.fail["lima"]
+    assert client.get("/weather/city/Lima").status_code == 200
+    assert quick_breaker.state == "closed"
+
+
+def test_failed_half_open_trial_reopens_the_breaker(client, weather_stub, quick_breaker):
+    weather_stub.fail["lima"] = 500
+    for _ in range(2):
+        client.get("/weather/city/Lima")
+    time.sleep(0.25)
+
+    assert client.get("/weather/city/Lima").status_code == 503
+    assert quick_breaker.state == "open"
+    assert weather_stub.hits == {"lima": 3}
+
+
+def test_client_is_reused_on_one_loop_and_replaced_on_another():
+    async def current():
+        return weather_service._get_client(), weather_service._get_client()
+
+    first, again = asyncio.run(current())
+    assert first is again
+    second, _ = asyncio.run(current())
+    assert second is not first
+    assert first.is_closed
+
+
+def test_pool_timeout_does_not_open_the_breaker(weather_stub, quick_breaker, monkeypatch):
+    async def saturated(*args, **kwargs):
+        raise httpx.PoolTimeout("no connection available")
+
+    async def lookups():
+        monkeypatch.setattr(weather_service._get_client(), "get", saturated)
+        for _ in range(3):
+            with pytest.raises(HTTPException) as error:
+                await weather_service.fetch_weather("Paris")
+            assert error.value.status_code == 503
+
+    asyncio.run(lookups())
+    assert quick_breaker.state == "closed"
+
+
+@pytest.mark.parametrize("upstream, expected", [(404, 404), (400, 400), (403, 400)])
+def test_upstream_client_errors_pass_through_without_the_breaker(client, weather_stub, quick_breaker, upstream, expected):
+    weather_stub.fail["atlantis"] = upstream
+    for _ in range(3):
+        assert client.get("/weather/city/Atlantis").status_code == expected
+    assert quick_breaker.state == "closed"
+    assert quick_breaker.failures == 0
+
+
+def test_upstream_client_errors_are_not_answered_from_stale_entries(client, weather_stub, monkeypatch):
+    client.get("/weather/city/Atlantis")
+    monkeypatch.setattr(weather_service.weather_cache, "ttl", 0)
+    weather_stub.fail["atlantis"] = 404
+    assert client.get("/weather/city/Atlantis").status_code == 404
@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+from services import weather_service
+from services.weather_service import get_weather_batch
+
+
+def test_batch_keeps_request_order_and_reports_failures(client, weather_stub):
+    weather_stub.missing.add("atlantis")
+    weather_stub.delay = 0.05
+    response = client.post("/weather/cities", json={"cities": ["Paris", "Atlantis", "paris"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["index"] for item in body["results"]] == [0, 1, 2]
+    assert [item["status_code"] for item in body["results"]] == [200, 404, 200]
+    assert body["results"][2]["weather"]["city"] == "paris"
+    assert (body["succeeded"], body["failed"]) == (2, 1)
+    assert weather_stub.hits == {"paris": 1, "atlantis": 1}
+
+
+def test_batch_stream_yields_one_line_per_city(client, weather_stub):
+    weather_stub.fail["lima"] = 500
+    response = client.post("/weather/cities/stream", json={"cities": ["Paris", "Lima", "Rome"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    items = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda item: item["index"])
+    assert [item["city"] for item in items] == ["Paris", "Lima", "Rome"]
+    assert [item["status_code"] for item in items] == [200, 503, 200]
+    assert "weather" not in items[1]
+
+
+def test_cities_are_sent_as_one_path_segment(client, weather_stub):
+    response = client.post("/weather/cities", json={"cities": ["a/b?c#d", "New York"]})
+    assert [item["status_code"] for item in response.json()["results"]] == [200, 200]
+    assert weather_stub.hits == {"a/b?c#d": 1, "new york": 1}
+
+
+def test_concurrent_batches_share_the_upstream_cap(weather_stub, monkeypatch):
+    # Without the cap, lookups queued on the pool would hit its (read) timeout and fail
+    monkeypatch.setattr(weather_service, "WEATHER_MAX_CONNECTIONS", 2)
+    monkeypatch.setattr(weather_service, "WEATHER_READ_TIMEOUT", 0.3)
+    weather_stub.delay = 0.1
+
+    async def batches():
+        return await asyncio.gather(*(get_weather_batch([f"city{b}-{n}" for n in range(4)]) for b in range(3)))
+
+    results = asyncio.run(batches())
+    assert all(item.status_code == 200 for batch in results for item in batch)
+    assert weather_stub.peak <= 2
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services.weather_service import get_weather, weather_cache
+
+
+def test_fresh_entries_are_served_from_the_cache(client, weather_stub):
+    client.get("/weather/city/Paris")
+    response = client.get("/weather/city/paris ")
+    assert response.status_code == 200
+    assert response.json()["city"] == "paris"
+    assert weather_stub.hits == {"paris": 1}
+
+
+def test_concurrent_misses_share_one_upstream_call(weather_stub):
+    weather_stub.delay = 0.2
+    before = weather_cache.stats()
+
+    async def lookups():
+        return await asyncio.gather(*(get_weather(city) for city in ["Rome", "rome", "ROME", "Rome"]))
+
+    results = asyncio.run(lookups())
+    assert [weather.city for weather in results] == ["Rome", "rome", "ROME", "Rome"]
+    assert weather_stub.hits == {"rome": 1}
+    after = weather_cache.stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["coalesced"] - before["coalesced"] == 3
+
+
+def test_stale_entry_is_served_when_upstream_fails(client, weather_stub, monkeypatch):
+    client.get("/weather/city/Oslo")
+    monkeypatch.setattr(weather_cache, "ttl", 0)
+    weather_stub.fail["oslo"] = 502
+    stale_before = weather_cache.stats()["stale"]
+
+    response = client.get("/weather/city/Oslo")
+    assert response.status_code == 200
+    assert response.json()["temperature"] == 21.0
+    assert weather_stub.hits == {"oslo": 2}
+    assert weather_cache.stats()["stale"] == stale_before + 1
+
+
+def test_not_found_is_not_answered_from_stale_entries(client, weather_stub, monkeypatch):
+    client.get("/weather/city/Atlantis")
+    monkeypatch.setattr(weather_cache, "ttl", 0)
+    weather_stub.missing.add("atlantis")
+    assert client.get("/weather/city/Atlantis").status_code == 404
+
+
+def test_empty_city_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_weather("  "))
+    assert error.value.status_code == 400
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from services import weather_prefetcher, weather_service
+from services.weather_service import PopularityTracker, get_weather, weather_cache
+
+
+@pytest.fixture
+def popularity(monkeypatch):
+    tracker = PopularityTracker()
+    monkeypatch.setattr(weather_service, "popularity", tracker)
+    return tracker
+
+
+@pytest.fixture
+def expiring(monkeypatch):
+    # Every cached entry is past PREFETCH_AHEAD of its TTL at once
+    monkeypatch.setattr(weather_cache, "ttl", 0.0)
+
+
+def test_only_cities_above_the_minimum_score_are_refreshed(weather_stub, popularity, expiring):
+    asyncio.run(get_weather("Paris"))
+    for _ in range(3):
+        asyncio.run(get_weather("Rome"))
+    assert weather_prefetcher.due_for_refresh(min_score=2) == ["Rome"]
+    assert weather_prefetcher.due_for_refresh(min_score=0.5) == ["Rome", "Paris"]
+
+
+def test_uncached_cities_are_left_to_user_requests(weather_stub, popularity, expiring):
+    for _ in range(3):
+        popularity.record("Atlantis")
+    assert weather_prefetcher.due_for_refresh(min_score=1) == []
+
+
+def test_refresh_spends_the_budget_on_upstream_calls(weather_stub, popularity, expiring):
+    for city in ["Paris", "Rome", "Oslo"]:
+        asyncio.run(get_weather(city))
+        popularity.record(city)
+        popularity.record(city)
+    weather_stub.hits.clear()
+
+    assert asyncio.run(weather_prefetcher.refresh_popular(2)) == 2
+    assert sum(weather_stub.hits.values()) == 2
+
+
+def test_joining_an_inflight_lookup_is_free(weather_stub, popularity, expiring):
+    asyncio.run(get_weather("Paris"))
+    popularity.record("Paris")
+    popularity.record("Paris")
+    assert weather_prefetcher.due_for_refresh() == ["Paris"]
+    weather_stub.hits.clear()
+    weather_stub.delay = 0.2
+
+    async def user_request_then_prefetch():
+        user = asyncio.create_task(get_weather("Paris"))
+        await asyncio.sleep(0.05)
+        calls = await weather_prefetcher.refresh_popular(1)
+        await user
+        return calls
+
+    assert asyncio.run(user_request_then_prefetch()) == 0
+    assert weather_stub.hits == {"paris": 1}